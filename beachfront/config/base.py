@@ -12,6 +12,7 @@
 # specific language governing permissions and limitations under the License.
 
 import os
+import tempfile
 from datetime import timedelta
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,10 +23,42 @@ ENFORCE_HTTPS = True
 
 SESSION_TTL = timedelta(minutes=30)
 
-JOB_WORKER_MAX_RETRIES = 3
-JOB_WORKER_INTERVAL    = timedelta(seconds=60)
+API_KEY_CACHE_SIZE         = int(os.getenv('API_KEY_CACHE_SIZE', 1024))
+API_KEY_CACHE_TTL          = timedelta(seconds=60)
+API_KEY_CACHE_NEGATIVE_TTL = timedelta(seconds=10)
+
+JOB_WORKER_MAX_RETRIES        = 3
+JOB_WORKER_INTERVAL           = timedelta(seconds=60)
+JOB_WORKER_CONCURRENCY        = int(os.getenv('JOB_WORKER_CONCURRENCY', 8))
+JOB_WORKER_POLLERS            = int(os.getenv('JOB_WORKER_POLLERS', 1))
+JOB_WORKER_CLAIM_SIZE         = int(os.getenv('JOB_WORKER_CLAIM_SIZE', 500))
+JOB_WORKER_CLAIM_TTL          = timedelta(minutes=10)
+JOB_WORKER_FAST_INTERVAL      = timedelta(seconds=15)
+JOB_WORKER_MAX_INTERVAL       = timedelta(minutes=10)
+JOB_WORKER_BACKOFF_STEP       = timedelta(minutes=15)
+JOB_WORKER_JITTER             = 0.1
+JOB_WORKER_INGEST_CONCURRENCY = int(os.getenv('JOB_WORKER_INGEST_CONCURRENCY', 2))
+JOB_WORKER_INGEST_QUEUE_SIZE  = int(os.getenv('JOB_WORKER_INGEST_QUEUE_SIZE', 50))
+JOB_WORKER_STATS_INTERVAL     = timedelta(minutes=5)
 JOB_TTL                = timedelta(hours=2)
 
+JOB_EVENTS_MAX_STREAMS = int(os.getenv('JOB_EVENTS_MAX_STREAMS', 10))
+JOB_EVENTS_STREAM_TTL  = timedelta(minutes=5)
+JOB_EVENTS_HEARTBEAT   = timedelta(seconds=15)
+
+ALGORITHM_CACHE_TTL       = timedelta(minutes=10)
+ALGORITHM_CACHE_MAX_STALE = timedelta(hours=6)
+
 PIAZZA_API_KEY = os.getenv('PIAZZA_API_KEY')
+PIAZZA_POOL_SIZE = int(os.getenv('PIAZZA_POOL_SIZE', 16))
 
 STATIC_BASEURL = os.getenv('STATIC_BASEURL', '/static/')
+
+WMS_CACHE_MEMORY_SIZE   = int(os.getenv('WMS_CACHE_MEMORY_SIZE', 64 * 1024 * 1024))
+WMS_CACHE_DISK_SIZE     = int(os.getenv('WMS_CACHE_DISK_SIZE', 192 * 1024 * 1024))
+WMS_CACHE_MAX_TILE_SIZE = int(os.getenv('WMS_CACHE_MAX_TILE_SIZE', 4 * 1024 * 1024))
+WMS_CACHE_DIR           = os.getenv('WMS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'beachfront-wms-cache'))
+
+MVT_CACHE_MEMORY_SIZE = int(os.getenv('MVT_CACHE_MEMORY_SIZE', 64 * 1024 * 1024))
+MVT_CACHE_DISK_SIZE   = int(os.getenv('MVT_CACHE_DISK_SIZE', 192 * 1024 * 1024))
+MVT_CACHE_DIR         = os.getenv('MVT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'beachfront-mvt-cache'))
@@ -14,13 +14,23 @@
 import logging
 import os.path
 import pprint
+import re
+import threading
+import time
+from typing import List, Tuple
 
 import sqlalchemy as sa
 from sqlalchemy.exc import DatabaseError
 from sqlalchemy.engine import Engine, Connection, ResultProxy
 
 from beachfront.config import DATABASE_URI
-from beachfront.db import jobs, productlines, scenes, users
+from beachfront.db import jobs, locks, productlines, scenes, users
+
+BACKFILL_BATCH_SIZE = 10000
+INDEXES_FILE = 'schema.indexes.sql'
+INDEX_LOCK_KEY = -1  # Negative so that it never collides with a job poller's key
+MIGRATIONS_DIR = 'migrations'
+SCHEMA_LOCK_KEY = 0  # Job pollers take the keys from 1 up
 
 _engine = None  # type: Engine
 
@@ -40,7 +50,7 @@ def init():
     global _engine
     try:
         _engine = sa.create_engine(DATABASE_URI)
-        _install_if_needed()
+        _upgrade_schema()
     except:
         log.exception('Initialization failed', action='initialize', actee='database')
         # Fail fast
@@ -71,10 +81,78 @@ def print_diagnostics(err: DatabaseError):
     )
 
 
+def start_index_builder() -> threading.Thread:
+    """
+    Builds whichever indexes in `sql/schema.indexes.sql` are missing, then
+    finishes any backfill a migration left to it, on a background thread, so
+    that rewriting a large table neither holds up server startup nor blocks
+    writes to it.  Only one process in the cluster builds at a time; the
+    others skip it.
+    """
+    thread = threading.Thread(target=_build_indexes, name='index-builder', daemon=True)
+    thread.start()
+    return thread
+
+
 #
 # Helpers
 #
 
+def _build_indexes():
+    """
+    Runs each `CREATE INDEX CONCURRENTLY` in `sql/schema.indexes.sql` on its
+    own, outside of a transaction as PostgreSQL requires.  A build that was
+    interrupted leaves an invalid index behind, which is dropped and rebuilt.
+    """
+    log = logging.getLogger(__name__)
+    audit = dict(action='build indexes', actee='database')
+
+    try:
+        statements = _read_index_statements()
+    except Exception as err:
+        log.error('Cannot open %s: %s', INDEXES_FILE, err, **audit)
+        return
+
+    try:
+        conn = _engine.connect()
+    except DatabaseError as err:
+        log.error('Cannot connect to build indexes: %s', err, **audit)
+        return
+
+    conn.detach()  # Really close the session afterwards, so the lock can never linger in the pool
+    try:
+        if not locks.try_advisory_lock(conn, key=INDEX_LOCK_KEY):
+            log.info('Another process is building indexes', **audit)
+            return
+
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        for name, statement in statements:
+            is_valid = conn.execute(sa.text("""
+                SELECT i.indisvalid
+                  FROM pg_index i
+                       JOIN pg_class c ON (c.oid = i.indexrelid)
+                 WHERE c.relname = :name
+                """), name=name).scalar()
+            if is_valid:
+                continue
+
+            if is_valid is not None:
+                log.warning('Dropping invalid index `%s` left by an interrupted build', name, **audit)
+                conn.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(name))
+
+            log.info('Building index `%s`', name, **audit)
+            started_at = time.time()
+            conn.execute(statement)
+            log.info('Built index `%s` in %0.1fs', name, time.time() - started_at, **audit)
+
+        _normalize_detection_srids(conn)
+    except DatabaseError as err:
+        log.error('Index build failed; it will be retried at the next startup', **audit)
+        print_diagnostics(err)
+    finally:
+        conn.close()
+
+
 def _install():
     log = logging.getLogger(__name__)
     audit = dict(action='install schema', actee='database')
@@ -128,12 +206,183 @@ def _install_if_needed():
     _install()
 
 
+def _list_migrations() -> List[Tuple[int, str]]:
+    root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    migrations = []
+    for filename in os.listdir(os.path.join(root_dir, 'sql', MIGRATIONS_DIR)):
+        match = re.match(r'^(\d+)_\w+\.sql$', filename)
+        if match:
+            migrations.append((int(match.group(1)), filename))
+    migrations.sort()
+
+    versions = [version for version, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError('migration versions must be unique')
+
+    return migrations
+
+
+def _migrate(conn: Connection):
+    """
+    Applies, in order, each migration in `sql/migrations` newer than the
+    version recorded in `schema_version`.  Each runs in its own transaction
+    along with the record of it, so a failure leaves the schema at the last
+    version that fully applied.  Migrations are written to be idempotent, so
+    that running them against a fresh install changes nothing.
+    """
+    log = logging.getLogger(__name__)
+    audit = dict(action='migrate schema', actee='database')
+
+    try:
+        migrations = _list_migrations()
+    except OSError as err:
+        err = MigrationError('cannot list migrations', err)
+        log.critical('Migration failed: %s', err, **audit)
+        raise err
+
+    try:
+        conn.execution_options(autocommit=True).execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version    INTEGER        PRIMARY KEY,
+                filename   VARCHAR(255)   NOT NULL,
+                applied_on TIMESTAMPTZ    NOT NULL    DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+        current_version = conn.execute("""
+            SELECT COALESCE(MAX(version), 0) FROM schema_version
+            """).scalar()
+    except DatabaseError as err:
+        log.critical('Schema version lookup failed', **audit)
+        print_diagnostics(err)
+        raise MigrationError('cannot read schema version', err)
+
+    pending = [(v, f) for v, f in migrations if v > current_version]
+    if not pending:
+        log.info('Schema is up to date at version %d', current_version)
+        return
+
+    for version, filename in pending:
+        log.info('Applying migration `%s`', filename, **audit)
+        try:
+            query = _read_sql_file(os.path.join(MIGRATIONS_DIR, filename))
+        except Exception as err:
+            err = MigrationError('cannot open {}'.format(filename), err)
+            log.critical('Migration failed: %s', err, **audit)
+            raise err
+
+        transaction = conn.begin()
+        try:
+            conn.execute(sa.text(query))
+            conn.execute(sa.text("""
+                INSERT INTO schema_version (version, filename)
+                VALUES (:version, :filename)
+                """), version=version, filename=filename)
+            transaction.commit()
+        except DatabaseError as err:
+            transaction.rollback()
+            log.critical('Migration failed', **audit)
+            print_diagnostics(err)
+            raise MigrationError('migration {} failed'.format(filename), err)
+
+    log.info('Migrated schema to version %d', pending[-1][0], **audit)
+
+
+def _normalize_detection_srids(conn: Connection):
+    """
+    Stamps detections still carrying SRID 0 (see migration 0004) with 4326 a
+    batch at a time, each batch committing on its own so that no row stays
+    locked for long, then validates the constraint the migration added
+    `NOT VALID`.  Validating only blocks schema changes, not writes.  Once the
+    constraint is valid there is nothing left to do.
+    """
+    log = logging.getLogger(__name__)
+    audit = dict(action='normalize detection srids', actee='database')
+
+    is_valid = conn.execute(sa.text("""
+        SELECT convalidated
+          FROM pg_constraint
+         WHERE conname = 'detection_geometry_srid_check'
+        """)).scalar()
+    if is_valid is None or is_valid:
+        return
+
+    log.info('Normalizing detection SRIDs', **audit)
+    started_at = time.time()
+    last = None
+    while True:
+        last = conn.execute(sa.text("""
+            WITH batch AS (
+                SELECT job_id, feature_id
+                  FROM detection
+                 WHERE CAST(:after_job_id AS VARCHAR) IS NULL
+                    OR (job_id, feature_id) > (:after_job_id, :after_feature_id)
+                ORDER BY job_id, feature_id
+                LIMIT :batch_size
+            ), updated AS (
+                UPDATE detection d
+                   SET geometry      = ST_SetSRID(d.geometry, 4326),
+                       geometry_lod1 = ST_SetSRID(d.geometry_lod1, 4326),
+                       geometry_lod2 = ST_SetSRID(d.geometry_lod2, 4326),
+                       geometry_lod3 = ST_SetSRID(d.geometry_lod3, 4326)
+                  FROM batch b
+                 WHERE d.job_id = b.job_id
+                   AND d.feature_id = b.feature_id
+                   AND (ST_SRID(d.geometry) = 0
+                        OR ST_SRID(d.geometry_lod1) = 0
+                        OR ST_SRID(d.geometry_lod2) = 0
+                        OR ST_SRID(d.geometry_lod3) = 0)
+            )
+            SELECT job_id, feature_id
+              FROM batch
+            ORDER BY job_id DESC, feature_id DESC
+            LIMIT 1
+            """), after_job_id=last and last['job_id'], after_feature_id=last and last['feature_id'],
+            batch_size=BACKFILL_BATCH_SIZE).fetchone()
+        if not last:
+            break
+
+    conn.execute('ALTER TABLE detection VALIDATE CONSTRAINT detection_geometry_srid_check')
+    log.info('Normalized detection SRIDs in %0.1fs', time.time() - started_at, **audit)
+
+
+def _read_index_statements() -> List[Tuple[str, str]]:
+    lines = (line.strip() for line in _read_sql_file(INDEXES_FILE).splitlines())
+    statements = []
+    for statement in ' '.join(line for line in lines if not line.startswith('--')).split(';'):
+        statement = statement.strip()
+        if not statement:
+            continue
+        match = re.match(r'^CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+) ', statement)
+        if not match:
+            raise MigrationError('not a concurrent index build: {}'.format(statement))
+        statements.append((match.group(1), statement))
+    return statements
+
+
 def _read_sql_file(name: str) -> str:
     root_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
     with open(os.path.join(root_dir, 'sql', name)) as fp:
         return fp.read()
 
 
+def _upgrade_schema():
+    """
+    Installs the schema if needed, then migrates it.  Every server process
+    does this at startup, so the lock lets one of them do the work while the
+    rest wait and then find nothing left to do.
+    """
+    conn = _engine.connect()
+    try:
+        locks.advisory_lock(conn, key=SCHEMA_LOCK_KEY)
+        try:
+            _install_if_needed()
+            _migrate(conn)
+        finally:
+            locks.advisory_unlock(conn, key=SCHEMA_LOCK_KEY)
+    finally:
+        conn.close()
+
+
 #
 # Errors
 #
@@ -148,3 +397,9 @@ class InstallationError(Exception):
     def __init__(self, message: str, err: Exception = None):
         super().__init__(message)
         self.original_error = err
+
+
+class MigrationError(Exception):
+    def __init__(self, message: str, err: Exception = None):
+        super().__init__(message)
+        self.original_error = err
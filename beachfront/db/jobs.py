@@ -11,9 +11,45 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
-from datetime import datetime
+import io
+from datetime import datetime, timedelta
 import logging
-from beachfront.db import Connection, ResultProxy
+from typing import Dict, Iterable, List, Tuple, Union
+
+import psycopg2
+
+from beachfront.db import Connection, DatabaseError, ResultProxy
+from beachfront.utils import geojson
+
+COPY_BATCH_SIZE = 5000
+STATUS_CHANNEL = 'job_status'  # Every status update is announced here via NOTIFY
+OUTSTANDING_STATUSES = ('Submitted', 'Pending', 'Running')  # i.e., still worth polling
+
+# Provenance columns that detections can be projected onto
+DETECTION_PROPERTIES = (
+    'job_id',
+    'algorithm_id',
+    'algorithm_name',
+    'algorithm_version',
+    'cloud_cover',
+    'created_by',
+    'created_on',
+    'name',
+    'resolution',
+    'scene_id',
+    'sensor_name',
+    'status',
+    'tide',
+    'tide_min_24h',
+    'tide_max_24h',
+    'time_of_collect',
+    'data_usage',
+)
+
+# Simplification tolerances (in degrees) of the precomputed detection geometry
+# tiers, roughly 10m, 100m and 1km at the equator; tier N is stored in
+# `detection.geometry_lodN` and tier 0 is the geometry as detected
+DETECTION_LOD_TOLERANCES = (0.0001, 0.001, 0.01)
 
 
 def delete_job_user(
@@ -48,26 +84,175 @@ def exists(
     return conn.execute(query, params).rowcount > 0
 
 
+def claim_outstanding_jobs(
+        conn: Connection,
+        *,
+        worker_id: str,
+        lease: timedelta,
+        limit: int) -> ResultProxy:
+    """
+    Claims up to `limit` outstanding jobs whose lease has run out for the given
+    worker.  Rows that another worker is claiming at the same moment are
+    skipped rather than waited on, so concurrent pollers split the queue.
+    Each job's `status_age` is how long it has had its current status.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db claim outstanding jobs', action='database update record')
+    query = """
+        WITH claimable AS (
+            SELECT job_id
+              FROM job
+             WHERE status IN ('Submitted', 'Pending', 'Running')
+               AND (lease_expires_on IS NULL OR lease_expires_on <= NOW())
+            ORDER BY created_on ASC
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE job j
+           SET claimed_by = %(worker_id)s,
+               lease_expires_on = NOW() + %(lease)s
+          FROM claimable c
+         WHERE j.job_id = c.job_id
+        RETURNING j.job_id,
+                  j.status,
+                  DATE_TRUNC('second', NOW() - j.created_on) AS age,
+                  DATE_TRUNC('second', NOW() - j.updated_on) AS status_age
+        """
+    params = {
+        'worker_id': worker_id,
+        'lease': lease,
+        'limit': limit,
+    }
+    return conn.execution_options(autocommit=True).execute(query, params)
+
+
+def claim_ingestion(
+        conn: Connection,
+        *,
+        job_id: str,
+        worker_id: str,
+        lease: timedelta) -> bool:
+    """
+    Takes (or keeps) the claim on a job that has yet to be finished, so that
+    no other worker polls it and ingests its detections a second time.  Fails
+    if the job has since finished or another worker holds a live claim on it.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db claim ingestion', action='database update record')
+    query = """
+        UPDATE job
+           SET claimed_by = %(worker_id)s,
+               lease_expires_on = NOW() + %(lease)s
+         WHERE job_id = %(job_id)s
+           AND status = ANY(%(statuses)s)
+           AND (claimed_by = %(worker_id)s OR lease_expires_on IS NULL OR lease_expires_on <= NOW())
+        """
+    params = {
+        'job_id': job_id,
+        'worker_id': worker_id,
+        'lease': lease,
+        'statuses': list(OUTSTANDING_STATUSES),
+    }
+    return conn.execution_options(autocommit=True).execute(query, params).rowcount > 0
+
+
+def copy_detections(
+        conn: Connection,
+        *,
+        job_id: str,
+        features: Iterable[dict],
+        table: str = 'detection',
+        batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Bulk-loads detections into `table` via `COPY ... FROM STDIN`, converting
+    each feature's geometry to EWKT on the client and flushing every
+    `batch_size` rows.  Returns the number of detections written.  Throws
+    `ValueError` for a malformed feature or geometry.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db copy detections', action='database insert record')
+    query = """
+        COPY {} (job_id, feature_id, geometry) FROM STDIN
+        """.format(table)
+    cursor = conn.connection.cursor()
+    buffer = io.StringIO()
+    count = 0
+    try:
+        for feature in features:
+            if not isinstance(feature, dict):
+                raise ValueError('feature must be an object, not `{}`'.format(feature))
+            geometry = feature.get('geometry')
+            if not geometry:
+                log.warning('Skipping detection without geometry for <job:%s>', job_id)
+                continue
+            count += 1
+            buffer.write('{}\t{}\t{}\n'.format(job_id, count, geojson.to_ewkt(geometry)))
+            if count % batch_size == 0:
+                _flush_copy_buffer(cursor, query, buffer)
+                buffer = io.StringIO()
+        if buffer.tell():
+            _flush_copy_buffer(cursor, query, buffer)
+    except psycopg2.Error as err:
+        raise DatabaseError(query, None, err)
+    finally:
+        cursor.close()
+    return count
+
+
 def insert_detection(
         conn: Connection,
         *,
         job_id: str,
-        feature_collection: str) -> None:
-    # FIXME -- I know we can do better than this...
+        feature_collection: Union[str, Iterable]) -> int:
+    """
+    Saves every feature in `feature_collection`, which may be the whole
+    document or an iterable of chunks streamed from elsewhere, along with its
+    simplified geometry tiers.  Features are staged in a temporary table so
+    that each detection row is written once, tiers included, rather than
+    copied in and then rewritten.
+    """
     log = logging.getLogger(__name__)
     log.info('Db insert detection', action='database insert record')
     query = """
-        INSERT INTO detection (job_id, feature_id, geometry)
-        SELECT %(job_id)s AS job_id,
-               row_number() OVER () AS feature_id,
-               ST_GeomFromGeoJSON(fc.features->>'geometry') AS geometry
-        FROM (SELECT json_array_elements(%(feature_collection)s::json->'features') AS features) fc
+        INSERT INTO detection (job_id, feature_id, geometry, geometry_lod1, geometry_lod2, geometry_lod3)
+        SELECT s.job_id,
+               s.feature_id,
+               s.geometry,
+               ST_SimplifyPreserveTopology(s.geometry, %(tolerance_1)s),
+               ST_SimplifyPreserveTopology(s.geometry, %(tolerance_2)s),
+               ST_SimplifyPreserveTopology(s.geometry, %(tolerance_3)s)
+          FROM detection_staging s
         """
+    tolerance_1, tolerance_2, tolerance_3 = DETECTION_LOD_TOLERANCES
     params = {
-        'job_id': job_id,
-        'feature_collection': feature_collection,
+        'tolerance_1': tolerance_1,
+        'tolerance_2': tolerance_2,
+        'tolerance_3': tolerance_3,
     }
-    conn.execute(query, params)
+    transaction = conn.begin()
+    try:
+        conn.execute("""
+            CREATE TEMPORARY TABLE detection_staging (
+                job_id            VARCHAR(64),
+                feature_id        INT,
+                geometry          GEOMETRY       NOT NULL
+            )
+            """)
+        count = copy_detections(
+            conn,
+            job_id=job_id,
+            features=geojson.iter_features(feature_collection),
+            table='detection_staging',
+        )
+        conn.execute(query, params)
+        conn.execute("""
+            DROP TABLE detection_staging
+            """)
+        transaction.commit()
+    except:
+        transaction.rollback()
+        raise
+    return count
 
 
 def insert_job(
@@ -148,29 +333,254 @@ def insert_job_user(
     conn.execute(query, params)
 
 
-def select_detections(
+def lod_for_resolution(resolution: float) -> int:
+    """
+    Returns the coarsest detection geometry tier whose simplification stays
+    within `resolution` (in degrees per pixel), i.e., is invisible when drawn.
+    """
+    lod = 0
+    for tier, tolerance in enumerate(DETECTION_LOD_TOLERANCES, 1):
+        if tolerance <= resolution:
+            lod = tier
+    return lod
+
+
+def listen_for_status_changes(conn: Connection) -> None:
+    """
+    Subscribes an autocommitting connection to the announcements made on
+    `STATUS_CHANNEL`, which arrive as `{"job_id": ..., "status": ...}`.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db listen for status changes', action='database listen')
+    conn.execute('LISTEN {}'.format(STATUS_CHANNEL))
+
+
+def renew_claims(
         conn: Connection,
         *,
-        job_id: str) -> ResultProxy:
-    # Construct the GeoJSON directly where the data lives
+        worker_id: str,
+        leases: Dict[str, timedelta]) -> None:
+    """
+    Resets the lease on each of the worker's claimed jobs, i.e., schedules when
+    each job next becomes due for polling.
+    """
     log = logging.getLogger(__name__)
-    log.info('Db select detection', action='database query record')
+    log.info('Db renew job claims', action='database update record')
     query = """
-        SELECT to_json(fc)::text AS "feature_collection"
-          FROM (SELECT 'FeatureCollection' AS "type",
-                       array_agg(f) AS "features"
-                  FROM (SELECT concat_ws('#', d.job_id, d.feature_id) AS "id",
-                               to_json(p) AS "properties",
-                               ST_AsGeoJSON(d.geometry)::json AS "geometry",
-                               'Feature' AS "type"
-                          FROM detection d
-                               INNER JOIN provenance AS p ON (p.job_id = d.job_id)
-                         WHERE d.job_id = %(job_id)s
-                       ) AS f
-               ) AS fc
+        UPDATE job j
+           SET lease_expires_on = NOW() + l.lease
+          FROM unnest(%(job_ids)s::varchar[], %(leases)s::interval[]) AS l (job_id, lease)
+         WHERE j.job_id = l.job_id
+           AND j.claimed_by = %(worker_id)s
         """
     params = {
+        'worker_id': worker_id,
+        'job_ids': list(leases.keys()),
+        'leases': list(leases.values()),
+    }
+    conn.execute(query, params)
+
+
+def select_claim_leases(
+        conn: Connection,
+        *,
+        worker_id: str,
+        job_ids: Iterable[str]) -> ResultProxy:
+    """
+    Returns how many seconds remain on the lease of each of the given jobs the
+    worker still claims and has yet to see finished (`0` if already expired),
+    as reckoned by the database's clock.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db select claim leases', action='database query record')
+    query = """
+        SELECT job_id,
+               GREATEST(EXTRACT(EPOCH FROM lease_expires_on - NOW()), 0) AS remaining
+          FROM job
+         WHERE job_id = ANY(%(job_ids)s)
+           AND claimed_by = %(worker_id)s
+           AND status = ANY(%(statuses)s)
+        """
+    params = {
+        'worker_id': worker_id,
+        'job_ids': list(job_ids),
+        'statuses': list(OUTSTANDING_STATUSES),
+    }
+    return conn.execute(query, params)
+
+
+def select_current_timestamp(conn: Connection) -> ResultProxy:
+    # The database's clock is the one `job.updated_on` is stamped with
+    query = """
+        SELECT CURRENT_TIMESTAMP
+        """
+    return conn.execute(query)
+
+
+def select_detection_tile(
+        conn: Connection,
+        *,
+        bounds: Tuple[float, float, float, float],
+        extent: int,
+        buffer: int,
+        layer_name: str,
+        lod: int = 0,
+        job_id: str = None,
+        productline_id: str = None,
+        scene_id: str = None) -> ResultProxy:
+    """
+    Encodes the detections intersecting `bounds` (in Web Mercator) as a single
+    Mapbox Vector Tile layer, optionally filtered by job, product line or scene.
+    Geometries are taken from simplification tier `lod`.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db select detection tile', action='database query record')
+    query = """
+        WITH bounds AS (
+            SELECT ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 3857) AS geometry
+        ),
+        features AS (
+            SELECT ST_AsMVTGeom(ST_Transform({geometry}, 3857), b.geometry, %(extent)s, %(buffer)s, true) AS geometry,
+                   d.job_id,
+                   d.feature_id
+              FROM detection d
+                   CROSS JOIN bounds b
+             WHERE d.geometry && ST_Transform(ST_Expand(b.geometry, %(margin)s), 4326)
+               AND (%(job_id)s IS NULL OR d.job_id = %(job_id)s)
+               AND (%(productline_id)s IS NULL OR d.job_id IN (SELECT plj.job_id
+                                                                FROM productline_job plj
+                                                               WHERE plj.productline_id = %(productline_id)s))
+               AND (%(scene_id)s IS NULL OR d.job_id IN (SELECT j.job_id
+                                                          FROM job j
+                                                         WHERE j.scene_id = %(scene_id)s))
+        )
+        SELECT ST_AsMVT(f, %(layer_name)s, %(extent)s, 'geometry') AS "tile"
+          FROM features f
+         WHERE f.geometry IS NOT NULL
+        """.format(geometry=_detection_geometry(lod))
+    xmin, ymin, xmax, ymax = bounds
+    params = {
+        'xmin': xmin,
+        'ymin': ymin,
+        'xmax': xmax,
+        'ymax': ymax,
+        'margin': (xmax - xmin) * buffer / extent,  # Detections just outside still draw into the tile's buffer
+        'extent': extent,
+        'buffer': buffer,
+        'layer_name': layer_name,
         'job_id': job_id,
+        'productline_id': productline_id,
+        'scene_id': scene_id,
+    }
+    return conn.execute(query, params)
+
+
+def select_detection_features(
+        conn: Connection,
+        *,
+        job_id: str,
+        lod: int = 0,
+        bbox: Tuple[float, float, float, float] = None,
+        after: int = None,
+        limit: int = None,
+        properties: Iterable[str] = None) -> ResultProxy:
+    """
+    Selects a job's detections as pre-serialized GeoJSON features ordered by
+    `feature_id`, read through a server-side cursor.  The selection can be
+    narrowed to those intersecting `bbox` (in WGS84) and paged through with
+    `after` and `limit`; `properties` picks which provenance columns each
+    feature carries (all of them by default).
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db select detection features', action='database query record')
+    query = """
+        SELECT d.feature_id,
+               json_build_object(
+                   'id', concat_ws('#', d.job_id, d.feature_id),
+                   'properties', {properties},
+                   'geometry', ST_AsGeoJSON({geometry})::json,
+                   'type', 'Feature'
+               )::text AS "feature"
+          FROM detection d
+               INNER JOIN provenance AS p ON (p.job_id = d.job_id)
+         WHERE d.job_id = %(job_id)s
+           AND (%(xmin)s IS NULL OR ST_Intersects(d.geometry, ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 4326)))
+           AND (%(after)s IS NULL OR d.feature_id > %(after)s)
+         ORDER BY d.feature_id ASC
+         LIMIT %(limit)s
+        """.format(geometry=_detection_geometry(lod), properties=_detection_properties(properties))
+    xmin, ymin, xmax, ymax = bbox or (None, None, None, None)
+    params = {
+        'job_id': job_id,
+        'xmin': xmin,
+        'ymin': ymin,
+        'xmax': xmax,
+        'ymax': ymax,
+        'after': after,
+        'limit': limit,
+    }
+    return conn.execution_options(stream_results=True).execute(query, params)
+
+
+def select_fingerprint_for_productline(
+        conn: Connection,
+        *,
+        productline_id: str,
+        since: datetime) -> ResultProxy:
+    # Changes whenever `select_jobs_for_productline` would return different jobs or statuses
+    log = logging.getLogger(__name__)
+    log.info('Db select fingerprint for productline', action='database query record')
+    query = """
+        SELECT count(*) || ':' || coalesce(md5(string_agg(j.job_id || ':' || j.status, ',' ORDER BY j.job_id)), '')
+          FROM productline_job p
+               INNER JOIN job j ON (j.job_id = p.job_id)
+               INNER JOIN scene s ON (s.scene_id = j.scene_id)
+         WHERE p.productline_id = %(productline_id)s
+           AND (j.status IN ('Submitted', 'Running', 'Success'))
+           AND (s.captured_on >= %(since)s)
+        """
+    params = {
+        'productline_id': productline_id,
+        'since': since,
+    }
+    return conn.execute(query, params)
+
+
+def select_fingerprint_for_scene(
+        conn: Connection,
+        *,
+        scene_id: str) -> ResultProxy:
+    # Changes whenever `select_jobs_for_scene` would return different jobs or statuses
+    log = logging.getLogger(__name__)
+    log.info('Db select fingerprint for scene', action='database query record')
+    query = """
+        SELECT count(*) || ':' || coalesce(md5(string_agg(job_id || ':' || status, ',' ORDER BY job_id)), '')
+          FROM job
+         WHERE scene_id = %(scene_id)s
+           AND status IN ('Submitted', 'Running', 'Success')
+        """
+    params = {
+        'scene_id': scene_id,
+    }
+    return conn.execute(query, params)
+
+
+def select_fingerprint_for_user(
+        conn: Connection,
+        *,
+        user_id: str) -> ResultProxy:
+    # Changes whenever `select_jobs_for_user` would return different jobs or statuses; errors are
+    # only ever recorded alongside a status change
+    log = logging.getLogger(__name__)
+    log.info('Db select fingerprint for user', action='database query record')
+    query = """
+        SELECT count(*) || ':' || coalesce(md5(string_agg(j.job_id || ':' || j.status, ',' ORDER BY j.job_id)), '')
+          FROM job_user u
+               INNER JOIN job j ON (j.job_id = u.job_id)
+         WHERE u.user_id = %(user_id)s
+        """
+    params = {
+        'user_id': user_id,
     }
     return conn.execute(query, params)
 
@@ -196,6 +606,41 @@ def select_job(
     return conn.execute(query, params)
 
 
+def select_job_status(
+        conn: Connection,
+        *,
+        job_id: str) -> ResultProxy:
+    log = logging.getLogger(__name__)
+    log.info('Db select job status', action='database query record')
+    query = """
+        SELECT status FROM job WHERE job_id = %(job_id)s
+        """
+    params = {
+        'job_id': job_id,
+    }
+    return conn.execute(query, params)
+
+
+def select_job_users(
+        conn: Connection,
+        *,
+        job_ids: List[str],
+        user_ids: List[str]) -> ResultProxy:
+    log = logging.getLogger(__name__)
+    log.info('Db select job users', action='database query record')
+    query = """
+        SELECT job_id, user_id
+          FROM job_user
+         WHERE job_id = ANY(%(job_ids)s)
+           AND user_id = ANY(%(user_ids)s)
+        """
+    params = {
+        'job_ids': list(job_ids),
+        'user_ids': list(user_ids),
+    }
+    return conn.execute(query, params)
+
+
 def select_jobs_for_inputs(
         conn: Connection,
         *,
@@ -272,53 +717,154 @@ def select_jobs_for_scene(
 def select_jobs_for_user(
         conn: Connection,
         *,
-        user_id: str) -> ResultProxy:
+        user_id: str,
+        changed_since: datetime = None,
+        statuses: Iterable[str] = None,
+        after: Tuple[datetime, str] = None,
+        limit: int = None,
+        include_geometry: bool = True) -> ResultProxy:
+    """
+    Selects the jobs the user tracks, ordered by `(created_on, job_id)`.  Given
+    `changed_since`, only those whose status or error changed after that time
+    are selected; given `statuses`, only those in one of them.  Pages are read
+    by passing the `(created_on, job_id)` of the last job seen as `after`, so
+    each costs the same no matter how far into the listing it is.
+    """
     log = logging.getLogger(__name__)
     log.info('Db select jobs for users', action='database query record')
+    filters = []
+    if changed_since:
+        filters.append('AND j.updated_on > %(changed_since)s')
+    if statuses is not None:
+        filters.append('AND j.status = ANY(%(statuses)s)')
+    if after:
+        filters.append('AND (j.created_on, j.job_id) > (%(after_created_on)s, %(after_job_id)s)')
     query = """
         SELECT j.job_id, j.algorithm_name, j.algorithm_version, j.created_by, j.created_on, j.name, j.scene_id, j.status, j.tide, j.tide_min_24h, j.tide_max_24h,
                e.error_message, e.execution_step,
-               ST_AsGeoJSON(s.geometry) AS geometry, s.sensor_name, s.captured_on
-          FROM job j
-               LEFT OUTER JOIN job_user u ON (u.job_id = j.job_id)
+               {geometry} AS geometry, s.sensor_name, s.captured_on
+          FROM job_user u
+               INNER JOIN job j ON (j.job_id = u.job_id)
                LEFT OUTER JOIN job_error e ON (e.job_id = j.job_id)
                LEFT OUTER JOIN scene s ON (s.scene_id = j.scene_id)
          WHERE u.user_id = %(user_id)s
-        ORDER BY created_on ASC
-        """
+               {filters}
+        ORDER BY j.created_on ASC, j.job_id ASC
+        {limit}
+        """.format(
+        geometry='ST_AsGeoJSON(s.geometry)' if include_geometry else 'NULL',
+        filters='\n               '.join(filters),
+        limit='LIMIT %(limit)s' if limit is not None else '',
+    )
     params = {
         'user_id': user_id,
+        'changed_since': changed_since,
+        'statuses': list(statuses) if statuses is not None else None,
+        'after_created_on': after[0] if after else None,
+        'after_job_id': after[1] if after else None,
+        'limit': limit,
     }
     return conn.execute(query, params)
 
 
-def select_outstanding_jobs(conn: Connection) -> ResultProxy:
-    log = logging.getLogger(__name__)
-    log.info('Db select outstanding jobs', action='database query record')
-    query = """
-        SELECT job_id,
-               DATE_TRUNC('second', NOW() - created_on) AS age
-          FROM job
-         WHERE status IN ('Submitted', 'Pending', 'Running')
-        ORDER BY created_on ASC
-        """
-    return conn.execute(query)
-
-
 def update_status(
         conn: Connection,
         *,
         job_id: str,
-        status: str) -> None:
+        status: str,
+        from_statuses: Iterable[str] = None) -> int:
+    """
+    Changes a job's status, announcing it on `STATUS_CHANNEL` once the
+    transaction commits.  The row is stamped with the time of the statement
+    rather than of the transaction, which for a job whose detections were
+    saved in the same transaction may have begun long before the change
+    became visible (and so fall behind a client's changes cursor).  Given
+    `from_statuses`, the job is only changed while in one of them.  Returns
+    the number of jobs actually updated.
+    """
     log = logging.getLogger(__name__)
     log.info('Db update status', action='database update record')
     query = """
-        UPDATE job
-           SET status = %(status)s
-         WHERE job_id = %(job_id)s
-        """
+        WITH updated AS (
+            UPDATE job
+               SET status = %(status)s,
+                   updated_on = clock_timestamp()
+             WHERE job_id = %(job_id)s
+               AND (%(from_statuses)s IS NULL OR status = ANY(%(from_statuses)s))
+            RETURNING job_id, status
+        )
+        SELECT {}
+          FROM updated
+        """.format(_NOTIFY_STATUS)
     params = {
         'job_id': job_id,
         'status': status,
+        'from_statuses': list(from_statuses) if from_statuses is not None else None,
     }
-    conn.execute(query, params)
+    return conn.execute(query, params).rowcount
+
+
+def update_statuses(
+        conn: Connection,
+        *,
+        statuses: Dict[str, str]) -> int:
+    """
+    Applies many status changes with one multi-row `UPDATE`, leaving rows
+    whose status would not change untouched (so they do not churn out dead
+    tuples).  Each change is announced on `STATUS_CHANNEL` once the
+    transaction commits.  Returns the number of jobs actually updated.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db update statuses', action='database update record')
+    if not statuses:
+        return 0
+    query = """
+        WITH updated AS (
+            UPDATE job j
+               SET status = v.status,
+                   updated_on = clock_timestamp()
+              FROM (VALUES {}) AS v (job_id, status)
+             WHERE j.job_id = v.job_id
+               AND j.status IS DISTINCT FROM v.status
+            RETURNING j.job_id, j.status
+        )
+        SELECT {}
+          FROM updated
+        """.format(', '.join('(%(job_id_{0})s, %(status_{0})s)'.format(i) for i in range(len(statuses))),
+                   _NOTIFY_STATUS)
+    params = {}
+    for i, (job_id, status) in enumerate(sorted(statuses.items())):
+        params['job_id_{}'.format(i)] = job_id
+        params['status_{}'.format(i)] = status
+    return conn.execute(query, params).rowcount
+
+
+#
+# Helpers
+#
+
+_NOTIFY_STATUS = """pg_notify('{}', json_build_object('job_id', job_id, 'status', status)::text)""".format(STATUS_CHANNEL)
+
+
+def _detection_geometry(lod: int) -> str:
+    if not 0 <= lod <= len(DETECTION_LOD_TOLERANCES):
+        raise ValueError('no detection geometry tier {}'.format(lod))
+    if not lod:
+        return 'd.geometry'
+    # Detections saved before tiers were introduced only have the full geometry
+    return 'COALESCE(d.geometry_lod{}, d.geometry)'.format(lod)
+
+
+def _detection_properties(properties: Iterable[str] = None) -> str:
+    if properties is None:
+        return 'to_json(p)'
+    properties = list(properties)
+    for name in properties:
+        if name not in DETECTION_PROPERTIES:
+            raise ValueError('no detection property `{}`'.format(name))
+    return 'json_build_object({})'.format(', '.join("'{0}', p.{0}".format(name) for name in properties))
+
+
+def _flush_copy_buffer(cursor, query: str, buffer: io.StringIO) -> None:
+    buffer.seek(0)
+    cursor.copy_expert(query, buffer)
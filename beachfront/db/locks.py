@@ -0,0 +1,98 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import logging
+
+from beachfront.db import Connection
+
+# Namespaces the advisory locks below away from any other application sharing the database
+LOCK_NAMESPACE = 0x6266  # 'bf'
+
+
+#
+# Advisory locks are held by the session, so these run outside of a transaction
+# (via `autocommit`) to avoid leaving the connection idle in one.
+#
+
+def advisory_lock(
+        conn: Connection,
+        *,
+        key: int) -> None:
+    """
+    Waits for as long as it takes another session to release the lock.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db advisory lock', action='database acquire lock', actee=str(key))
+    query = """
+        SELECT pg_advisory_lock(%(namespace)s, %(key)s)
+        """
+    params = {
+        'namespace': LOCK_NAMESPACE,
+        'key': key,
+    }
+    conn.execution_options(autocommit=True).execute(query, params)
+
+
+def advisory_unlock(
+        conn: Connection,
+        *,
+        key: int) -> bool:
+    log = logging.getLogger(__name__)
+    log.info('Db release advisory lock', action='database release lock', actee=str(key))
+    query = """
+        SELECT pg_advisory_unlock(%(namespace)s, %(key)s)
+        """
+    params = {
+        'namespace': LOCK_NAMESPACE,
+        'key': key,
+    }
+    return conn.execution_options(autocommit=True).execute(query, params).scalar()
+
+
+def holds_advisory_lock(
+        conn: Connection,
+        *,
+        key: int) -> bool:
+    query = """
+        SELECT EXISTS (
+            SELECT 1
+              FROM pg_locks
+             WHERE locktype = 'advisory'
+               AND pid = pg_backend_pid()
+               AND classid = %(namespace)s
+               AND objid = %(key)s
+               AND objsubid = 2
+               AND granted
+        )
+        """
+    params = {
+        'namespace': LOCK_NAMESPACE,
+        'key': key,
+    }
+    return conn.execution_options(autocommit=True).execute(query, params).scalar()
+
+
+def try_advisory_lock(
+        conn: Connection,
+        *,
+        key: int) -> bool:
+    log = logging.getLogger(__name__)
+    log.info('Db try advisory lock', action='database acquire lock', actee=str(key))
+    query = """
+        SELECT pg_try_advisory_lock(%(namespace)s, %(key)s)
+        """
+    params = {
+        'namespace': LOCK_NAMESPACE,
+        'key': key,
+    }
+    return conn.execution_options(autocommit=True).execute(query, params).scalar()
@@ -106,6 +106,18 @@ def select_all(conn: Connection):
     return conn.execute(query)
 
 
+def select_fingerprint(conn: Connection) -> ResultProxy:
+    # Changes whenever `select_all` would return different product lines, which are never edited
+    log = logging.getLogger(__name__)
+    log.info('Db select fingerprint', action='database query record')
+    query = """
+        SELECT count(*) || ':' || coalesce(md5(string_agg(productline_id, ',' ORDER BY productline_id)), '')
+          FROM productline
+         WHERE NOT deleted
+        """
+    return conn.execute(query)
+
+
 def select_productline(
         conn: Connection,
         *,
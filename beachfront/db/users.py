@@ -15,6 +15,8 @@ import logging
 
 from beachfront.db import Connection, ResultProxy
 
+API_KEY_CHANNEL = 'api_key_rotated'  # Every credential reset is announced here via NOTIFY
+
 
 def select_password_hash(
         conn: Connection,
@@ -85,3 +87,33 @@ def insert_user(
         'api_key': api_key,
     }
     conn.execute(query, params)
+
+
+def listen_for_api_key_rotations(conn: Connection) -> None:
+    """
+    Subscribes an autocommitting connection to the announcements made on
+    `API_KEY_CHANNEL`, which carry the ID of the user whose key was replaced.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db listen for api key rotations', action='database listen')
+    conn.execute('LISTEN {}'.format(API_KEY_CHANNEL))
+
+
+def notify_api_key_rotated(
+        conn: Connection,
+        *,
+        user_id: str) -> None:
+    """
+    Announces on `API_KEY_CHANNEL` that a user's API key was replaced, once the
+    transaction commits, so that every process stops honoring the old one.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Db notify api key rotated', action='database notify', actee=user_id)
+    query = """
+        SELECT pg_notify(%(channel)s, %(user_id)s)
+        """
+    params = {
+        'channel': API_KEY_CHANNEL,
+        'user_id': user_id,
+    }
+    conn.execute(query, params)
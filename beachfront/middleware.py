@@ -11,11 +11,24 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import collections
 import logging
 import re
+import zlib
+from typing import Iterable, Iterator
 
 import flask
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from beachfront.config import ENFORCE_HTTPS
 from beachfront.services import users
 
@@ -27,6 +40,22 @@ PATTERNS_PUBLIC_ENDPOINTS = (
     re.compile(r'^/v0/scene/[^/]+.TIF$'),
 )
 
+COMPRESSIBLE_MIMETYPES = (
+    'application/geo+json',
+    'application/javascript',
+    'application/json',
+    'application/vnd.geo+json',
+    'application/vnd.mapbox-vector-tile',
+    'application/xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/plain',
+    'text/xml',
+)
+COMPRESSION_LEVEL = 6
+COMPRESSION_MIN_SIZE = 1024
+
 
 def apply_default_response_headers(response: flask.Response) -> flask.Response:
     response.headers.setdefault('X-Frame-Options', 'DENY')
@@ -36,6 +65,51 @@ def apply_default_response_headers(response: flask.Response) -> flask.Response:
     return response
 
 
+def compress_response(response: flask.Response) -> flask.Response:
+    """
+    Compresses text-like responses with the best encoding the client accepts.
+    Buffered bodies are compressed in one go; streamed bodies are compressed
+    chunk by chunk as they are sent, so they are never held in memory whole.
+    Images (e.g., WMS tiles) and anything already encoded pass through as-is.
+    """
+    request = flask.request
+
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.direct_passthrough):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = _negotiate_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        body = response.response
+        if hasattr(body, 'close'):
+            # Abandoning the compressed stream must still release the original (e.g., its db connection)
+            response.call_on_close(body.close)
+        response.response = _compress_chunks(response.iter_encoded(), _COMPRESSORS[encoding]())
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(b''.join(_compress_chunks([data], _COMPRESSORS[encoding]())))
+
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed bytes differ from the original, so only a weak validator still holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
 def auth_filter():
     log = logging.getLogger(__name__)
     request = flask.request
@@ -150,8 +224,61 @@ def https_filter():
 # Helpers
 #
 
+def _compress_chunks(chunks: Iterable[bytes], compressor) -> Iterator[bytes]:
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _gzip_compressor():
+    return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _brotli_compressor():
+    return _BrotliCompressor(brotli.Compressor(quality=5))
+
+
+def _zstd_compressor():
+    return zstandard.ZstdCompressor(level=3).compressobj()
+
+
+def _negotiate_encoding(accepted) -> str:
+    best, best_quality = None, 0
+    for encoding in _COMPRESSORS:
+        quality = accepted.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
 def _is_public_endpoint(path: str) -> bool:
     for pattern in PATTERNS_PUBLIC_ENDPOINTS:
         if re.match(pattern, path):
             return True
     return False
+
+
+class _BrotliCompressor:
+    """
+    Gives `brotli.Compressor` the same `compress()`/`flush()` shape as zlib's.
+    """
+
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+# In order of preference when the client accepts several equally
+_COMPRESSORS = collections.OrderedDict()
+if brotli:
+    _COMPRESSORS['br'] = _brotli_compressor
+if zstandard:
+    _COMPRESSORS['zstd'] = _zstd_compressor
+_COMPRESSORS['gzip'] = _gzip_compressor
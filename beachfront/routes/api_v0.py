@@ -11,8 +11,10 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import hashlib
 from datetime import datetime
 from json import JSONDecodeError
+from typing import List, Tuple
 
 import dateutil.parser
 import dateutil.tz
@@ -20,14 +22,19 @@ import flask
 
 from beachfront.db import DatabaseError
 from beachfront.services import (algorithms as _algorithms,
+                                 events as _events,
                                  geoserver as _geoserver,
                                  jobs as _jobs,
                                  productlines as _productlines,
-                                 scenes as _scenes)
+                                 scenes as _scenes,
+                                 tiles as _tiles)
 
 
 blueprint = flask.Blueprint('v0', __name__)
 
+# Lets clients keep a copy, as long as they revalidate it on every use
+CACHE_CONTROL_REVALIDATE = 'private, no-cache'
+
 
 #
 # Algorithms
@@ -88,17 +95,44 @@ def create_job():
 
 @blueprint.route('/job/<job_id>.geojson', methods=['GET'])
 def download_geojson(job_id: str):
+    args = flask.request.args
+    try:
+        resolution = _get_query_number(args, 'resolution', min_value=0)
+        bbox = _get_query_bbox(args, 'bbox')
+        cursor = _get_query_number(args, 'cursor', min_value=0, integer=True)
+        limit = _get_query_number(args, 'limit', min_value=1, integer=True)
+        properties = _get_query_list(args, 'properties')
+    except ValidationError as err:
+        return 'Invalid input: {}'.format(err), 400
+
+    # Only a finished job's detections are immutable enough to validate
     try:
-        detections = _jobs.get_detections(job_id)
+        fingerprint = _jobs.get_detections_fingerprint(job_id)
+    except DatabaseError:
+        return 'A database error prevents detection download', 500
+    etag = _get_etag('detections', fingerprint, resolution, bbox, cursor, limit, properties) if fingerprint else None
+    if etag and _is_not_modified(etag):
+        return _revalidated(flask.Response(status=304), etag)
+
+    try:
+        detections = _jobs.get_detections_stream(
+            job_id,
+            resolution=resolution,
+            bbox=bbox,
+            cursor=cursor,
+            limit=limit,
+            properties=properties,
+        )
+    except _jobs.InvalidQuery as err:
+        return 'Invalid input: {}'.format(err), 400
     except _jobs.NotFound:
         return 'Job not found', 404
     except _jobs.Error as err:
         return 'Cannot download: {}'.format(err), 500
     except DatabaseError:
         return 'A database error prevents detection download', 500
-    return detections, 200, {
-        'Content-Type': 'application/vnd.geo+json',
-    }
+    response = flask.Response(detections, 200, content_type='application/vnd.geo+json')
+    return _revalidated(response, etag) if etag else response
 
 
 @blueprint.route('/job/<job_id>', methods=['DELETE'])
@@ -112,13 +146,50 @@ def forget_job(job_id: str):
 
 @blueprint.route('/job', methods=['GET'])
 def list_jobs():
-    jobs = _jobs.get_all(flask.request.user.user_id)
-    return flask.jsonify({
+    user_id = flask.request.user.user_id
+    args = flask.request.args
+
+    try:
+        changed_since = _get_query_cursor(args, 'changed_since')
+        statuses = _get_query_list(args, 'status') or None  # A bare `?status=` filters nothing
+        after = _get_query_page_cursor(args, 'after')
+        limit = _get_query_number(args, 'limit', min_value=1, integer=True)
+        include_geometry = _get_query_flag(args, 'geometry', default=True)
+    except ValidationError as err:
+        return 'Invalid input: {}'.format(err), 400
+
+    # Deltas are not revalidated; fingerprinted first, so a change made while listing at worst costs a refetch
+    etag = None
+    if not changed_since:
+        etag = _get_etag('jobs', _jobs.get_all_fingerprint(user_id), statuses, after, limit, include_geometry)
+        if _is_not_modified(etag):
+            return _revalidated(flask.Response(status=304), etag)
+
+    cursor = _jobs.get_changes_cursor()
+    try:
+        jobs = _jobs.get_all(
+            user_id,
+            changed_since=changed_since,
+            statuses=statuses,
+            after=after,
+            limit=limit + 1 if limit else None,  # One extra tells whether another page follows
+            include_geometry=include_geometry,
+        )
+    except _jobs.InvalidQuery as err:
+        return 'Invalid input: {}'.format(err), 400
+
+    body = {
+        'cursor': _serialize_cursor(cursor),
         'jobs': {
             'type': 'FeatureCollection',
-            'features': [j.serialize() for j in jobs],
+            'features': [j.serialize() for j in jobs[:limit]],
         },
-    })
+    }
+    if limit and len(jobs) > limit:
+        body['next_after'] = _serialize_page_cursor(jobs[limit - 1])
+
+    response = flask.jsonify(body)
+    return _revalidated(response, etag) if etag else response
 
 
 @blueprint.route('/job/by_productline/<productline_id>', methods=['GET'])
@@ -129,26 +200,50 @@ def list_jobs_for_productline(productline_id: str):
         ).replace(tzinfo=dateutil.tz.tzutc())  # type: datetime
     except ValueError:
         return 'Invalid input: `since` value cannot be parsed as a valid date', 400
+
+    etag = _get_etag('jobs_for_productline', productline_id, since.isoformat(),
+                     _jobs.get_by_productline_fingerprint(productline_id, since))
+    if _is_not_modified(etag):
+        return _revalidated(flask.Response(status=304), etag)
+
     jobs = _jobs.get_by_productline(productline_id, since)
-    return flask.jsonify({
+    return _revalidated(flask.jsonify({
         'productline_id': productline_id,
         'since': since.isoformat(),
         'jobs': {
             'type': 'FeatureCollection',
             'features': [j.serialize() for j in jobs],
         },
-    })
+    }), etag)
 
 
 @blueprint.route('/job/by_scene/<scene_id>', methods=['GET'])
 def list_jobs_for_scene(scene_id: str):
+    etag = _get_etag('jobs_for_scene', scene_id, _jobs.get_by_scene_fingerprint(scene_id))
+    if _is_not_modified(etag):
+        return _revalidated(flask.Response(status=304), etag)
+
     jobs = _jobs.get_by_scene(scene_id)
-    return flask.jsonify({
+    return _revalidated(flask.jsonify({
         'scene_id': scene_id,
         'jobs': {
             'type': 'FeatureCollection',
             'features': [j.serialize() for j in jobs],
         }
+    }), etag)
+
+
+@blueprint.route('/job/events', methods=['GET'])
+def stream_job_events():
+    try:
+        events = _events.stream(flask.request.user.user_id)
+    except _events.TooManyStreams:
+        return flask.Response('Too many job event streams are open; poll instead', 503, {
+            'Retry-After': '30',
+        })
+    return flask.Response(events, 200, content_type=_events.MIMETYPE, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
     })
 
 
@@ -224,13 +319,17 @@ def delete_productline(productline_id: str):
 
 @blueprint.route('/productline', methods=['GET'])
 def list_productlines():
+    etag = _get_etag('productlines', _productlines.get_all_fingerprint())
+    if _is_not_modified(etag):
+        return _revalidated(flask.Response(status=304), etag)
+
     productlines = _productlines.get_all()
-    return flask.jsonify({
+    return _revalidated(flask.jsonify({
         'productlines': {
             'type': 'FeatureCollection',
             'features': [p.serialize() for p in productlines],
         },
-    })
+    }), etag)
 
 
 #
@@ -279,6 +378,26 @@ def forward_to_geotiff(scene_id: str):
     return flask.render_template('download_scene.jinja2', scene_id=scene_id), 202
 
 
+#
+# Tiles
+#
+
+@blueprint.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_detection_tile(z: int, x: int, y: int):
+    try:
+        tile = _tiles.get_tile(
+            z, x, y,
+            job_id=flask.request.args.get('job_id'),
+            productline_id=flask.request.args.get('productline_id'),
+            scene_id=flask.request.args.get('scene_id'),
+        )
+    except _tiles.InvalidTile as err:
+        return 'Invalid input: {}'.format(err), 400
+    except DatabaseError:
+        return 'A database error prevents retrieving this tile', 500
+    return flask.Response(tile, 200, content_type=_tiles.MIMETYPE)
+
+
 #
 # Helpers
 #
@@ -296,6 +415,10 @@ def _get_datetime(d: dict, key: str, *, nullable: bool = False) -> datetime:
     return value
 
 
+def _get_etag(*parts) -> str:
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
 def _get_number(d: dict, key: str, *, min_value: int = None, max_value: int = None):
     if key not in d:
         raise ValidationError('`{}` is missing'.format(key))
@@ -307,6 +430,79 @@ def _get_number(d: dict, key: str, *, min_value: int = None, max_value: int = No
     return value
 
 
+def _get_query_bbox(args: dict, key: str) -> Tuple[float, float, float, float]:
+    value = args.get(key)
+    if value is None:
+        return None
+    try:
+        minx, miny, maxx, maxy = (float(n) for n in value.split(','))
+    except ValueError:
+        raise ValidationError('`{}` must be four comma-separated numbers'.format(key))
+    if not (-180 <= minx <= maxx <= 180 and -90 <= miny <= maxy <= 90):
+        raise ValidationError('`{}` must be `min_lon,min_lat,max_lon,max_lat` in degrees'.format(key))
+    return minx, miny, maxx, maxy
+
+
+def _get_query_cursor(args: dict, key: str) -> datetime:
+    value = args.get(key)
+    if not value:
+        return None
+    try:
+        cursor = dateutil.parser.parse(value)  # type: datetime
+    except (ValueError, OverflowError):
+        cursor = None
+    if not cursor or not cursor.tzinfo:
+        raise ValidationError('`{}` must be a cursor from a previous listing'.format(key))
+    return cursor
+
+
+def _get_query_flag(args: dict, key: str, *, default: bool) -> bool:
+    value = args.get(key)
+    if value is None:
+        return default
+    if value.lower() in ('1', 'true'):
+        return True
+    if value.lower() in ('0', 'false'):
+        return False
+    raise ValidationError('`{}` must be `true` or `false`'.format(key))
+
+
+def _get_query_list(args: dict, key: str) -> List[str]:
+    value = args.get(key)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _get_query_number(args: dict, key: str, *, min_value: float = None, max_value: float = None, integer: bool = False):
+    value = args.get(key)
+    if value is None:
+        return None
+    try:
+        value = int(value) if integer else float(value)
+    except ValueError:
+        raise ValidationError('`{}` must be {}'.format(key, 'an integer' if integer else 'a number'))
+    if min_value is not None and value < min_value:
+        raise ValidationError('`{}` must be at least {}'.format(key, min_value))
+    if max_value is not None and value > max_value:
+        raise ValidationError('`{}` must be at most {}'.format(key, max_value))
+    return value
+
+
+def _get_query_page_cursor(args: dict, key: str) -> Tuple[datetime, str]:
+    value = args.get(key)
+    if not value:
+        return None
+    created_on, _, job_id = value.partition('_')
+    try:
+        created_on = dateutil.parser.parse(created_on)  # type: datetime
+    except (ValueError, OverflowError):
+        created_on = None
+    if not created_on or not created_on.tzinfo or not job_id:
+        raise ValidationError('`{}` must be a cursor from a previous page'.format(key))
+    return created_on, job_id
+
+
 def _get_string(d: dict, key: str, *, nullable: bool = False, min_length: int = 1, max_length: int = 256):
     if key not in d:
         raise ValidationError('`{}` is missing'.format(key))
@@ -321,6 +517,27 @@ def _get_string(d: dict, key: str, *, nullable: bool = False, min_length: int =
     return value
 
 
+def _is_not_modified(etag: str) -> bool:
+    # If-None-Match is always compared weakly (as RFC 7232 says)
+    return flask.request.if_none_match.contains_weak(etag)
+
+
+def _revalidated(response: flask.Response, etag: str) -> flask.Response:
+    # Weak whether or not the body ends up compressed, so a 304 carries the same validator as its 200
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = CACHE_CONTROL_REVALIDATE
+    return response
+
+
+def _serialize_cursor(cursor: datetime) -> str:
+    # UTC with a `Z`, so there is no `+` to be mangled in a query string
+    return cursor.astimezone(dateutil.tz.tzutc()).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _serialize_page_cursor(job: _jobs.Job) -> str:
+    return '{}_{}'.format(_serialize_cursor(job.created_on), job.job_id)
+
+
 #
 # Errors
 #
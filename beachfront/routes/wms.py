@@ -18,8 +18,8 @@ from ..services import geoserver
 
 def wms_proxy():
     try:
-        content, content_type = geoserver.get_wms_tile(dict(flask.request.args))
-        return flask.Response(content, content_type=content_type)
+        body, headers = geoserver.get_wms_tile(dict(flask.request.args))
+        return flask.Response(body, headers=headers)
     except geoserver.Unreachable:
         return 'Error: GeoServer is unreachable', 502
     except geoserver.Error:
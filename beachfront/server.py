@@ -25,6 +25,7 @@ def apply_middlewares(app: flask.Flask):
     app.before_request(middleware.csrf_filter)
     app.before_request(middleware.auth_filter)
     app.after_request(middleware.apply_default_response_headers)
+    app.after_request(middleware.compress_response)
 
 
 def attach_routes(app: flask.Flask):
@@ -100,6 +101,8 @@ def install_service_assets():
 
 
 def start_background_tasks():
+    db.start_index_builder()
+    services.events.start_listener()
     services.jobs.start_worker()
 
 
@@ -12,9 +12,25 @@
 # specific language governing permissions and limitations under the License.
 
 import logging
+import threading
+import time
 from typing import List
 
+from beachfront.config import ALGORITHM_CACHE_MAX_STALE, ALGORITHM_CACHE_TTL
 from beachfront.services import piazza
+from beachfront.utils.singleflight import SingleFlight
+
+_cache_lock = threading.Lock()
+_cache_refreshing = False
+_cache_snapshot = None  # type: List[Algorithm]
+_cache_fetched_at = 0.0
+_cache_flights = SingleFlight()
+_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'stale_hits': 0,
+    'refreshes': 0,
+}
 
 
 #
@@ -53,9 +69,80 @@ class Algorithm:
 # Actions
 #
 
+def get(service_id: str) -> Algorithm:
+    log = logging.getLogger(__name__)
+    log.info('Algorithms service get algorithms', action=' service algorithms get')
+
+    snapshot = _read_cache()
+    if snapshot is None:
+        # Fill the cache for everyone rather than fetching just this one
+        _count('misses')
+        snapshot = _refresh()
+    for algorithm in snapshot:
+        if algorithm.service_id == service_id:
+            return algorithm
+
+    _count('misses')
+    try:
+        log.info('Fetch beachfront service `%s` from Piazza', service_id, action='fetch service', actee=service_id)
+        service = piazza.get_service(service_id)
+    except piazza.ServerError as err:
+        log.error('Service lookup failed: %s', err)
+        if err.status_code == 404:
+            raise NotFound(service_id)
+        raise
+    except piazza.Error as err:
+        log.error('Service lookup failed: %s', err)
+        raise
+    if 'metadata' not in service.metadata:
+        raise ValidationError('missing `metadata` hash')
+    try:
+        return _to_algorithm(service)
+    except ValidationError as err:
+        log.error('Algorithm conversion failed: %s', err)
+        raise
+
+
+def get_cache_stats() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats['cached'] = len(_cache_snapshot) if _cache_snapshot is not None else 0
+        stats['age'] = time.time() - _cache_fetched_at if _cache_snapshot is not None else None
+    return stats
+
+
+def invalidate() -> None:
+    global _cache_snapshot, _cache_fetched_at
+    log = logging.getLogger(__name__)
+    log.info('Invalidating algorithm cache', action='invalidate algorithm cache')
+    with _cache_lock:
+        _cache_snapshot = None
+        _cache_fetched_at = 0.0
+
+
 def list_all() -> List[Algorithm]:
     log = logging.getLogger(__name__)
     log.info('Algorithms service list all algorithms', action='Service algorithms list all ')
+
+    snapshot = _read_cache()
+    if snapshot is not None:
+        return list(snapshot)
+
+    _count('misses')
+    return list(_refresh())
+
+
+#
+# Helpers
+#
+
+def _count(stat: str):
+    with _cache_lock:
+        _cache_stats[stat] += 1
+
+
+def _fetch_all() -> List[Algorithm]:
+    log = logging.getLogger(__name__)
     try:
         log.info('Fetching beachfront services from Piazza', action='fetch services')
         services = piazza.get_services('^BF_Algo_')
@@ -69,53 +156,80 @@ def list_all() -> List[Algorithm]:
             log.warning('Algorithm <%s> missing `metadata` hash', service.service_id)
             continue
         try:
-            algorithms.append(Algorithm(
-                interface=_extract_interface(service),
-                description=_extract_description(service),
-                max_cloud_cover=_extract_max_cloud_cover(service),
-                name=_extract_name(service),
-                service_id=service.service_id,
-                version=_extract_version(service),
-            ))
+            algorithms.append(_to_algorithm(service))
         except ValidationError as err:
             log.error('Algorithm conversion failed: %s', err)
             continue
     return algorithms
 
 
-def get(service_id: str) -> Algorithm:
+def _read_cache() -> List[Algorithm]:
+    """
+    Returns the cached snapshot while it is fresh.  Once it goes stale it is still
+    served (up to `ALGORITHM_CACHE_MAX_STALE` past its TTL) while a background
+    thread refreshes it; after that, callers must wait for Piazza.
+    """
+    global _cache_refreshing
+    with _cache_lock:
+        if _cache_snapshot is None:
+            return None
+
+        age = time.time() - _cache_fetched_at
+        if age < ALGORITHM_CACHE_TTL.total_seconds():
+            _cache_stats['hits'] += 1
+            return _cache_snapshot
+
+        if age >= (ALGORITHM_CACHE_TTL + ALGORITHM_CACHE_MAX_STALE).total_seconds():
+            return None
+
+        _cache_stats['stale_hits'] += 1
+        if not _cache_refreshing:
+            _cache_refreshing = True
+            threading.Thread(target=_refresh_in_background, daemon=True).start()
+        return _cache_snapshot
+
+
+def _refresh() -> List[Algorithm]:
+    """
+    Replaces the cached snapshot from Piazza.  Callers that arrive while a
+    refresh is already underway share its result instead of starting another.
+    """
+    algorithms, _ = _cache_flights.do('algorithms', _replace_snapshot)
+    return algorithms
+
+
+def _refresh_in_background():
+    global _cache_refreshing
     log = logging.getLogger(__name__)
-    log.info('Algorithms service get algorithms', action=' service algorithms get')
     try:
-        log.info('Fetch beachfront service `%s` from Piazza', service_id, action='fetch service', actee=service_id)
-        service = piazza.get_service(service_id)
-    except piazza.ServerError as err:
-        log.error('Service lookup failed: %s', err)
-        if err.status_code == 404:
-            raise NotFound(service_id)
-        raise
-    except piazza.Error as err:
-        log.error('Service lookup failed: %s', err)
-        raise
-    if 'metadata' not in service.metadata:
-        raise ValidationError('missing `metadata` hash')
-    try:
-        return Algorithm(
-            interface=_extract_interface(service),
-            description=_extract_description(service),
-            max_cloud_cover=_extract_max_cloud_cover(service),
-            name=_extract_name(service),
-            service_id=service.service_id,
-            version=_extract_version(service),
-        )
-    except ValidationError as err:
-        log.error('Algorithm conversion failed: %s', err)
-        raise
+        _refresh()
+    except Exception as err:
+        log.warning('Background refresh of algorithm cache failed: %s', err)
+    finally:
+        with _cache_lock:
+            _cache_refreshing = False
 
 
-#
-# Helpers
-#
+def _replace_snapshot() -> List[Algorithm]:
+    global _cache_snapshot, _cache_fetched_at
+    algorithms = _fetch_all()
+    with _cache_lock:
+        _cache_snapshot = algorithms
+        _cache_fetched_at = time.time()
+        _cache_stats['refreshes'] += 1
+    return algorithms
+
+
+def _to_algorithm(service: piazza.ServiceDescriptor) -> Algorithm:
+    return Algorithm(
+        interface=_extract_interface(service),
+        description=_extract_description(service),
+        max_cloud_cover=_extract_max_cloud_cover(service),
+        name=_extract_name(service),
+        service_id=service.service_id,
+        version=_extract_version(service),
+    )
+
 
 def _extract_bands(service: piazza.ServiceDescriptor) -> tuple:
     value = service.metadata['metadata'].get('ImgReq-bands')
@@ -0,0 +1,287 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from typing import Dict, Iterator, List, Set
+
+from beachfront import db
+from beachfront.config import JOB_EVENTS_HEARTBEAT, JOB_EVENTS_MAX_STREAMS, JOB_EVENTS_STREAM_TTL
+from beachfront.services import geoserver, tiles, users
+
+MIMETYPE = 'text/event-stream'
+POLL_TIMEOUT = 30  # seconds
+QUEUE_SIZE = 100
+RECONNECT_DELAY = 5  # seconds
+RETRY_DELAY = 3000  # milliseconds
+
+_listener = None  # type: _Listener
+_listener_lock = threading.Lock()
+
+
+#
+# Actions
+#
+
+def stream(user_id: str) -> Iterator[str]:
+    """
+    Returns an iterator of server-sent events announcing each status change
+    that any server process records for the jobs the user tracks.  Streams end
+    after `JOB_EVENTS_STREAM_TTL` (or as soon as events may have been lost), at
+    which point the browser reconnects on its own; clients should then catch up
+    by listing the jobs changed since their last cursor.
+    """
+    log = logging.getLogger(__name__)
+
+    listener = _get_listener()
+    subscription = listener.subscribe(user_id)
+
+    log.info('Opened job event stream', action='open event stream', actee=user_id)
+    return _EventStream(listener, subscription)
+
+
+def start_listener():
+    """
+    Starts this process's listener ahead of any stream, so that its WMS and
+    vector tile caches drop a job's tiles as soon as any process saves that
+    job's detections, and its API key cache forgets keys as soon as they are
+    reset.
+    """
+    _get_listener()
+
+
+#
+# Helpers
+#
+
+class _Subscription:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.events = queue.Queue(maxsize=QUEUE_SIZE)
+        self.stale = False
+
+    def put(self, event: dict):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # Consumer cannot keep up; let it resync rather than silently drop events
+            self.stale = True
+
+
+class _EventStream:
+    """
+    Iterates over the events of one subscription.  This is a class rather than
+    a generator so that the subscription is released even when the response is
+    closed before it is ever iterated.
+    """
+
+    def __init__(self, listener, subscription: _Subscription):
+        self._listener = listener
+        self._subscription = subscription
+        self._events = self._generate()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+        self._release()
+
+    def _generate(self) -> Iterator[str]:
+        subscription = self._subscription
+        deadline = time.monotonic() + JOB_EVENTS_STREAM_TTL.total_seconds()
+
+        yield 'retry: {}\n\n'.format(RETRY_DELAY)
+
+        try:
+            while not subscription.stale:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    event = subscription.events.get(timeout=min(remaining, JOB_EVENTS_HEARTBEAT.total_seconds()))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+
+                yield 'event: status\ndata: {}\n\n'.format(json.dumps(event))
+        finally:
+            self._release()
+
+    def _release(self):
+        log = logging.getLogger(__name__)
+        if self._listener.unsubscribe(self._subscription):
+            log.info('Closed job event stream', action='close event stream', actee=self._subscription.user_id)
+
+
+class _Listener(threading.Thread):
+    """
+    Holds one dedicated connection per process that LISTENs for job status
+    announcements and fans them out to the subscribed streams, so that open
+    streams cost neither a pooled connection nor a query apiece.  It also
+    keeps the process's tile caches in step with jobs that succeed anywhere,
+    and its API key cache in step with credential resets.
+    """
+
+    def __init__(self):
+        super().__init__(name='job-events', daemon=True)
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # type: Dict[str, Set[_Subscription]]
+        self._count = 0
+        self._listened = False
+
+    def subscribe(self, user_id: str) -> _Subscription:
+        with self._lock:
+            if self._count >= JOB_EVENTS_MAX_STREAMS:
+                raise TooManyStreams()
+            subscription = _Subscription(user_id)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: _Subscription) -> bool:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if not subscriptions or subscription not in subscriptions:
+                return False
+            subscriptions.remove(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+            self._count -= 1
+        return True
+
+    def run(self):
+        log = logging.getLogger(__name__)
+        while True:
+            try:
+                self._listen()
+            except Exception as err:
+                log.error('Job event listener failed: %s', err)
+            self._invalidate_all()
+            time.sleep(RECONNECT_DELAY)
+
+    def dispatch(self, payloads: List[str]):
+        log = logging.getLogger(__name__)
+
+        events = []
+        for payload in payloads:
+            try:
+                event = json.loads(payload)
+                events.append({'job_id': event['job_id'], 'status': event['status']})
+            except (ValueError, KeyError, TypeError):
+                log.warning('Discarding malformed job event: %s', payload)
+
+        for event in events:
+            if event['status'] == 'Success':
+                geoserver.invalidate_tiles(event['job_id'])
+                tiles.invalidate(event['job_id'])
+
+        with self._lock:
+            user_ids = list(self._subscriptions)
+        if not events or not user_ids:
+            return
+
+        conn = db.get_connection()
+        try:
+            rows = db.jobs.select_job_users(
+                conn,
+                job_ids={e['job_id'] for e in events},
+                user_ids=user_ids,
+            ).fetchall()
+        except db.DatabaseError as err:
+            log.error('Could not look up the users of changed jobs')
+            db.print_diagnostics(err)
+            self._invalidate_all()
+            return
+        finally:
+            conn.close()
+
+        users_by_job = {}  # type: Dict[str, Set[str]]
+        for row in rows:
+            users_by_job.setdefault(row['job_id'], set()).add(row['user_id'])
+
+        with self._lock:
+            for event in events:
+                for user_id in users_by_job.get(event['job_id'], ()):
+                    for subscription in self._subscriptions.get(user_id, ()):
+                        subscription.put(event)
+
+    def _invalidate_all(self):
+        with self._lock:
+            for subscriptions in self._subscriptions.values():
+                for subscription in subscriptions:
+                    subscription.stale = True
+
+    def _listen(self):
+        log = logging.getLogger(__name__)
+
+        conn = db.get_connection()
+        conn.detach()  # Keep a LISTENing session out of the pool
+        try:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            db.jobs.listen_for_status_changes(conn)
+            db.users.listen_for_api_key_rotations(conn)
+            log.info('Listening for job status changes', action='listen', actee=db.jobs.STATUS_CHANNEL)
+            if self._listened:
+                # Announcements made while we were disconnected are lost
+                geoserver.get_tile_cache().clear()
+                tiles.get_tile_cache().clear()
+                users.forget_all_api_keys()
+            self._listened = True
+
+            raw_conn = conn.connection.connection
+            while True:
+                if not select.select([raw_conn], [], [], POLL_TIMEOUT)[0]:
+                    continue
+                raw_conn.poll()
+                notifies = list(raw_conn.notifies)
+                del raw_conn.notifies[:]
+                for notify in notifies:
+                    if notify.channel == db.users.API_KEY_CHANNEL:
+                        users.forget_api_key(user_id=notify.payload)
+                statuses = [n.payload for n in notifies if n.channel == db.jobs.STATUS_CHANNEL]
+                if statuses:
+                    self.dispatch(statuses)
+        finally:
+            conn.close()
+
+
+def _get_listener() -> _Listener:
+    global _listener
+    with _listener_lock:
+        if not _listener or not _listener.is_alive():
+            _listener = _Listener()
+            _listener.start()
+        return _listener
+
+
+#
+# Errors
+#
+
+class Error(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class TooManyStreams(Error):
+    def __init__(self):
+        super().__init__('too many job event streams are open')
@@ -12,48 +12,170 @@
 # specific language governing permissions and limitations under the License.
 
 import logging
+import math
+import threading
 import urllib.parse
+import xml.etree.ElementTree as et
+from typing import Iterable, Iterator, Tuple
 
 import requests
 
-from beachfront.config import GEOSERVER_HOST, GEOSERVER_SCHEME, GEOSERVER_USERNAME, GEOSERVER_PASSWORD, DATABASE_URI
+from beachfront import db
+from beachfront.config import (
+    GEOSERVER_HOST,
+    GEOSERVER_SCHEME,
+    GEOSERVER_USERNAME,
+    GEOSERVER_PASSWORD,
+    DATABASE_URI,
+    WMS_CACHE_DIR,
+    WMS_CACHE_DISK_SIZE,
+    WMS_CACHE_MAX_TILE_SIZE,
+    WMS_CACHE_MEMORY_SIZE,
+)
+from beachfront.utils.singleflight import SingleFlight
+from beachfront.utils.tilecache import TileCache
 
 WORKSPACE_ID = 'beachfront'
 DATASTORE_ID = 'postgres'
 DETECTIONS_LAYER_ID = 'all_detections'
 DETECTIONS_STYLE_ID = 'detections'
 TIMEOUT = 24
+CHUNK_SIZE = 8192
+
+FORWARDED_HEADERS = ('Content-Type', 'Content-Length', 'Content-Disposition', 'ETag', 'Last-Modified')
+
+VIEWPARAMS_FILTERS = ('jobid', 'productlineid', 'sceneid')
+
+WEB_MERCATOR_HALF_WIDTH = 20037508.342789244
+
+DEGREES_PER_METER = {
+    'EPSG:4326': 1,
+    'CRS:84': 1,
+    'EPSG:3857': 180 / WEB_MERCATOR_HALF_WIDTH,
+    'EPSG:900913': 180 / WEB_MERCATOR_HALF_WIDTH,
+}
+WEB_MERCATOR_CRS = ('EPSG:3857', 'EPSG:900913')
+
+_tile_cache = None  # type: TileCache
+_tile_cache_lock = threading.Lock()
+_wms_flights = SingleFlight()
+_wms_stats = {
+    'upstream_requests': 0,
+}
+_wms_stats_lock = threading.Lock()
 
 
 def create_wms_url():
     return '{}://{}/geoserver/wms'.format(GEOSERVER_SCHEME, GEOSERVER_HOST)
 
 
-def get_wms_tile(params: dict):
+def get_tile_cache() -> TileCache:
+    global _tile_cache
+    with _tile_cache_lock:
+        if not _tile_cache:
+            _tile_cache = TileCache(
+                memory_size=WMS_CACHE_MEMORY_SIZE,
+                disk_size=WMS_CACHE_DISK_SIZE,
+                disk_dir=WMS_CACHE_DIR,
+            )
+        return _tile_cache
+
+
+def get_wms_stats() -> dict:
+    """
+    Reports how GetMap requests were served: `upstream_requests` actually reached
+    GeoServer, while `coalesced_requests` piggybacked on an identical request
+    already in flight (i.e., upstream calls saved), alongside the tile cache's
+    own hit/miss counters once it is in use.
+    """
+    with _wms_stats_lock:
+        stats = dict(_wms_stats)
+    stats['coalesced_requests'] = _wms_flights.stats['shared']
+    with _tile_cache_lock:
+        cache = _tile_cache
+    if cache:
+        stats.update(('cache_' + k, v) for k, v in cache.stats.items())
+    return stats
+
+
+def get_wms_tile(params: dict) -> Tuple[Iterable[bytes], dict]:
+    """
+    Returns the body of GeoServer's response to a WMS request along with the
+    upstream headers worth forwarding.  GetMap images small enough to cache are
+    buffered and shared; everything else is streamed through in chunks.
+    GetMap requests that do not pick a detection geometry tier get the one
+    suited to their resolution.
+    """
     log = logging.getLogger(__name__ + '.geoserver_wms')
 
-    url = '{}://{}/geoserver/wms'.format(GEOSERVER_SCHEME, GEOSERVER_HOST)
-
-    log.info('Forwarding request to "%s"', url)
-    try:
-        response = requests.get(url, params, stream=True)
-    except requests.ConnectionError as err:
-        log.error('Connection to GeoServer failed: %s\n'
-                  '---\n\n'
-                  'URL: %s\n\n'
-                  '---',
-                  err, err.request.url)
-        raise Unreachable()
+    params = _with_lod(params)
+    cache_key, cache_tags = _normalize_wms_params(params)
+    if not cache_key:
+        return _passthrough(_request_wms(params))
+
+    cache = get_tile_cache()
+    cached = cache.get(cache_key)
+    if cached:
+        log.debug('Serving tile from cache')
+        return cached
+
+    def render():
+        generation = cache.generation
+        response = _request_wms(params)
+        headers = _forwarded_headers(response)
+
+        # GeoServer reports WMS exceptions as HTTP 200, so only images are safe to keep
+        if not headers.get('Content-Type', '').startswith('image/'):
+            return response
+
+        content_length = headers.get('Content-Length')
+        if content_length and int(content_length) > WMS_CACHE_MAX_TILE_SIZE:
+            return response
+
+        chunks = []
+        size = 0
+        body = response.iter_content(chunk_size=CHUNK_SIZE)
+        for chunk in body:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > WMS_CACHE_MAX_TILE_SIZE:
+                return _PartiallyRead(response, chunks, body)
+
+        content = b''.join(chunks)
+        headers['Content-Length'] = str(len(content))
+        cache.put(cache_key, content, headers, cache_tags, generation)
+        return content, headers
+
+    result, shared = _wms_flights.do(cache_key, render)
+
+    if isinstance(result, (requests.Response, _PartiallyRead)):
+        if shared:
+            # A body that is streamed can only be read once, so fetch our own copy
+            log.debug('Identical in-flight request was not cacheable; forwarding separately')
+            return _passthrough(_request_wms(params))
+        return _passthrough(result)
+
+    if shared:
+        log.debug('Shared tile with an identical in-flight request')
+    return result
+
+
+def invalidate_tiles(job_id: str) -> int:
+    """
+    Drops every cached tile that could include detections from the given job.
+    Tiles for other jobs are kept; tiles filtered by product line or scene (and
+    unfiltered ones) are dropped, since membership is not known without a query.
+    """
+    log = logging.getLogger(__name__)
 
-    if response.status_code != 200:
-        log.error('GeoServer returned HTTP %s:\n'
-                  '---\n\n'
-                  'URL: %s\n\n'
-                  '---',
-                  response.status_code, response.request.url)
-        raise Error('GeoServer returned HTTP {}'.format(response.status_code))
+    def affected(tags: frozenset) -> bool:
+        if not tags or ('jobid', job_id) in tags:
+            return True
+        return any(name != 'jobid' for name, _ in tags)
 
-    return response.iter_content(chunk_size=8192), response.headers.get('Content-Type')
+    count = get_tile_cache().invalidate(affected)
+    log.info('Invalidated %d cached tiles for job `%s`', count, job_id, action='invalidate tiles', actee=job_id)
+    return count
 
 
 def install_if_needed():
@@ -72,6 +194,9 @@ def install_if_needed():
     if not layer_exists(DETECTIONS_LAYER_ID):
         install_needed = True
         install_layer(DETECTIONS_LAYER_ID)
+    elif not layer_is_current(DETECTIONS_LAYER_ID):
+        install_needed = True
+        update_layer(DETECTIONS_LAYER_ID)
 
     if not style_exists(DETECTIONS_STYLE_ID):
         install_needed = True
@@ -217,64 +342,7 @@ def install_layer(layer_id: str):
             headers={
                 'Content-Type': 'application/xml',
             },
-            data=r"""
-                <featureType>
-                    <name>{layer_id}</name>
-                    <title>All Detections</title>
-                    <srs>EPSG:4326</srs>
-                    <nativeBoundingBox>
-                        <minx>-180.0</minx>
-                        <maxx>180.0</maxx>
-                        <miny>-90.0</miny>
-                        <maxy>90.0</maxy>
-                    </nativeBoundingBox>
-                    <metadata>
-                        <entry key="JDBC_VIRTUAL_TABLE">
-                            <virtualTable>
-                                <name>{layer_id}</name>
-                                <sql>
-                                    SELECT * FROM geoserver
-                                     WHERE ('%jobid%' = '' AND '%productlineid%' = '' AND '%sceneid%' = '')
-                                        OR (job_id = '%jobid%')
-                                        OR (productline_id = '%productlineid%')
-                                        OR (scene_id = '%sceneid%')
-                                </sql>
-                                <escapeSql>false</escapeSql>
-                                <keyColumn>job_id</keyColumn>
-                                <geometry>
-                                    <name>geometry</name>
-                                    <type>Geometry</type>
-                                    <srid>4326</srid>
-                                </geometry>
-                                <parameter>
-                                    <name>jobid</name>
-                                    <regexpValidator>^(%|[a-f0-9]{{8}}-[a-f0-9]{{4}}-[a-f0-9]{{4}}-[a-f0-9]{{4}}-[a-f0-9]{{12}})$</regexpValidator>
-                                </parameter>
-                                <parameter>
-                                    <name>productlineid</name>
-                                    <regexpValidator>^[a-z]+$</regexpValidator>
-                                </parameter>
-                                <parameter>
-                                    <name>sceneid</name>
-                                    <regexpValidator>^\w+:\w+$</regexpValidator>
-                                </parameter>
-                            </virtualTable>
-                        </entry>
-                        <entry key="time">
-                            <dimensionInfo>
-                                <enabled>false</enabled>
-                                <attribute>time_of_collect</attribute>
-                                <presentation>CONTINUOUS_INTERVAL</presentation>
-                                <units>ISO8601</units>
-                                <defaultValue>
-                                    <strategy>FIXED</strategy>
-                                    <referenceValue>P1Y/PRESENT</referenceValue>
-                                </defaultValue>
-                            </dimensionInfo>
-                        </entry>
-                    </metadata>
-                </featureType>
-            """.strip().format(layer_id=layer_id),
+            data=_layer_xml(layer_id),
         )
         log.debug('Sent request to geoserver:\n'
                   '---\n\n'
@@ -398,6 +466,59 @@ def install_style(style_id: str):
         raise InstallError()
 
 
+def update_layer(layer_id: str):
+    """
+    Replaces the definition of a layer installed by an earlier version (e.g.,
+    one whose virtual table queries a view that has since been superseded).
+    """
+    log = logging.getLogger(__name__)
+
+    log.info('Updating `%s`', layer_id, action='update layer', actee='geoserver')
+    try:
+        response = requests.put(
+            '{}://{}/geoserver/rest/workspaces/{}/datastores/{}/featuretypes/{}'.format(
+                GEOSERVER_SCHEME,
+                GEOSERVER_HOST,
+                WORKSPACE_ID,
+                DATASTORE_ID,
+                layer_id,
+            ),
+            auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD),
+            timeout=TIMEOUT,
+            headers={
+                'Content-Type': 'application/xml',
+            },
+            data=_layer_xml(layer_id),
+        )
+        log.debug('Sent request to geoserver:\n'
+                  '---\n\n'
+                  'URL: %s\n\n'
+                  'Request: %s\n\n'
+                  'Response: %s\n\n'
+                  '---',
+                  response.request.url,
+                  response.request.body,
+                  response.text)
+    except requests.ConnectionError as err:
+        log.error('Cannot communicate with GeoServer: %s', err)
+        raise InstallError()
+
+    if response.status_code != 200:
+        log.error('Cannot update layer `%s`:\n'
+                  '---\n\n'
+                  'HTTP %d\n\n'
+                  'URL: %s\n\n'
+                  'Request: %s\n\n'
+                  'Response: %s\n\n'
+                  '---',
+                  layer_id,
+                  response.status_code,
+                  response.request.url,
+                  response.request.body,
+                  response.text)
+        raise InstallError()
+
+
 def datastore_exists() -> bool:
     log = logging.getLogger(__name__)
     log.info('Checking for existence of datastore `%s`', DATASTORE_ID, action='check for datastore', actee='geoserver')
@@ -437,6 +558,41 @@ def layer_exists(layer_id: str) -> bool:
     return response.status_code == 200
 
 
+def layer_is_current(layer_id: str) -> bool:
+    """
+    Compares the virtual table query of an installed layer with the one that
+    `install_layer` would install today.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Checking definition of layer `%s`', layer_id, action='check for layer', actee='geoserver')
+    try:
+        response = requests.get(
+            '{}://{}/geoserver/rest/workspaces/{}/datastores/{}/featuretypes/{}'.format(
+                GEOSERVER_SCHEME,
+                GEOSERVER_HOST,
+                WORKSPACE_ID,
+                DATASTORE_ID,
+                layer_id,
+            ),
+            auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD),
+            timeout=TIMEOUT,
+            headers={
+                'Accept': 'application/xml',
+            },
+        )
+    except requests.ConnectionError as err:
+        log.error('Cannot communicate with GeoServer: %s', err)
+        raise InstallError()
+    if response.status_code != 200:
+        return False
+    try:
+        installed_sql = _virtual_table_sql(response.text)
+    except et.ParseError as err:
+        log.warning('Cannot read definition of layer `%s`: %s', layer_id, err)
+        return False
+    return installed_sql == _virtual_table_sql(_layer_xml(layer_id))
+
+
 def style_exists(style_id: str) -> bool:
     log = logging.getLogger(__name__)
     log.info('Checking for existence of style `%s`', style_id, action='check for style', actee='geoserver')
@@ -475,6 +631,253 @@ def workspace_exists() -> bool:
     return response.status_code == 200
 
 
+#
+# Helpers
+#
+
+def _forwarded_headers(response: requests.Response) -> dict:
+    headers = {k: response.headers[k] for k in FORWARDED_HEADERS if k in response.headers}
+
+    # `requests` decodes compressed bodies, so the upstream length no longer applies
+    if 'Content-Encoding' in response.headers:
+        headers.pop('Content-Length', None)
+
+    return headers
+
+
+def _passthrough(response) -> Tuple[Iterator[bytes], dict]:
+    if isinstance(response, _PartiallyRead):
+        prefix, body, response = response.prefix, response.body, response.response
+    else:
+        prefix, body = [], response.iter_content(chunk_size=CHUNK_SIZE)
+
+    def stream():
+        try:
+            yield from prefix
+            yield from body
+        finally:
+            response.close()
+
+    return stream(), _forwarded_headers(response)
+
+
+def _request_wms(params: dict) -> requests.Response:
+    log = logging.getLogger(__name__ + '.geoserver_wms')
+
+    url = '{}://{}/geoserver/wms'.format(GEOSERVER_SCHEME, GEOSERVER_HOST)
+
+    with _wms_stats_lock:
+        _wms_stats['upstream_requests'] += 1
+
+    log.info('Forwarding request to "%s"', url)
+    try:
+        # Coalesced callers wait on this request, so it must not hang them indefinitely
+        response = requests.get(url, params, stream=True, timeout=TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout) as err:
+        log.error('Connection to GeoServer failed: %s\n'
+                  '---\n\n'
+                  'URL: %s\n\n'
+                  '---',
+                  err, err.request.url if err.request else url)
+        raise Unreachable()
+
+    if response.status_code != 200:
+        log.error('GeoServer returned HTTP %s:\n'
+                  '---\n\n'
+                  'URL: %s\n\n'
+                  '---',
+                  response.status_code, response.request.url)
+        raise Error('GeoServer returned HTTP {}'.format(response.status_code))
+
+    return response
+
+
+def _layer_xml(layer_id: str) -> str:
+    # Each tier has its own view (and index), which `%lod%` picks by name
+    return r"""
+        <featureType>
+            <name>{layer_id}</name>
+            <title>All Detections</title>
+            <srs>EPSG:4326</srs>
+            <nativeBoundingBox>
+                <minx>-180.0</minx>
+                <maxx>180.0</maxx>
+                <miny>-90.0</miny>
+                <maxy>90.0</maxy>
+            </nativeBoundingBox>
+            <metadata>
+                <entry key="JDBC_VIRTUAL_TABLE">
+                    <virtualTable>
+                        <name>{layer_id}</name>
+                        <sql>
+                            SELECT * FROM geoserver_lod%lod%
+                             WHERE (('%jobid%' = '' AND '%productlineid%' = '' AND '%sceneid%' = '')
+                                    OR (job_id = '%jobid%')
+                                    OR (productline_id = '%productlineid%')
+                                    OR (scene_id = '%sceneid%'))
+                        </sql>
+                        <escapeSql>false</escapeSql>
+                        <keyColumn>job_id</keyColumn>
+                        <geometry>
+                            <name>geometry</name>
+                            <type>Geometry</type>
+                            <srid>4326</srid>
+                        </geometry>
+                        <parameter>
+                            <name>jobid</name>
+                            <regexpValidator>^(%|[a-f0-9]{{8}}-[a-f0-9]{{4}}-[a-f0-9]{{4}}-[a-f0-9]{{4}}-[a-f0-9]{{12}})$</regexpValidator>
+                        </parameter>
+                        <parameter>
+                            <name>productlineid</name>
+                            <regexpValidator>^[a-z]+$</regexpValidator>
+                        </parameter>
+                        <parameter>
+                            <name>sceneid</name>
+                            <regexpValidator>^\w+:\w+$</regexpValidator>
+                        </parameter>
+                        <parameter>
+                            <name>lod</name>
+                            <defaultValue>0</defaultValue>
+                            <regexpValidator>^[0-3]$</regexpValidator>
+                        </parameter>
+                    </virtualTable>
+                </entry>
+                <entry key="time">
+                    <dimensionInfo>
+                        <enabled>false</enabled>
+                        <attribute>time_of_collect</attribute>
+                        <presentation>CONTINUOUS_INTERVAL</presentation>
+                        <units>ISO8601</units>
+                        <defaultValue>
+                            <strategy>FIXED</strategy>
+                            <referenceValue>P1Y/PRESENT</referenceValue>
+                        </defaultValue>
+                    </dimensionInfo>
+                </entry>
+            </metadata>
+        </featureType>
+    """.strip().format(layer_id=layer_id)
+
+
+def _normalize_wms_params(params: dict) -> Tuple[str, frozenset]:
+    """
+    Returns a cache key that is stable across parameter order and name casing,
+    along with the detection filters named in `viewparams`.  Only GetMap
+    requests are cacheable; the key is `None` for anything else.
+    """
+    normalized = {k.lower(): v for k, v in params.items()}
+    if normalized.get('request', '').lower() != 'getmap':
+        return None, frozenset()
+
+    # Each layer has its own comma-separated set, so pairs are only reordered within a set
+    tags = set()
+    viewparams = []
+    for layer_viewparams in normalized.get('viewparams', '').split(','):
+        pairs = []
+        for pair in layer_viewparams.split(';'):
+            name, _, value = pair.partition(':')
+            name = name.strip().lower()
+            if not name:
+                continue
+            pairs.append('{}:{}'.format(name, value))
+            if name in VIEWPARAMS_FILTERS and value:
+                tags.add((name, value))
+        viewparams.append(';'.join(sorted(pairs)))
+    if any(viewparams):
+        normalized['viewparams'] = ','.join(viewparams)
+
+    key = '&'.join('{}={}'.format(k, normalized[k]) for k in sorted(normalized))
+    return key, frozenset(tags)
+
+
+def _virtual_table_sql(featuretype_xml: str) -> str:
+    xml = et.fromstring(featuretype_xml)  # type: et.Element
+    sql = xml.findtext('./metadata/entry[@key="JDBC_VIRTUAL_TABLE"]/virtualTable/sql') or ''
+    return ' '.join(sql.split())
+
+
+def _with_lod(params: dict) -> dict:
+    """
+    Adds `lod` to the `viewparams` of each detections layer in a GetMap request
+    that does not already set it, picking the coarsest detection geometry tier
+    that would not be visibly different at the requested resolution.
+    """
+    names = {k.lower(): k for k in params}
+    if params.get(names.get('request'), '').lower() != 'getmap':
+        return params
+
+    layers = params.get(names.get('layers'), '').split(',')
+    if not any(_is_detections_layer(layer) for layer in layers):
+        return params
+
+    # GeoServer takes one `viewparams` set per layer, or a single set for all of them
+    viewparams_name = names.get('viewparams', 'VIEWPARAMS')
+    viewparams = params.get(viewparams_name, '').split(',')
+    if len(viewparams) == 1:
+        viewparams *= len(layers)
+    if len(viewparams) != len(layers):
+        return params
+
+    resolution = _wms_resolution(params, names)
+    if resolution is None:
+        return params
+    lod = 'lod:{}'.format(db.jobs.lod_for_resolution(resolution))
+
+    for i, layer in enumerate(layers):
+        if not _is_detections_layer(layer):
+            continue
+        if any(pair.partition(':')[0].strip().lower() == 'lod' for pair in viewparams[i].split(';')):
+            continue
+        viewparams[i] = ';'.join(filter(None, (viewparams[i], lod)))
+
+    params = dict(params)
+    params[viewparams_name] = ','.join(viewparams)
+    return params
+
+
+def _is_detections_layer(layer: str) -> bool:
+    return layer.strip().rpartition(':')[2] == DETECTIONS_LAYER_ID
+
+
+def _wms_resolution(params: dict, names: dict) -> float:
+    """
+    Returns the finest size, in degrees, of a pixel in a GetMap image, or
+    `None` if that cannot be told from the request.
+    """
+    crs = params.get(names.get('crs', names.get('srs')), '').upper()
+    degrees_per_meter = DEGREES_PER_METER.get(crs)
+    try:
+        minx, miny, maxx, maxy = (float(n) for n in params[names['bbox']].split(','))
+        width = int(params[names['width']])
+        height = int(params[names['height']])
+    except (KeyError, ValueError):
+        return None
+    if not degrees_per_meter or width <= 0 or height <= 0:
+        return None
+
+    # Axis order differs between WMS versions, so take the finer of the two
+    resolution = min(abs(maxx - minx) / width, abs(maxy - miny) / height) * degrees_per_meter
+
+    if crs in WEB_MERCATOR_CRS:
+        # Mercator stretches a degree of latitude by 1/cos(latitude); use the edge nearest a pole
+        radius = WEB_MERCATOR_HALF_WIDTH / math.pi
+        resolution /= math.cosh(max(abs(miny), abs(maxy)) / radius)
+
+    return resolution
+
+
+class _PartiallyRead:
+    """
+    A response whose body turned out to be too large to cache after part of it
+    had already been read.
+    """
+
+    def __init__(self, response: requests.Response, prefix: list, body: Iterator[bytes]):
+        self.response = response
+        self.prefix = prefix
+        self.body = body
+
+
 #
 # Errors
 #
@@ -11,17 +11,40 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import collections
+import heapq
 import json
 import logging
+import os
+import random
+import socket
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, Iterator, List, Set, Tuple
 
 from beachfront import db
-from beachfront.config import JOB_TTL, JOB_WORKER_INTERVAL, JOB_WORKER_MAX_RETRIES
-from beachfront.services import algorithms, scenes, piazza
-
+from beachfront.config import (
+    JOB_TTL,
+    JOB_WORKER_BACKOFF_STEP,
+    JOB_WORKER_CLAIM_SIZE,
+    JOB_WORKER_CLAIM_TTL,
+    JOB_WORKER_CONCURRENCY,
+    JOB_WORKER_FAST_INTERVAL,
+    JOB_WORKER_INGEST_CONCURRENCY,
+    JOB_WORKER_INGEST_QUEUE_SIZE,
+    JOB_WORKER_INTERVAL,
+    JOB_WORKER_JITTER,
+    JOB_WORKER_MAX_INTERVAL,
+    JOB_WORKER_MAX_RETRIES,
+    JOB_WORKER_POLLERS,
+    JOB_WORKER_STATS_INTERVAL,
+)
+from beachfront.services import algorithms, geoserver, scenes, piazza
+
+CHANGES_CURSOR_OVERLAP = timedelta(seconds=10)  # Covers writes committed a little after they were stamped
+DETECTIONS_STREAM_BATCH_SIZE = 500
 FORMAT_DTG = '%Y-%m-%d-%H-%M'
 FORMAT_TIME = '%TZ'
 STATUS_TIMED_OUT = 'Timed Out'
@@ -31,6 +54,19 @@ STEP_POLLING = 'runtime:polling-for-status'
 STEP_PROCESSING = 'runtime:processing'
 STEP_QUEUED = 'runtime:queued'
 STEP_RESOLVE = 'postprocessing:resolving_detections_data_id'
+WORKER_LOCK_KEY = 1  # Pollers take keys WORKER_LOCK_KEY..WORKER_LOCK_KEY + JOB_WORKER_POLLERS - 1
+
+STATUSES = (
+    piazza.STATUS_CANCELLED,
+    piazza.STATUS_CANCELLING,
+    piazza.STATUS_ERROR,
+    piazza.STATUS_FAIL,
+    piazza.STATUS_PENDING,
+    piazza.STATUS_RUNNING,
+    piazza.STATUS_SUBMITTED,
+    piazza.STATUS_SUCCESS,
+    STATUS_TIMED_OUT,
+)
 
 _worker = None  # type: Worker
 
@@ -256,13 +292,41 @@ def get(user_id: str, job_id: str) -> Job:
     )
 
 
-def get_all(user_id: str) -> List[Job]:
+def get_all(
+        user_id: str,
+        *,
+        changed_since: datetime = None,
+        statuses: List[str] = None,
+        after: Tuple[datetime, str] = None,
+        limit: int = None,
+        include_geometry: bool = True) -> List[Job]:
+    """
+    Returns every job the user tracks or, given a `changed_since` cursor from
+    `get_changes_cursor()`, only those whose status or error has changed since.
+    Jobs come oldest first; passing the `(created_on, job_id)` of the last job
+    returned as `after` continues from there, `limit` jobs at a time.  Without
+    `include_geometry`, each job's geometry is left as `None`.
+    """
     log = logging.getLogger(__name__)
     log.info('Job service get all', action='service job get all',actor=user_id)
+
+    if statuses is not None:
+        for status in statuses:
+            if status not in STATUSES:
+                raise InvalidQuery('unknown status `{}`'.format(status))
+
     conn = db.get_connection()
 
     try:
-        cursor = db.jobs.select_jobs_for_user(conn, user_id=user_id)
+        cursor = db.jobs.select_jobs_for_user(
+            conn,
+            user_id=user_id,
+            changed_since=changed_since,
+            statuses=statuses,
+            after=after,
+            limit=limit,
+            include_geometry=include_geometry,
+        )
     except db.DatabaseError as err:
         log.error('Could not list jobs for user "%s"', user_id)
         db.print_diagnostics(err)
@@ -277,7 +341,7 @@ def get_all(user_id: str) -> List[Job]:
             algorithm_version=row['algorithm_version'],
             created_by=row['created_by'],
             created_on=row['created_on'],
-            geometry=json.loads(row['geometry']),
+            geometry=json.loads(row['geometry']) if row['geometry'] else None,
             job_id=row['job_id'],
             name=row['name'],
             scene_time_of_collect=row['captured_on'],
@@ -293,6 +357,27 @@ def get_all(user_id: str) -> List[Job]:
     return jobs
 
 
+def get_changes_cursor() -> datetime:
+    """
+    Returns a cursor that, passed to `get_all()` later, selects the jobs that
+    changed after this call.  Take it before listing, since consecutive
+    cursors overlap slightly: a job may be reported twice, but never missed.
+    """
+    log = logging.getLogger(__name__)
+    conn = db.get_connection()
+
+    try:
+        now = db.jobs.select_current_timestamp(conn).scalar()
+    except db.DatabaseError as err:
+        log.error('Could not read database clock')
+        db.print_diagnostics(err)
+        raise
+    finally:
+        conn.close()
+
+    return now - CHANGES_CURSOR_OVERLAP
+
+
 def get_by_productline(productline_id: str, since: datetime) -> List[Job]:
     log = logging.getLogger(__name__)
     log.info('Job  service get by productline', action=' service job get by productline')
@@ -363,35 +448,147 @@ def get_by_scene(scene_id: str) -> List[Job]:
     return jobs
 
 
-def get_detections(job_id: str) -> str:
+def get_all_fingerprint(user_id: str) -> str:
+    """
+    Returns a short string that changes whenever `get_all(user_id)` would, without loading any
+    of the jobs.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Job service get all fingerprint', action='service job get all fingerprint', actor=user_id)
+    conn = db.get_connection()
+
+    try:
+        return db.jobs.select_fingerprint_for_user(conn, user_id=user_id).scalar()
+    except db.DatabaseError as err:
+        log.error('Could not fingerprint jobs for user "%s"', user_id)
+        db.print_diagnostics(err)
+        raise
+    finally:
+        conn.close()
+
+
+def get_by_productline_fingerprint(productline_id: str, since: datetime) -> str:
     """
-    Returns a potentially massive stringified GeoJSON feature collection containing all detections
-    for a given job.
+    Returns a short string that changes whenever `get_by_productline(productline_id, since)`
+    would, without loading any of the jobs.
     """
+    log = logging.getLogger(__name__)
+    log.info('Job service get by productline fingerprint', action='service job get by productline fingerprint')
+    conn = db.get_connection()
+
+    try:
+        return db.jobs.select_fingerprint_for_productline(conn, productline_id=productline_id, since=since).scalar()
+    except db.DatabaseError as err:
+        log.error('Could not fingerprint jobs for <productline:%s>', productline_id)
+        db.print_diagnostics(err)
+        raise
+    finally:
+        conn.close()
+
 
+def get_by_scene_fingerprint(scene_id: str) -> str:
+    """
+    Returns a short string that changes whenever `get_by_scene(scene_id)` would, without loading
+    any of the jobs.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Job service get by scene fingerprint', action='service job get by scene fingerprint')
+    conn = db.get_connection()
+
+    try:
+        return db.jobs.select_fingerprint_for_scene(conn, scene_id=scene_id).scalar()
+    except db.DatabaseError as err:
+        log.error('Could not fingerprint jobs for <scene:%s>', scene_id)
+        db.print_diagnostics(err)
+        raise
+    finally:
+        conn.close()
+
+
+def get_detections_fingerprint(job_id: str) -> str:
+    """
+    Returns a short string identifying a job's detections once they can no longer change (i.e.,
+    the job succeeded), or `None` until then.
+    """
     log = logging.getLogger(__name__)
-    log.info('Job service get detections', action='service job get detections')
+    log.info('Job service get detections fingerprint', action='service job get detections fingerprint')
     conn = db.get_connection()
 
-    log.info('Packaging detections for <job:%s>', job_id)
+    try:
+        status = db.jobs.select_job_status(conn, job_id=job_id).scalar()
+    except db.DatabaseError as err:
+        log.error('Could not fingerprint detections for <job:%s>', job_id)
+        db.print_diagnostics(err)
+        raise
+    finally:
+        conn.close()
+
+    if status != piazza.STATUS_SUCCESS:
+        return None
+    return '{}:{}'.format(job_id, status)
+
+
+def get_detections_stream(
+        job_id: str,
+        *,
+        resolution: float = None,
+        bbox: Tuple[float, float, float, float] = None,
+        cursor: int = None,
+        limit: int = None,
+        properties: List[str] = None) -> Iterator[str]:
+    """
+    Returns an iterator that yields a stringified GeoJSON feature collection containing all
+    detections for a given job a few hundred features at a time, so that memory stays flat
+    regardless of how many detections the job has.  Given a `resolution` (in degrees),
+    geometries are simplified as far as that resolution allows.
+
+    Detections can be narrowed to those intersecting `bbox` and projected onto a subset of
+    `properties`.  With a `limit`, at most that many detections are returned and, when more
+    remain, the collection's `next_cursor` member is the `cursor` that fetches the next page.
+
+    The existence check and the query itself run immediately; the database connection is held
+    open until the iterator is exhausted or closed.
+    """
+
+    log = logging.getLogger(__name__)
+    log.info('Job service get detections stream', action='service job get detections stream')
+
+    if properties is not None:
+        for name in properties:
+            if name not in db.jobs.DETECTION_PROPERTIES:
+                raise InvalidQuery('unknown property `{}`'.format(name))
+
+    conn = db.get_connection()
+
+    log.info('Streaming detections for <job:%s>', job_id)
     try:
         if not db.jobs.exists(conn, job_id=job_id):
             raise NotFound(job_id)
-        geojson = db.jobs.select_detections(conn, job_id=job_id).scalar()
+        rows = db.jobs.select_detection_features(
+            conn,
+            job_id=job_id,
+            lod=_lod_for_resolution(resolution),
+            bbox=bbox,
+            after=cursor,
+            limit=limit + 1 if limit else None,  # One extra row reveals whether there is another page
+            properties=properties,
+        )
     except db.DatabaseError as err:
-        log.error('Could not package detections for <job:%s>', job_id)
+        log.error('Could not stream detections for <job:%s>', job_id)
         db.print_diagnostics(err)
+        conn.close()
         raise
-    finally:
+    except NotFound:
         conn.close()
+        raise
 
-    log.debug('Packaging complete: %d bytes for <job:%s>', len(geojson), job_id)
-    return geojson
+    return _stream_feature_collection(job_id, conn, rows, limit)
 
 
 def start_worker(
         job_ttl: timedelta = JOB_TTL,
-        interval: timedelta = JOB_WORKER_INTERVAL):
+        interval: timedelta = JOB_WORKER_INTERVAL,
+        concurrency: int = JOB_WORKER_CONCURRENCY):
     global _worker
 
     if _worker is not None:
@@ -400,7 +597,7 @@ def start_worker(
     log = logging.getLogger(__name__)
     log.info('Job service start worker', action='service job start worker')
     log.info('Starting worker thread', action='Worker started')
-    _worker = Worker(job_ttl, interval)
+    _worker = Worker(job_ttl, interval, concurrency)
     _worker.start()
 
 
@@ -416,17 +613,38 @@ def stop_worker():
 
 
 class Worker(threading.Thread):
-    def __init__(self, job_ttl: timedelta, interval: timedelta):
+    def __init__(self, job_ttl: timedelta, interval: timedelta, concurrency: int = JOB_WORKER_CONCURRENCY):
         super().__init__()
         self.daemon = True
         self._log = logging.getLogger(__name__ + '.worker')
         self._job_ttl = job_ttl
         self._interval = interval
+        self._concurrency = max(1, concurrency)
         self._terminated = False
+        self._ingest_lock = threading.Lock()
+        self._ingest_metrics = _StageMetrics()
+        self._ingest_pool = ThreadPoolExecutor(max_workers=max(1, JOB_WORKER_INGEST_CONCURRENCY))
+        self._ingesting = set()  # type: Set[str]
+        self._lock_conn = None  # type: db.Connection
+        self._lock_key = None  # type: int
+        self._pollers = max(1, JOB_WORKER_POLLERS)
+        self._poll_metrics = _StageMetrics()
+        self._schedule = []  # type: List[Tuple[float, str]]
+        self._due = set()  # type: Set[str]
+        self._standing_by = False
+        self._stats_log = logging.getLogger(__name__ + '.stats')
+        self._stats_logged_at = None  # type: float
+        self.worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())[:64]
 
     def is_terminated(self):
         return self._terminated
 
+    def stats(self) -> dict:
+        return {
+            'polling': self._poll_metrics.snapshot(),
+            'ingestion': self._ingest_metrics.snapshot(),
+        }
+
     def terminate(self):
         self._terminated = True
 
@@ -434,7 +652,8 @@ class Worker(threading.Thread):
         failures = 0
         while not self.is_terminated():
             try:
-                self._run_cycle()
+                if self._acquire_leadership():
+                    self._run_cycle()
                 failures = 0
             except Exception as err:
                 failures += 1
@@ -443,14 +662,80 @@ class Worker(threading.Thread):
                     break
                 else:
                     self._log.warning('Recovered from failure (attempt %d of %d); %s: %s', failures, JOB_WORKER_MAX_RETRIES, err.__class__.__name__, err)
-            time.sleep(self._interval.total_seconds())
+            self._renew_ingestion_claims()
+            self._log_stats()
+            time.sleep(self._seconds_until_next_poll())
+            self._take_due_polls()
 
+        self._ingest_pool.shutdown(wait=True)
+        self._release_leadership()
         self._log.info('Stopped')
 
+    def _acquire_leadership(self) -> bool:
+        """
+        Caps how many workers in the cluster poll jobs at once (one by default).
+        Each poller holds one of `JOB_WORKER_POLLERS` advisory locks on a
+        dedicated database session, so if its process dies the lock is released
+        and a standby takes over on its next cycle.
+        """
+        if self._lock_conn:
+            try:
+                if db.locks.holds_advisory_lock(self._lock_conn, key=self._lock_key):
+                    return True
+                self._log.warning('Worker lock was lost')
+            except db.DatabaseError as err:
+                self._log.warning('Worker lock was lost with its connection: %s', err)
+            self._discard_lock_conn()
+
+        conn = db.get_connection()
+        for key in range(WORKER_LOCK_KEY, WORKER_LOCK_KEY + self._pollers):
+            try:
+                acquired = db.locks.try_advisory_lock(conn, key=key)
+            except db.DatabaseError as err:
+                conn.close()
+                self._log.error('Could not contend for worker lock')
+                db.print_diagnostics(err)
+                raise
+            if acquired:
+                self._log.info('Acquired worker lock; this instance will poll jobs')
+                conn.detach()  # Really close the session when discarded, so the lock can never linger in the pool
+                self._lock_conn = conn
+                self._lock_key = key
+                self._standing_by = False
+                return True
+
+        conn.close()
+        if not self._standing_by:
+            self._log.info('Standing by; another instance holds the worker lock')
+            self._standing_by = True
+        return False
+
+    def _discard_lock_conn(self):
+        try:
+            self._lock_conn.close()
+        except db.DatabaseError:
+            pass
+        self._lock_conn = None
+        self._lock_key = None
+
+    def _release_leadership(self):
+        if not self._lock_conn:
+            return
+        try:
+            db.locks.advisory_unlock(self._lock_conn, key=self._lock_key)
+        except db.DatabaseError as err:
+            self._log.warning('Could not release worker lock: %s', err)
+        self._discard_lock_conn()
+
     def _run_cycle(self):
         conn = db.get_connection()
         try:
-            rows = db.jobs.select_outstanding_jobs(conn).fetchall()
+            rows = db.jobs.claim_outstanding_jobs(
+                conn,
+                worker_id=self.worker_id,
+                lease=JOB_WORKER_CLAIM_TTL,
+                limit=JOB_WORKER_CLAIM_SIZE,
+            ).fetchall()
         except db.DatabaseError as err:
             self._log.error('Could not list running jobs')
             db.print_diagnostics(err)
@@ -458,113 +743,350 @@ class Worker(threading.Thread):
         finally:
             conn.close()
 
+        due, self._due = self._due, set()
+        self._requeue_polls(due.difference(row['job_id'] for row in rows))
+
         if not rows:
-            self._log.info('Nothing to do; next run at %s', (datetime.utcnow() + self._interval).strftime(FORMAT_TIME))
+            self._log.info('Nothing to do; next run at %s', self._format_next_run())
         else:
             self._log.info('Begin cycle for %d records', len(rows))
-            for i, row in enumerate(rows, start=1):
-                self._updater(row['job_id'], row['age'], i)
-            self._log.info('Cycle complete; next run at %s', (datetime.utcnow() + self._interval).strftime(FORMAT_TIME))
+            started_at = time.time()
+            changes = []  # type: List[_StatusChange]
+            durations = {}  # type: Dict[str, float]
+            polled = {}  # type: Dict[str, str]
+            try:
+                # Only the lookups do I/O, so they alone are spread over `concurrency` connections
+                statuses = piazza.get_statuses([row['job_id'] for row in rows], concurrency=self._concurrency,
+                                               durations=durations)
+                self._poll_metrics.enqueue(len(rows))
+                attempted = 0
+                try:
+                    for i, row in enumerate(rows, start=1):
+                        job_id = row['job_id']
+                        attempted += 1
+                        polled[job_id] = self._timed_updater(job_id, row['age'], i, statuses[job_id], row['status'],
+                                                             changes, durations[job_id])
+                finally:
+                    # Whatever a failure left unapplied is no longer waiting on this cycle
+                    self._poll_metrics.cancel(len(rows) - attempted)
+            finally:
+                try:
+                    self._save_status_changes(changes)
+                finally:
+                    self._schedule_polls(rows, polled)
+
+            slowest_job_id = max(durations, key=durations.get)
+            self._log.info('Polled %d jobs in %0.1fs; slowest lookup was <%s> (%0.1fs)',
+                           len(durations), time.time() - started_at, slowest_job_id, durations[slowest_job_id])
+            self._log.info('Cycle complete; next run at %s', self._format_next_run())
+
+    def _take_due_polls(self):
+        now = time.time()
+        while self._schedule and self._schedule[0][0] <= now:
+            _, job_id = heapq.heappop(self._schedule)
+            self._due.add(job_id)
+
+    def _format_next_run(self) -> str:
+        return (datetime.utcnow() + timedelta(seconds=self._seconds_until_next_poll())).strftime(FORMAT_TIME)
+
+    def _log_stats(self):
+        """
+        Reports this instance's queue depth and throughput for each stage, and
+        how well its algorithm and WMS caches are doing, every
+        `JOB_WORKER_STATS_INTERVAL` whether or not it is polling.
+        """
+        now = time.time()
+        if self._stats_logged_at is not None and now - self._stats_logged_at < JOB_WORKER_STATS_INTERVAL.total_seconds():
+            return
+        self._stats_logged_at = now
+        stats = {
+            'worker': self.stats(),
+            'algorithm_cache': algorithms.get_cache_stats(),
+            'wms': geoserver.get_wms_stats(),
+        }
+        self._stats_log.info('Stats: %s', json.dumps(stats, sort_keys=True))
+
+    def _renew_ingestion_claims(self):
+        """
+        Keeps the claims on jobs queued for or undergoing ingestion from lapsing
+        however long their downloads take, so that no other poller picks them up
+        and ingests them again in the meantime.
+        """
+        with self._ingest_lock:
+            job_ids = sorted(self._ingesting)
+        if not job_ids:
+            return
 
-    def _updater(self, job_id: str, age: timedelta, index: int):
-        log = self._log
-        job_ttl = self._job_ttl
+        conn = db.get_connection()
+        try:
+            db.jobs.renew_claims(conn, worker_id=self.worker_id, leases={j: JOB_WORKER_CLAIM_TTL for j in job_ids})
+        except db.DatabaseError as err:
+            self._log.warning('Could not renew claims on %d jobs being ingested', len(job_ids))
+            db.print_diagnostics(err)
+        finally:
+            conn.close()
 
-        # Get latest status
+    def _requeue_polls(self, job_ids: Set[str]):
+        """
+        Queues another wake-up for jobs that fell due but were not claimed,
+        e.g., because the claim limit was reached or the database's clock had
+        yet to reach their lease.  Jobs that finished or went to another worker
+        are left to it.
+        """
+        if not job_ids:
+            return
+
+        conn = db.get_connection()
         try:
-            status = piazza.get_status(job_id)
-        except piazza.Unauthorized:
-            log.error('<%03d/%s> credentials rejected during polling!', index, job_id)
+            rows = db.jobs.select_claim_leases(conn, worker_id=self.worker_id, job_ids=sorted(job_ids)).fetchall()
+        except db.DatabaseError as err:
+            self._log.warning('Could not look up %d overdue job claims; they wait for the next run', len(job_ids))
+            db.print_diagnostics(err)
+            return
+        finally:
+            conn.close()
+
+        now = time.time()
+        for row in rows:
+            heapq.heappush(self._schedule, (now + float(row['remaining']), row['job_id']))
+
+    def _save_status_changes(self, changes: list):
+        """
+        Writes the cycle's status changes (and any failures that go with them)
+        in one transaction rather than a connection per job.
+        """
+        if not changes:
             return
-        except (piazza.ServerError, piazza.Error) as err:
-            if isinstance(err, piazza.ServerError) and err.status_code == 404:
-                log.warning('<%03d/%s> Job not found', index, job_id)
-                _save_execution_error(job_id, STEP_POLLING, 'Job not found')
-                return
-            else:
-                log.error('<%03d/%s> call to Piazza failed: %s', index, job_id, err.message)
-                return
+
+        conn = db.get_connection()
+        transaction = conn.begin()
+        try:
+            db.jobs.update_statuses(conn, statuses={c.job_id: c.status for c in changes})
+            for change in changes:
+                if change.execution_step:
+                    db.jobs.insert_job_failure(
+                        conn,
+                        job_id=change.job_id,
+                        execution_step=change.execution_step,
+                        error_message=change.error_message,
+                    )
+            transaction.commit()
+        except db.DatabaseError as err:
+            transaction.rollback()
+            self._log.error('Could not save %d status changes to database', len(changes))
+            db.print_diagnostics(err)
+            raise
+        finally:
+            conn.close()
+
+    def _schedule_polls(self, rows: list, polled: Dict[str, str]):
+        """
+        Decides when each of this cycle's jobs should next be polled, records
+        that as the lease on its claim (so any poller will pick it up once due)
+        and queues a wake-up for it.  The longer lease taken at claim time only
+        protects jobs mid-update.
+        """
+        leases = {}
+        for row in rows:
+            job_id = row['job_id']
+            delay = _next_poll_delay(row['status'], polled.get(job_id), row['age'], row['status_age'], self._interval)
+            if delay is not None:
+                leases[job_id] = delay
+        if not leases:
+            return
+
+        conn = db.get_connection()
+        try:
+            db.jobs.renew_claims(conn, worker_id=self.worker_id, leases=leases)
+        except db.DatabaseError as err:
+            self._log.warning('Could not renew job claims; they will lapse after %s', JOB_WORKER_CLAIM_TTL)
+            db.print_diagnostics(err)
+            return
+        finally:
+            conn.close()
+
+        now = time.time()
+        for job_id, delay in leases.items():
+            heapq.heappush(self._schedule, (now + delay.total_seconds(), job_id))
+
+    def _seconds_until_next_poll(self) -> float:
+        wait = self._interval.total_seconds()
+        if self._schedule:
+            wait = min(wait, max(0.0, self._schedule[0][0] - time.time()))
+        return wait
+
+    def _enqueue_ingestion(self, job_id: str, index: int, data_id: str) -> bool:
+        """
+        Hands a succeeded job to the ingestion pool so that downloading and
+        saving its detections does not hold up status polling for other jobs.
+        """
+        with self._ingest_lock:
+            if job_id in self._ingesting:
+                self._log.info('<%03d/%s> Detections are already being ingested', index, job_id)
+                return True
+            if len(self._ingesting) >= JOB_WORKER_INGEST_CONCURRENCY + JOB_WORKER_INGEST_QUEUE_SIZE:
+                self._log.warning('<%03d/%s> Ingestion queue is full; will retry on next poll', index, job_id)
+                return False
+            self._ingesting.add(job_id)
+        self._ingest_metrics.enqueue()
+        self._ingest_pool.submit(self._timed_ingest, job_id, index, data_id)
+        return True
+
+    def _timed_ingest(self, job_id: str, index: int, data_id: str):
+        started_at = time.time()
+        succeeded = False
+        try:
+            succeeded = self._ingest(job_id, index, data_id)
+        except Exception:
+            self._log.exception('<%03d/%s> Ingestion failed unexpectedly', index, job_id)
+        finally:
+            with self._ingest_lock:
+                self._ingesting.discard(job_id)
+            self._ingest_metrics.finish(time.time() - started_at, succeeded)
+
+    def _timed_updater(self, job_id: str, age: timedelta, index: int, status, previous_status: str,
+                       changes: list, duration: float) -> str:
+        """
+        Applies a job's status and accounts for its poll, whose duration is
+        that of the status lookup (the update itself does no I/O).
+        """
+        try:
+            status = self._updater(job_id, age, index, status, previous_status, changes)
+            return status
+        finally:
+            self._poll_metrics.finish(duration, isinstance(status, str))
+
+    def _updater(self, job_id: str, age: timedelta, index: int, status, previous_status: str, changes: list) -> str:
+        """
+        Acts on a job's latest status (or the error raised while looking it up)
+        and returns the status, or `None` if the job could not be polled.  Any
+        status change is appended to `changes` for the cycle to save.
+        """
+        log = self._log
+
+        if isinstance(status, piazza.Unauthorized):
+            log.error('<%03d/%s> credentials rejected during polling!', index, job_id)
+            return None
+        elif isinstance(status, piazza.ServerError) and status.status_code == 404:
+            log.warning('<%03d/%s> Job not found', index, job_id)
+            changes.append(_StatusChange(job_id, piazza.STATUS_ERROR, STEP_POLLING, 'Job not found'))
+            return None
+        elif isinstance(status, piazza.Error):
+            log.error('<%03d/%s> call to Piazza failed: %s', index, job_id, status.message)
+            return None
 
         # Emit console feedback
         log.info('<%03d/%s> polled (%s; age=%s)', index, job_id, status.status, age)
 
+        if not self._apply_status(job_id, age, index, status, previous_status, changes):
+            return None
+        return status.status
+
+    def _apply_status(self, job_id: str, age: timedelta, index: int, status: piazza.Status, previous_status: str,
+                      changes: list) -> bool:
+        log = self._log
+        job_ttl = self._job_ttl
+
         # Determine appropriate action by status
         if status.status in (piazza.STATUS_SUBMITTED, piazza.STATUS_PENDING):
             if age > job_ttl:
                 log.warning('<%03d/%s> appears to have stalled and will no longer be tracked', index, job_id)
-                _save_execution_error(job_id, STEP_QUEUED, 'Submission wait time exceeded', status=STATUS_TIMED_OUT)
-                return
-
-            conn = db.get_connection()
-            try:
-                db.jobs.update_status(conn, job_id=job_id, status=status.status)
-            except db.DatabaseError as err:
-                log.error('<%03d/%s> Could not save status to database', index, job_id)
-                db.print_diagnostics(err)
-                return
-            finally:
-                conn.close()
+                changes.append(_StatusChange(job_id, STATUS_TIMED_OUT, STEP_QUEUED, 'Submission wait time exceeded'))
+            elif status.status != previous_status:
+                changes.append(_StatusChange(job_id, status.status, None, None))
 
         elif status.status == piazza.STATUS_RUNNING:
             if age > job_ttl:
                 log.warning('<%03d/%s> appears to have stalled and will no longer be tracked', index, job_id)
-                _save_execution_error(job_id, STEP_PROCESSING, 'Processing time exceeded', status=STATUS_TIMED_OUT)
-                return
-
-            conn = db.get_connection()
-            try:
-                db.jobs.update_status(conn, job_id=job_id, status=status.status)
-            except db.DatabaseError as err:
-                log.error('<%03d/%s> Could not save status to database', index, job_id)
-                db.print_diagnostics(err)
-                return
-            finally:
-                conn.close()
+                changes.append(_StatusChange(job_id, STATUS_TIMED_OUT, STEP_PROCESSING, 'Processing time exceeded'))
+            elif status.status != previous_status:
+                changes.append(_StatusChange(job_id, status.status, None, None))
 
         elif status.status == piazza.STATUS_SUCCESS:
-            log.info('<%03d/%s> Resolving detections data ID (via <%s>)', index, job_id, status.data_id)
-            try:
-                detections_data_id = _resolve_detections_data_id(status.data_id)
-            except PostprocessingError as err:
-                log.error('<%03d/%s> Could not resolve detections data ID: %s', index, job_id, err)
-                _save_execution_error(job_id, STEP_RESOLVE, str(err))
-                return
-
-            log.info('<%03d/%s> Fetching detections from Piazza', index, job_id)
-            try:
-                geojson = piazza.get_file(detections_data_id).text
-            except piazza.ServerError as err:
-                log.error('<%03d/%s> Could not fetch data ID <%s>: %s', index, job_id, detections_data_id, err)
-                _save_execution_error(job_id, STEP_COLLECT_GEOJSON, 'Could not retrieve GeoJSON from Piazza')
-                return
-
-            log.info('<%03d/%s> Saving detections to database (%0.1fMB)', index, job_id, len(geojson) / 1024000)
-            conn = db.get_connection()
-            transaction = conn.begin()
-            try:
-                db.jobs.insert_detection(conn, job_id=job_id, feature_collection=geojson)
-                db.jobs.update_status(
-                    conn,
-                    job_id=job_id,
-                    status=piazza.STATUS_SUCCESS,
-                )
-                transaction.commit()
-            except db.DatabaseError as err:
-                transaction.rollback()
-                transaction.close()
-                log.error('<%03d/%s> Could not save status and detections to database', index, job_id)
-                db.print_diagnostics(err)
-                _save_execution_error(job_id, STEP_COLLECT_GEOJSON, 'Could not insert GeoJSON to database')
-                return
-            finally:
-                conn.close()
+            return self._enqueue_ingestion(job_id, index, status.data_id)
 
         elif status.status in (piazza.STATUS_ERROR, piazza.STATUS_FAIL):
             # FIXME -- use heuristics to generate a more descriptive error message
-            _save_execution_error(job_id, STEP_ALGORITHM, 'Job failed during algorithm execution')
+            changes.append(_StatusChange(job_id, piazza.STATUS_ERROR, STEP_ALGORITHM, 'Job failed during algorithm execution'))
 
         elif status.status == piazza.STATUS_CANCELLED:
-            _save_execution_error(job_id, STEP_ALGORITHM, 'Job was cancelled', status=piazza.STATUS_CANCELLED)
+            changes.append(_StatusChange(job_id, piazza.STATUS_CANCELLED, STEP_ALGORITHM, 'Job was cancelled'))
+
+        return True
+
+    def _ingest(self, job_id: str, index: int, data_id: str) -> bool:
+        log = self._log
+
+        conn = db.get_connection()
+        try:
+            claimed = db.jobs.claim_ingestion(conn, job_id=job_id, worker_id=self.worker_id, lease=JOB_WORKER_CLAIM_TTL)
+        except db.DatabaseError as err:
+            log.error('<%03d/%s> Could not claim job for ingestion', index, job_id)
+            db.print_diagnostics(err)
+            return False
+        finally:
+            conn.close()
+        if not claimed:
+            log.info('<%03d/%s> Job has finished or was claimed by another worker; skipping ingestion', index, job_id)
+            return False
+
+        log.info('<%03d/%s> Resolving detections data ID (via <%s>)', index, job_id, data_id)
+        try:
+            detections_data_id = _resolve_detections_data_id(data_id)
+        except PostprocessingError as err:
+            log.error('<%03d/%s> Could not resolve detections data ID: %s', index, job_id, err)
+            _save_execution_error(job_id, STEP_RESOLVE, str(err))
+            return False
+
+        log.info('<%03d/%s> Fetching detections from Piazza', index, job_id)
+        try:
+            geojson = _ByteCounter(piazza.stream_file(detections_data_id))
+        except piazza.Error as err:
+            log.error('<%03d/%s> Could not fetch data ID <%s>: %s', index, job_id, detections_data_id, err)
+            _save_execution_error(job_id, STEP_COLLECT_GEOJSON, 'Could not retrieve GeoJSON from Piazza')
+            return False
+
+        log.info('<%03d/%s> Streaming detections to database', index, job_id)
+        conn = db.get_connection()
+        transaction = conn.begin()
+        try:
+            db.jobs.insert_detection(conn, job_id=job_id, feature_collection=geojson)
+            updated = db.jobs.update_status(
+                conn,
+                job_id=job_id,
+                status=piazza.STATUS_SUCCESS,
+                from_statuses=db.jobs.OUTSTANDING_STATUSES,
+            )
+            if not updated:
+                transaction.rollback()
+                log.warning('<%03d/%s> Job finished while its detections were being saved; discarding them', index, job_id)
+                return False
+            transaction.commit()
+        except piazza.Error as err:
+            transaction.rollback()
+            transaction.close()
+            log.error('<%03d/%s> Could not fetch data ID <%s>: %s', index, job_id, detections_data_id, err)
+            _save_execution_error(job_id, STEP_COLLECT_GEOJSON, 'Could not retrieve GeoJSON from Piazza')
+            return False
+        except ValueError as err:
+            transaction.rollback()
+            transaction.close()
+            log.error('<%03d/%s> Could not parse detections: %s', index, job_id, err)
+            _save_execution_error(job_id, STEP_COLLECT_GEOJSON, 'Could not parse GeoJSON from Piazza')
+            return False
+        except db.DatabaseError as err:
+            transaction.rollback()
+            transaction.close()
+            log.error('<%03d/%s> Could not save status and detections to database', index, job_id)
+            db.print_diagnostics(err)
+            _save_execution_error(job_id, STEP_COLLECT_GEOJSON, 'Could not insert GeoJSON to database')
+            return False
+        finally:
+            conn.close()
+
+        # Every process, this one included, drops the job's cached tiles when it hears of the Success
+        log.info('<%03d/%s> Saved detections (%0.1fMB)', index, job_id, geojson.count / 1024000)
+        return True
 
 
 #
@@ -605,6 +1127,129 @@ def _create_algorithm_cli_cmd(
         raise PreprocessingError(message=error_message)
 
 
+def _stream_feature_collection(job_id: str, conn: db.Connection, cursor: db.ResultProxy, limit: int = None) -> Iterator[str]:
+    log = logging.getLogger(__name__)
+    count = 0
+    last_row = None
+    truncated = False
+    try:
+        yield '{"type":"FeatureCollection","features":['
+        while not truncated:
+            rows = cursor.fetchmany(DETECTIONS_STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if limit and count + len(rows) > limit:
+                rows = rows[:limit - count]
+                truncated = True
+            if rows:
+                chunk = ','.join(row['feature'] for row in rows)
+                yield chunk if not count else ',' + chunk
+                count += len(rows)
+                last_row = rows[-1]
+        if truncated:
+            yield '],"next_cursor":{}}}'.format(last_row['feature_id'])
+        else:
+            yield ']}'
+    except db.DatabaseError as err:
+        log.error('Stream of detections for <job:%s> interrupted after %d features', job_id, count)
+        db.print_diagnostics(err)
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    log.debug('Streaming complete: %d features for <job:%s>', count, job_id)
+
+
+class _ByteCounter:
+    def __init__(self, chunks: Iterator[bytes]):
+        self.count = 0
+        self._chunks = chunks
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self.count += len(chunk)
+            yield chunk
+
+
+_StatusChange = collections.namedtuple('_StatusChange', 'job_id status execution_step error_message')
+
+
+class _StageMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._busy_seconds = 0.0
+        self._completed = 0
+        self._failed = 0
+        self._queued = 0
+
+    def enqueue(self, count: int = 1):
+        with self._lock:
+            self._queued += count
+
+    def cancel(self, count: int = 1):
+        with self._lock:
+            self._queued -= count
+
+    def finish(self, duration: float, succeeded: bool):
+        with self._lock:
+            self._queued -= 1
+            self._busy_seconds += duration
+            if succeeded:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                'queue_depth': self._queued,
+                'completed': self._completed,
+                'failed': self._failed,
+                'throughput': finished / max(time.monotonic() - self._started_at, 1.0),
+                'mean_duration': self._busy_seconds / finished if finished else 0.0,
+            }
+
+
+def _lod_for_resolution(resolution: float = None) -> int:
+    if not resolution:
+        return 0
+    return db.jobs.lod_for_resolution(resolution)
+
+
+def _next_poll_delay(
+        previous_status: str,
+        status: str,
+        age: timedelta,
+        status_age: timedelta,
+        interval: timedelta) -> timedelta:
+    """
+    Returns how long to wait before polling a job again, or `None` once it no
+    longer needs polling.  Jobs stuck in the queue back off exponentially with
+    their age, while running jobs are polled quickly at first and back off with
+    the time since they started running; jitter keeps jobs created together
+    from being polled in lockstep.
+    """
+    if status is None:
+        delay = interval
+    elif status in (piazza.STATUS_SUBMITTED, piazza.STATUS_PENDING):
+        delay = min(interval * 2 ** _doublings(age), max(interval, JOB_WORKER_MAX_INTERVAL))
+    elif status == piazza.STATUS_RUNNING:
+        if previous_status != piazza.STATUS_RUNNING:
+            delay = JOB_WORKER_FAST_INTERVAL
+        else:
+            delay = min(JOB_WORKER_FAST_INTERVAL * 2 ** _doublings(status_age), interval)
+    else:
+        return None
+
+    return delay * random.uniform(1 - JOB_WORKER_JITTER, 1 + JOB_WORKER_JITTER)
+
+
+def _doublings(age: timedelta) -> int:
+    return min(int(age / JOB_WORKER_BACKOFF_STEP), 16)
+
+
 def _resolve_detections_data_id(output_data_id: str) -> str:
     try:
         execution_output = piazza.get_file(output_data_id).json()
@@ -623,11 +1268,15 @@ def _save_execution_error(job_id: str, execution_step: str, error_message: str,
     conn = db.get_connection()
     transaction = conn.begin()
     try:
-        db.jobs.update_status(
-            conn,
-            job_id=job_id,
-            status=status,
-        )
+        # Never overwrite the outcome of a job that has since finished (e.g., ingested by another worker)
+        if not db.jobs.update_status(
+                conn,
+                job_id=job_id,
+                status=status,
+                from_statuses=db.jobs.OUTSTANDING_STATUSES):
+            transaction.rollback()
+            log.info('<%s> job has already finished; not recording failure', job_id)
+            return
         db.jobs.insert_job_failure(
             conn,
             job_id=job_id,
@@ -664,6 +1313,10 @@ class NotFound(Error):
         self.job_id = job_id
 
 
+class InvalidQuery(Error):
+    pass
+
+
 class PostprocessingError(Error):
     def __init__(self, err: Exception = None, message: str = None):
         super().__init__('during postprocessing, {}'.format(message or err))
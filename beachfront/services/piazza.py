@@ -11,12 +11,15 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
 import logging
 import requests
+import requests.adapters
+import threading
 import time
 
-from beachfront.config import PIAZZA_HOST, PIAZZA_SCHEME, PIAZZA_API_KEY
+from beachfront.config import PIAZZA_HOST, PIAZZA_SCHEME, PIAZZA_API_KEY, PIAZZA_POOL_SIZE
 
 STATUS_CANCELLED = 'Cancelled'
 STATUS_CANCELLING = 'Cancelling'
@@ -26,12 +29,22 @@ STATUS_PENDING = 'Pending'
 STATUS_RUNNING = 'Running'
 STATUS_SUBMITTED = 'Submitted'
 STATUS_SUCCESS = 'Success'
+FILE_CHUNK_SIZE = 64 * 1024
 TYPE_DATA = 'data'
 TYPE_DEPLOYMENT = 'deployment'
 
 TIMEOUT_LONG = 24
 TIMEOUT_SHORT = 6
 
+# (connect, read) in seconds, keyed by the first segment of the request path
+TIMEOUT_DEFAULT = (TIMEOUT_SHORT, TIMEOUT_LONG)
+TIMEOUTS = {
+    'file': (TIMEOUT_SHORT, TIMEOUT_LONG * 2),
+}
+
+_client = None  # type: Client
+_client_lock = threading.Lock()
+
 
 #
 # Types
@@ -65,6 +78,40 @@ class ServiceDescriptor:
         self.service_id = service_id
 
 
+class Client:
+    """
+    Shared Piazza HTTP client.  Requests go through one `requests.Session` whose
+    connection pool keeps TCP/TLS connections alive between calls; the pool is
+    safe to use from the worker's polling threads and the request threads alike.
+    """
+
+    def __init__(self, *, pool_size: int = PIAZZA_POOL_SIZE, timeouts: dict = None):
+        self._timeouts = dict(TIMEOUTS, **(timeouts or {}))
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def close(self):
+        self._session.close()
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        endpoint = path.lstrip('/').split('/', 1)[0]
+        kwargs.setdefault('timeout', self._timeouts.get(endpoint, TIMEOUT_DEFAULT))
+        return self._session.request(
+            method,
+            '{}://{}{}'.format(PIAZZA_SCHEME, PIAZZA_HOST, path),
+            auth=(PIAZZA_API_KEY, ''),
+            **kwargs
+        )
+
+
 #
 # Actions
 #
@@ -73,10 +120,8 @@ def create_trigger(*, data_inputs: dict, event_type_id: str, name: str, service_
     log = logging.getLogger(__name__)
     log.info('Piazza service create trigger', action='service piazza create trigger')
     try:
-        response = requests.post(
-            '{}://{}/trigger'.format(PIAZZA_SCHEME, PIAZZA_HOST),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
+        response = get_client().post(
+            '/trigger',
             json={
                 'name': name,
                 'eventTypeId': event_type_id,
@@ -124,10 +169,8 @@ def deploy(data_id: str, *, poll_interval: int = 3, max_poll_attempts: int = 10)
     log = logging.getLogger(__name__)
     log.info('Piazza service deploy', action='service piazza deploy')
     try:
-        response = requests.post(
-            '{}://{}/deployment'.format(PIAZZA_SCHEME, PIAZZA_HOST),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
+        response = get_client().post(
+            '/deployment',
             json={
                 'dataId': data_id,
                 'deploymentType': 'geoserver',
@@ -178,10 +221,8 @@ def execute(service_id: str, data_inputs: dict, data_output: list = None) -> str
     log = logging.getLogger(__name__)
     log.info('Piazza service execute', action='service piazza execute')
     try:
-        response = requests.post(
-            '{}://{}/job'.format(PIAZZA_SCHEME, PIAZZA_HOST),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
+        response = get_client().post(
+            '/job',
             headers={
                 'Content-Type': 'application/json',
             },
@@ -218,15 +259,19 @@ def execute(service_id: str, data_inputs: dict, data_output: list = None) -> str
     return job_id
 
 
+def get_client() -> Client:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client()
+        return _client
+
+
 def get_file(data_id: str) -> requests.Response:
     log = logging.getLogger(__name__)
     log.info('Piazza service get file', action='service piazza get file')
     try:
-        response = requests.get(
-            '{}://{}/file/{}'.format(PIAZZA_SCHEME, PIAZZA_HOST, data_id),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
-        )
+        response = get_client().get('/file/{}'.format(data_id))
         response.raise_for_status()
     except requests.ConnectionError as err:
         log.error('Connection failed: %s; url="%s"', err, err.request.url)
@@ -239,15 +284,35 @@ def get_file(data_id: str) -> requests.Response:
     return response
 
 
+def stream_file(data_id: str, chunk_size: int = FILE_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Like `get_file()`, but leaves the body on the wire and returns an iterator
+    over it in chunks of `chunk_size` bytes.  HTTP errors are raised right away;
+    losing the connection partway through raises `Unreachable` from the
+    iterator.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Piazza service stream file', action='service piazza stream file')
+    try:
+        response = get_client().get('/file/{}'.format(data_id), stream=True)
+        response.raise_for_status()
+    except requests.ConnectionError as err:
+        log.error('Connection failed: %s; url="%s"', err, err.request.url)
+        raise Unreachable()
+    except requests.HTTPError as err:
+        err.response.close()
+        status_code = err.response.status_code
+        if status_code == 401:
+            raise Unauthorized()
+        raise ServerError(status_code)
+    return _iter_content(response, chunk_size)
+
+
 def get_service(service_id: str) -> ServiceDescriptor:
     log = logging.getLogger(__name__)
     log.info('Piazza service get service', action='service piazza get service')
     try:
-        response = requests.get(
-            '{}://{}/service/{}'.format(PIAZZA_SCHEME, PIAZZA_HOST, service_id),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
-        )
+        response = get_client().get('/service/{}'.format(service_id))
         response.raise_for_status()
     except requests.ConnectionError as err:
         log.error('Connection failed: %s; url="%s"', err, err.request.url)
@@ -271,10 +336,8 @@ def get_services(pattern: str, count: int = 100) -> List[ServiceDescriptor]:
     log = logging.getLogger(__name__)
     log.info('Piazza service get service', action='service piazza get service')
     try:
-        response = requests.get(
-            '{}://{}/service'.format(PIAZZA_SCHEME, PIAZZA_HOST),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
+        response = get_client().get(
+            '/service',
             params={
                 'keyword': pattern,
                 'perPage': count,
@@ -303,11 +366,7 @@ def get_status(job_id: str) -> Status:
     log = logging.getLogger(__name__)
     log.info('Piazza service get status', action='service piazza get status')
     try:
-        response = requests.get(
-            '{}://{}/job/{}'.format(PIAZZA_SCHEME, PIAZZA_HOST, job_id),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
-        )
+        response = get_client().get('/job/{}'.format(job_id))
         response.raise_for_status()
     except requests.ConnectionError as err:
         log.error('Connection failed: %s; url="%s"', err, err.request.url)
@@ -374,14 +433,37 @@ def get_status(job_id: str) -> Status:
     return Status(status)
 
 
+def get_statuses(job_ids: List[str], concurrency: int = PIAZZA_POOL_SIZE,
+                 durations: Dict[str, float] = None) -> Dict[str, object]:
+    """
+    Looks up the status of many jobs at once.  Piazza offers no bulk or query
+    endpoint for job status, so the lookups are pipelined over the shared
+    client's connection pool, `concurrency` at a time.  Each job ID maps to
+    either its `Status` or the `Error` raised while fetching it, so one bad
+    job does not sink the batch.  Given `durations`, the time each lookup took
+    is recorded there by job ID.
+    """
+    job_ids = list(job_ids)
+    if not job_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(job_ids)))) as pool:
+        futures = [(job_id, pool.submit(_timed_get_status, job_id)) for job_id in job_ids]
+
+    statuses = {}
+    for job_id, future in futures:
+        statuses[job_id], duration = future.result()
+        if durations is not None:
+            durations[job_id] = duration
+    return statuses
+
+
 def get_triggers(name: str) -> list:
     log = logging.getLogger(__name__)
     log.info('Piazza service get trigger', action='service piazza get trigger')
     try:
-        response = requests.post(
-            '{}://{}/trigger/query'.format(PIAZZA_SCHEME, PIAZZA_HOST),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
+        response = get_client().post(
+            '/trigger/query',
             json={
                 'query': {
                     'match': {
@@ -421,10 +503,8 @@ def register_service(
     log = logging.getLogger(__name__)
     log.info('Piazza service register service', action='service piazza register service')
     try:
-        response = requests.post(
-            '{}://{}/service'.format(PIAZZA_SCHEME, PIAZZA_HOST),
-            timeout=TIMEOUT_LONG,
-            auth=(PIAZZA_API_KEY, ''),
+        response = get_client().post(
+            '/service',
             json={
                 'url': url,
                 'contractUrl': contract_url,
@@ -469,6 +549,34 @@ def register_service(
 # Helpers
 #
 
+def _iter_content(response: requests.Response, chunk_size: int) -> Iterator[bytes]:
+    log = logging.getLogger(__name__)
+    try:
+        yield from response.iter_content(chunk_size)
+    except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as err:
+        log.error('Connection lost while streaming: %s; url="%s"', err, response.url)
+        raise Unreachable()
+    finally:
+        response.close()
+
+
+def _timed_get_status(job_id: str) -> (object, float):
+    log = logging.getLogger(__name__)
+    started_at = time.time()
+    try:
+        status = get_status(job_id)
+    except Error as err:
+        status = err
+    except ValueError as err:
+        # Checked first, since `requests` raises its JSON decoding errors as both
+        status = InvalidResponse('malformed JSON ({})'.format(err), '')
+    except requests.RequestException as err:
+        # e.g., a read timeout, which `get_status` does not anticipate
+        log.error('Request failed: %s; job_id="%s"', err, job_id)
+        status = Unreachable()
+    return status, time.time() - started_at
+
+
 def _to_service_descriptor(datum: dict, response_text: str):
     metadata = datum.get('resourceMetadata')  # type: dict
     if not metadata:
@@ -200,6 +200,25 @@ def get_all() -> List[ProductLine]:
     return productlines
 
 
+def get_all_fingerprint() -> str:
+    """
+    Returns a short string that changes whenever `get_all()` would, without loading any of the
+    product lines.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Productline service get fingerprint', action='service productline get fingerprint')
+
+    conn = db.get_connection()
+    try:
+        return db.productlines.select_fingerprint(conn).scalar()
+    except db.DatabaseError as err:
+        log.error('Could not fingerprint productlines')
+        db.print_diagnostics(err)
+        raise
+    finally:
+        conn.close()
+
+
 #
 # Helpers
 #
@@ -0,0 +1,154 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import logging
+import math
+import threading
+from typing import Tuple
+
+from beachfront import db
+from beachfront.config import MVT_CACHE_DIR, MVT_CACHE_DISK_SIZE, MVT_CACHE_MEMORY_SIZE
+from beachfront.utils.singleflight import SingleFlight
+from beachfront.utils.tilecache import TileCache
+
+BUFFER = 64
+EXTENT = 4096
+LAYER_NAME = 'detections'
+MAX_ZOOM = 24
+MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+WEB_MERCATOR_HALF_WIDTH = 20037508.342789244
+
+_tile_cache = None  # type: TileCache
+_tile_cache_lock = threading.Lock()
+_tile_flights = SingleFlight()
+
+
+#
+# Actions
+#
+
+def get_tile(z: int, x: int, y: int, *, job_id: str = None, productline_id: str = None, scene_id: str = None) -> bytes:
+    """
+    Returns a Mapbox Vector Tile of the detections within tile `z/x/y`,
+    optionally filtered by job, product line or scene.  Tiles are built by
+    PostGIS from the geometry tier suited to the zoom level and cached until
+    detections for an affected job are ingested.
+    """
+    log = logging.getLogger(__name__)
+
+    if not 0 <= z <= MAX_ZOOM:
+        raise InvalidTile('zoom must be between 0 and {}'.format(MAX_ZOOM))
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise InvalidTile('tile {}/{}/{} does not exist'.format(z, x, y))
+
+    filters = {'job_id': job_id, 'productline_id': productline_id, 'scene_id': scene_id}
+    tags = frozenset((k, v) for k, v in filters.items() if v)
+    cache_key = '{}/{}/{}?{}'.format(z, x, y, '&'.join('{}={}'.format(k, v) for k, v in sorted(tags)))
+
+    cache = get_tile_cache()
+    cached = cache.get(cache_key)
+    if cached:
+        log.debug('Serving vector tile from cache')
+        return cached[0]
+
+    def render():
+        generation = cache.generation
+        conn = db.get_connection()
+        try:
+            tile = db.jobs.select_detection_tile(
+                conn,
+                bounds=_tile_bounds(z, x, y),
+                extent=EXTENT,
+                buffer=BUFFER,
+                layer_name=LAYER_NAME,
+                lod=db.jobs.lod_for_resolution(_tile_resolution(z)),
+                **filters
+            ).scalar()
+        except db.DatabaseError as err:
+            log.error('Could not build vector tile %d/%d/%d', z, x, y)
+            db.print_diagnostics(err)
+            raise
+        finally:
+            conn.close()
+
+        tile = bytes(tile or b'')
+        cache.put(cache_key, tile, {}, tags, generation)
+        return tile
+
+    tile, _ = _tile_flights.do(cache_key, render)
+    return tile
+
+
+def get_tile_cache() -> TileCache:
+    global _tile_cache
+    with _tile_cache_lock:
+        if not _tile_cache:
+            _tile_cache = TileCache(
+                memory_size=MVT_CACHE_MEMORY_SIZE,
+                disk_size=MVT_CACHE_DISK_SIZE,
+                disk_dir=MVT_CACHE_DIR,
+            )
+        return _tile_cache
+
+
+def invalidate(job_id: str) -> int:
+    """
+    Drops every cached vector tile that could include detections from the given
+    job, following the same rules as `geoserver.invalidate_tiles()`.
+    """
+    log = logging.getLogger(__name__)
+
+    def affected(tags: frozenset) -> bool:
+        if not tags or ('job_id', job_id) in tags:
+            return True
+        return any(name != 'job_id' for name, _ in tags)
+
+    count = get_tile_cache().invalidate(affected)
+    log.info('Invalidated %d cached vector tiles for job `%s`', count, job_id, action='invalidate tiles', actee=job_id)
+    return count
+
+
+#
+# Helpers
+#
+
+def _tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    Returns the Web Mercator envelope of an XYZ tile as (xmin, ymin, xmax, ymax).
+    """
+    size = 2 * WEB_MERCATOR_HALF_WIDTH / math.pow(2, z)
+    xmin = -WEB_MERCATOR_HALF_WIDTH + x * size
+    ymax = WEB_MERCATOR_HALF_WIDTH - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def _tile_resolution(z: int) -> float:
+    """
+    Returns the size of a tile's grid cell in degrees of longitude.
+    """
+    return 360 / math.pow(2, z) / EXTENT
+
+
+#
+# Errors
+#
+
+class Error(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class InvalidTile(Error):
+    def __init__(self, message: str):
+        super().__init__('invalid tile: {}'.format(message))
@@ -11,19 +11,26 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import collections
 import logging
 import re
+import threading
+import time
 import uuid
 from datetime import datetime
 
 import passlib.hash
 
 from beachfront import db
+from beachfront.config import API_KEY_CACHE_NEGATIVE_TTL, API_KEY_CACHE_SIZE, API_KEY_CACHE_TTL
 
 
 TIMEOUT = 12
 PATTERN_API_KEY = re.compile('^[a-f0-9]{32,}$')
 
+_api_key_cache = collections.OrderedDict()  # type: collections.OrderedDict
+_api_key_cache_lock = threading.Lock()
+
 
 class User:
     def __init__(
@@ -50,6 +57,12 @@ def authenticate_via_api_key(api_key: str) -> User:
         log.error('Cannot verify malformed API key: "%s"', api_key)
         raise MalformedAPIKey()
 
+    cached = _get_cached_user(api_key)
+    if cached is not None:
+        if not isinstance(cached, User):
+            raise Unauthorized('CoastLine API key is not active')
+        return cached
+
     log.debug('Checking "%s"', api_key)
     conn = db.get_connection()
     try:
@@ -63,14 +76,17 @@ def authenticate_via_api_key(api_key: str) -> User:
 
     if not row:
         log.error('Unauthorized API key "%s"', api_key)
+        _cache_user(api_key, False, API_KEY_CACHE_NEGATIVE_TTL.total_seconds())
         raise Unauthorized('CoastLine API key is not active')
 
-    return User(
+    user = User(
         user_id=row['user_id'],
         api_key=row['api_key'],
         name=row['user_name'],
         created_on=row['created_on'],
     )
+    _cache_user(api_key, user, API_KEY_CACHE_TTL.total_seconds())
+    return user
 
 
 def authenticate_via_password(user_id: str, plaintext_password: str) -> User:
@@ -119,6 +135,30 @@ def get_by_id(user_id: str) -> User:
     )
 
 
+def forget_all_api_keys() -> None:
+    """
+    Evicts every cached authentication result, e.g. when rotations may have
+    been announced while this process was not listening.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Forgetting all cached API keys', action='forget cached api keys')
+    with _api_key_cache_lock:
+        _api_key_cache.clear()
+
+
+def forget_api_key(*, api_key: str = None, user_id: str = None) -> None:
+    """
+    Evicts cached authentication results for an API key and/or every key
+    belonging to a user, e.g. after their credentials have been rotated.
+    """
+    log = logging.getLogger(__name__)
+    log.info('Forgetting cached API keys', action='forget cached api keys', actee=user_id)
+    with _api_key_cache_lock:
+        for key, (value, _) in list(_api_key_cache.items()):
+            if key == api_key or (user_id and isinstance(value, User) and value.user_id == user_id):
+                del _api_key_cache[key]
+
+
 def is_api_key(api_key):
     return PATTERN_API_KEY.match(api_key)
 
@@ -127,6 +167,31 @@ def is_api_key(api_key):
 # Helpers
 #
 
+def _cache_user(api_key: str, value, ttl: float):
+    with _api_key_cache_lock:
+        _api_key_cache[api_key] = (value, time.monotonic() + ttl)
+        _api_key_cache.move_to_end(api_key)
+        while len(_api_key_cache) > API_KEY_CACHE_SIZE:
+            _api_key_cache.popitem(last=False)
+
+
+def _get_cached_user(api_key: str):
+    """
+    Returns the cached `User` for the key, `False` if the key is known to be
+    inactive, or `None` if the database must be consulted.
+    """
+    with _api_key_cache_lock:
+        entry = _api_key_cache.get(api_key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del _api_key_cache[api_key]
+            return None
+        _api_key_cache.move_to_end(api_key)
+        return value
+
+
 def _create_user(user_id, user_name) -> User:
     log = logging.getLogger(__name__)
     api_key = uuid.uuid4().hex
@@ -51,7 +51,7 @@ def reset(user_id):
     password = _create_password()
 
     try:
-        with db.get_connection() as conn:
+        with db.get_connection() as conn, conn.begin():
             cursor = conn.execute("""
                 UPDATE useraccount
                 SET password_hash = %(password_hash)s,
@@ -66,6 +66,9 @@ def reset(user_id):
             if not cursor.rowcount:
                 _fail_immediately('USER "{}" NOT FOUND'.format(user_id))
 
+            # Server processes drop the old key from their caches once this commits
+            db.users.notify_api_key_rotated(conn, user_id=user_id)
+
     except db.DatabaseError as err:
         _fail_immediately(str(err))
 
@@ -0,0 +1,194 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import codecs
+import json
+from typing import Iterable, Iterator
+
+SRID_WGS84 = 4326
+
+_DELIMITERS = frozenset(' \t\n\r,:]}')
+_decoder = json.JSONDecoder()
+
+
+def iter_features(source) -> Iterator[dict]:
+    """
+    Yields the members of a feature collection's `features` array one at a time
+    without materializing the whole document as Python objects.  `source` may
+    be the whole document or an iterable of `str`/`bytes` chunks (e.g., a
+    streamed download), in which case only the current chunk and the feature
+    being parsed are held in memory.
+    """
+
+    reader = _Reader([source] if isinstance(source, (str, bytes)) else source)
+    reader.expect('{')
+
+    while not reader.consume('}'):
+        key = reader.decode()
+        reader.expect(':')
+
+        if key != 'features':
+            reader.decode()
+        else:
+            reader.expect('[')
+            if not reader.consume(']'):
+                while True:
+                    yield reader.decode()
+                    if reader.consume(']'):
+                        break
+                    reader.expect(',')
+
+        reader.consume(',')
+
+
+def to_ewkt(geometry: dict, srid: int = SRID_WGS84) -> str:
+    return 'SRID={};{}'.format(srid, to_wkt(geometry))
+
+
+def to_wkt(geometry: dict) -> str:
+    """
+    Serializes a GeoJSON geometry as WKT.  Throws `ValueError` for anything
+    that is not a well-formed geometry of a supported type.
+    """
+    if not isinstance(geometry, dict):
+        raise ValueError('geometry must be an object, not `{}`'.format(geometry))
+    geometry_type = geometry.get('type')
+
+    if geometry_type == 'GeometryCollection':
+        return _tagged('GEOMETRYCOLLECTION', geometry.get('geometries'), to_wkt)
+
+    coordinates = geometry.get('coordinates')
+    if geometry_type == 'Point':
+        return 'POINT EMPTY' if coordinates is None or coordinates == [] else 'POINT ({})'.format(_position(coordinates))
+    elif geometry_type == 'LineString':
+        return _tagged('LINESTRING', coordinates, _position)
+    elif geometry_type == 'Polygon':
+        return _tagged('POLYGON', coordinates, _ring)
+    elif geometry_type == 'MultiPoint':
+        return _tagged('MULTIPOINT', coordinates, lambda p: '({})'.format(_position(p)))
+    elif geometry_type == 'MultiLineString':
+        return _tagged('MULTILINESTRING', coordinates, _ring)
+    elif geometry_type == 'MultiPolygon':
+        return _tagged('MULTIPOLYGON', coordinates, lambda p: '({})'.format(','.join(_ring(r) for r in _array(p))))
+
+    raise ValueError('unsupported geometry type `{}`'.format(geometry_type))
+
+
+#
+# Helpers
+#
+
+class _Reader:
+    """
+    Cursor over a JSON document arriving in chunks.  Consumed text is dropped
+    whenever another chunk is pulled in, so the buffer never grows much beyond
+    the largest single value being decoded.
+    """
+
+    def __init__(self, chunks: Iterable):
+        self.index = 0
+        self.text = ''
+        self._chunks = iter(chunks)
+        self._exhausted = False
+        self._offset = 0
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def consume(self, token: str) -> bool:
+        self._skip_whitespace()
+        if self.text.startswith(token, self.index):
+            self.index += len(token)
+            return True
+        return False
+
+    def decode(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.index)
+            except ValueError:
+                # Read at least as much again before retrying so a large value is only re-parsed O(log n) times
+                if self._fill(len(self.text) - self.index):
+                    continue
+                raise
+
+            # A number may continue in the next chunk (e.g., `1.` then `5`), so only a delimiter ends it for sure
+            if (end < len(self.text) and self.text[end] in _DELIMITERS) or not self._fill():
+                self.index = end
+                return value
+
+    def expect(self, token: str):
+        if not self.consume(token):
+            raise ValueError('expected `{}` at position {}'.format(token, self._offset + self.index))
+
+    def _fill(self, size: int = 1) -> bool:
+        """
+        Appends at least `size` more characters to the buffer (fewer only when
+        the input runs out), joining the new chunks in a single copy.
+        """
+
+        parts = [self.text[self.index:]]
+        pulled = 0
+        while pulled < max(size, 1) and not self._exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+                chunk = self._utf8.decode(b'', final=True)
+            elif isinstance(chunk, bytes):
+                chunk = self._utf8.decode(chunk)
+            if chunk:
+                parts.append(chunk)
+                pulled += len(chunk)
+
+        if not pulled:
+            return False
+
+        self._offset += self.index
+        self.text = ''.join(parts)
+        self.index = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self.index = _skip_whitespace(self.text, self.index)
+            if self.index < len(self.text) or not self._fill():
+                return
+
+
+def _array(value) -> list:
+    if not isinstance(value, list):
+        raise ValueError('expected an array of coordinates, not `{}`'.format(value))
+    return value
+
+
+def _position(position: list) -> str:
+    if (not isinstance(position, list)
+            or not 2 <= len(position) <= 4
+            or not all(isinstance(n, (int, float)) and not isinstance(n, bool) for n in position)):
+        raise ValueError('invalid position `{}`'.format(position))
+    return ' '.join(str(n) for n in position)
+
+
+def _ring(positions: list) -> str:
+    return '({})'.format(','.join(_position(p) for p in _array(positions)))
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in ' \t\n\r':
+        index += 1
+    return index
+
+
+def _tagged(tag: str, members: list, serialize) -> str:
+    if members is None or members == []:
+        return tag + ' EMPTY'
+    return '{} ({})'.format(tag, ','.join(serialize(m) for m in _array(members)))
@@ -0,0 +1,73 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import threading
+from typing import Callable, Tuple
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.  The first caller runs
+    the function; everyone who arrives while it is still running waits for and
+    shares its result (or its exception).
+    """
+
+    def __init__(self):
+        self.stats = {
+            'calls': 0,
+            'shared': 0,
+        }
+        self._lock = threading.Lock()
+        self._flights = {}  # type: dict
+
+    def do(self, key: str, fn: Callable) -> Tuple[object, bool]:
+        """
+        Returns the result of `fn()` and whether it was shared with an earlier
+        caller rather than computed for this one.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+                self.stats['calls'] += 1
+            else:
+                self.stats['shared'] += 1
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except Exception as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+#
+# Helpers
+#
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None  # type: Exception
@@ -0,0 +1,195 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import collections
+import hashlib
+import logging
+import os
+import threading
+from typing import Callable, Tuple
+
+FILE_SUFFIX = '.tile'
+
+
+class TileCache:
+    """
+    A two-tier, size-bounded LRU cache of rendered tiles.  Every tile is kept in
+    memory and written through to disk; the memory tier holds the hottest tiles
+    while the (larger) disk tier catches what falls out of it.  Each tile carries
+    a set of tags that `invalidate()` can select on, plus the response headers
+    to replay when it is served.
+    """
+
+    def __init__(self, *, memory_size: int, disk_size: int = 0, disk_dir: str = None):
+        self.memory_size = memory_size
+        self.disk_size = disk_size if disk_dir else 0
+        self.disk_dir = disk_dir
+        self.generation = 0
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+        self._lock = threading.Lock()
+        self._memory = collections.OrderedDict()  # type: collections.OrderedDict
+        self._memory_used = 0
+        self._disk = collections.OrderedDict()  # type: collections.OrderedDict
+        self._disk_used = 0
+
+        if self.disk_size:
+            self._prepare_disk_dir()
+
+    def get(self, key: str) -> Tuple[bytes, dict]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry.content, entry.headers
+
+            disk_entry = self._disk.get(key)
+            if not disk_entry:
+                self.stats['misses'] += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(disk_entry.path, 'rb') as fp:
+                content = fp.read()
+        except OSError:
+            # Evicted or invalidated while we were reading
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            if self._disk.get(key) is disk_entry:
+                self._put_memory(key, _Entry(content, disk_entry.headers, disk_entry.tags))
+        return content, disk_entry.headers
+
+    def put(self, key: str, content: bytes, headers: dict, tags: frozenset = frozenset(), generation: int = None):
+        """
+        Stores a tile.  Passing the `generation` observed before the tile was
+        rendered keeps a render that raced an invalidation from being cached.
+        """
+        log = logging.getLogger(__name__)
+
+        if generation is not None and generation != self.generation:
+            return
+
+        disk_entry = None
+        if 0 < len(content) <= self.disk_size:
+            path = os.path.join(self.disk_dir, hashlib.sha256(key.encode()).hexdigest() + FILE_SUFFIX)
+            try:
+                _write_atomically(path, content)
+                disk_entry = _DiskEntry(path, len(content), headers, tags)
+            except OSError as err:
+                log.warning('Could not write tile to disk cache: %s', err)
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                if disk_entry:
+                    _remove_file(disk_entry.path)
+                return
+            if len(content) <= self.memory_size:
+                self._put_memory(key, _Entry(content, headers, tags))
+            if disk_entry:
+                self._put_disk(key, disk_entry)
+
+    def invalidate(self, predicate: Callable[[frozenset], bool]) -> int:
+        """
+        Drops every tile whose tags satisfy `predicate` from both tiers and
+        returns how many distinct tiles were dropped.
+        """
+        with self._lock:
+            self.generation += 1
+            memory_keys = [k for k, e in self._memory.items() if predicate(e.tags)]
+            disk_keys = [k for k, e in self._disk.items() if predicate(e.tags)]
+            for key in memory_keys:
+                self._memory_used -= len(self._memory.pop(key).content)
+            for key in disk_keys:
+                self._remove_disk(key)
+            count = len(set(memory_keys) | set(disk_keys))
+            self.stats['invalidations'] += count
+        return count
+
+    def clear(self):
+        self.invalidate(lambda _: True)
+
+    #
+    # Internals (callers must hold the lock)
+    #
+
+    def _prepare_disk_dir(self):
+        log = logging.getLogger(__name__)
+
+        # The index only lives in memory, so tiles left by a previous process are unreachable
+        os.makedirs(self.disk_dir, exist_ok=True)
+        for filename in os.listdir(self.disk_dir):
+            if filename.endswith(FILE_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.disk_dir, filename))
+                except OSError as err:
+                    log.warning('Could not remove stale tile `%s`: %s', filename, err)
+
+    def _put_memory(self, key: str, entry):
+        existing = self._memory.pop(key, None)
+        if existing:
+            self._memory_used -= len(existing.content)
+        self._memory[key] = entry
+        self._memory_used += len(entry.content)
+        while self._memory_used > self.memory_size:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted.content)
+            self.stats['evictions'] += 1
+
+    def _put_disk(self, key: str, entry):
+        existing = self._disk.pop(key, None)
+        if existing:
+            self._disk_used -= existing.size
+        self._disk[key] = entry
+        self._disk_used += entry.size
+        while self._disk_used > self.disk_size:
+            self._remove_disk(next(iter(self._disk)))
+            self.stats['evictions'] += 1
+
+    def _remove_disk(self, key: str):
+        entry = self._disk.pop(key)
+        self._disk_used -= entry.size
+        _remove_file(entry.path)
+
+
+#
+# Helpers
+#
+
+_Entry = collections.namedtuple('_Entry', 'content headers tags')
+
+_DiskEntry = collections.namedtuple('_DiskEntry', 'path size headers tags')
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _write_atomically(path: str, content: bytes):
+    temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+    with open(temp_path, 'wb') as fp:
+        fp.write(content)
+    os.replace(temp_path, path)
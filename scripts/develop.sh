@@ -19,7 +19,7 @@ SERVER_PORT=${PORT:=5000}
     set +a
 
 #    STATIC_BASEURL=http://localhost:$UI_PORT/ \
-    gunicorn beachfront.server:server -b localhost:$SERVER_PORT --threads 5 --reload
+    gunicorn beachfront.server:server -b localhost:$SERVER_PORT --threads 20 --reload
 ) &
 
 #(
@@ -0,0 +1,29 @@
+-- Copyright 2016, RadiantBlue Technologies, Inc.
+--
+-- Licensed under the Apache License, Version 2.0 (the "License"); you may not
+-- use this file except in compliance with the License. You may obtain a copy
+-- of the License at
+--
+-- http://www.apache.org/licenses/LICENSE-2.0
+--
+-- Unless required by applicable law or agreed to in writing, software
+-- distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+-- WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+-- License for the specific language governing permissions and limitations
+-- under the License.
+
+-- SQL Dialect: PostgreSQL + PostGIS
+
+-- Indexes for the lookups that beachfront/db/*.py runs on every request or
+-- worker cycle, which otherwise scan whole tables.  Detections can run to
+-- millions of rows, so their index is built in the background instead (see
+-- schema.indexes.sql).
+
+CREATE INDEX IF NOT EXISTS job_status_idx ON job (status);
+CREATE INDEX IF NOT EXISTS job_scene_id_idx ON job (scene_id);
+CREATE INDEX IF NOT EXISTS job_algorithm_id_scene_id_idx ON job (algorithm_id, scene_id);
+CREATE INDEX IF NOT EXISTS job_created_on_idx ON job (created_on, job_id);
+CREATE INDEX IF NOT EXISTS job_user_user_id_idx ON job_user (user_id);
+CREATE INDEX IF NOT EXISTS productline_job_job_id_idx ON productline_job (job_id);
+CREATE INDEX IF NOT EXISTS scene_geometry_idx ON scene USING GIST (geometry);
+CREATE INDEX IF NOT EXISTS productline_bbox_idx ON productline USING GIST (bbox);
@@ -0,0 +1,44 @@
+-- Copyright 2016, RadiantBlue Technologies, Inc.
+--
+-- Licensed under the Apache License, Version 2.0 (the "License"); you may not
+-- use this file except in compliance with the License. You may obtain a copy
+-- of the License at
+--
+-- http://www.apache.org/licenses/LICENSE-2.0
+--
+-- Unless required by applicable law or agreed to in writing, software
+-- distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+-- WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+-- License for the specific language governing permissions and limitations
+-- under the License.
+
+-- SQL Dialect: PostgreSQL + PostGIS
+
+-- Brings databases installed before migrations existed up to date with the
+-- columns and views that schema.install.sql has since gained.  Detections
+-- ingested earlier keep NULL simplified tiers, which fall back to the full
+-- geometry.
+
+ALTER TABLE job
+    ADD COLUMN IF NOT EXISTS claimed_by       VARCHAR(64),
+    ADD COLUMN IF NOT EXISTS lease_expires_on TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS updated_on       TIMESTAMPTZ    NOT NULL    DEFAULT CURRENT_TIMESTAMP;
+
+ALTER TABLE detection
+    ADD COLUMN IF NOT EXISTS geometry_lod1    GEOMETRY,
+    ADD COLUMN IF NOT EXISTS geometry_lod2    GEOMETRY,
+    ADD COLUMN IF NOT EXISTS geometry_lod3    GEOMETRY;
+
+CREATE OR REPLACE VIEW geoserver_lod AS
+SELECT p.*,
+       d.feature_id,
+       t.lod,
+       COALESCE(t.geometry, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       CROSS JOIN LATERAL (VALUES (0, NULL::geometry),
+                                  (1, d.geometry_lod1),
+                                  (2, d.geometry_lod2),
+                                  (3, d.geometry_lod3)) AS t (lod, geometry)
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
@@ -0,0 +1,95 @@
+-- Copyright 2016, RadiantBlue Technologies, Inc.
+--
+-- Licensed under the Apache License, Version 2.0 (the "License"); you may not
+-- use this file except in compliance with the License. You may obtain a copy
+-- of the License at
+--
+-- http://www.apache.org/licenses/LICENSE-2.0
+--
+-- Unless required by applicable law or agreed to in writing, software
+-- distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+-- WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+-- License for the specific language governing permissions and limitations
+-- under the License.
+
+-- SQL Dialect: PostgreSQL + PostGIS
+
+-- Gives each detection geometry tier a view of its own, so that the bounding
+-- box filter GeoServer adds lands on an expression that an index covers (see
+-- schema.indexes.sql for the indexes, which are built in the background).
+-- The detections layer picks its view by name; geoserver_lod stays for layers
+-- that have yet to be updated, now as a UNION ALL whose other tiers the
+-- planner prunes away once `lod` is a constant.
+
+CREATE OR REPLACE VIEW geoserver_lod0 AS
+SELECT p.*,
+       d.feature_id,
+       d.geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE OR REPLACE VIEW geoserver_lod1 AS
+SELECT p.*,
+       d.feature_id,
+       COALESCE(d.geometry_lod1, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE OR REPLACE VIEW geoserver_lod2 AS
+SELECT p.*,
+       d.feature_id,
+       COALESCE(d.geometry_lod2, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE OR REPLACE VIEW geoserver_lod3 AS
+SELECT p.*,
+       d.feature_id,
+       COALESCE(d.geometry_lod3, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE OR REPLACE VIEW geoserver_lod AS
+SELECT p.*,
+       d.feature_id,
+       0 AS lod,
+       d.geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id)
+UNION ALL
+SELECT p.*,
+       d.feature_id,
+       1 AS lod,
+       COALESCE(d.geometry_lod1, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id)
+UNION ALL
+SELECT p.*,
+       d.feature_id,
+       2 AS lod,
+       COALESCE(d.geometry_lod2, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id)
+UNION ALL
+SELECT p.*,
+       d.feature_id,
+       3 AS lod,
+       COALESCE(d.geometry_lod3, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
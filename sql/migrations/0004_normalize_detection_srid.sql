@@ -0,0 +1,37 @@
+-- Copyright 2016, RadiantBlue Technologies, Inc.
+--
+-- Licensed under the Apache License, Version 2.0 (the "License"); you may not
+-- use this file except in compliance with the License. You may obtain a copy
+-- of the License at
+--
+-- http://www.apache.org/licenses/LICENSE-2.0
+--
+-- Unless required by applicable law or agreed to in writing, software
+-- distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+-- WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+-- License for the specific language governing permissions and limitations
+-- under the License.
+
+-- SQL Dialect: PostgreSQL + PostGIS
+
+-- Detections inserted with ST_GeomFromGeoJSON (before ingestion moved to COPY
+-- with EWKT) carry SRID 0 on PostGIS older than 3.0, and PostGIS refuses to
+-- compare them with the 4326 envelopes of the bounding box and tile queries.
+-- Constrains every tier to 4326 for rows written from now on; the constraint
+-- is added NOT VALID so that nothing scans the table while the server starts.
+-- The index builder stamps the old rows in batches once the server is up and
+-- then validates it (see db._normalize_detection_srids).
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'detection_geometry_srid_check') THEN
+        ALTER TABLE detection
+            ADD CONSTRAINT detection_geometry_srid_check
+            CHECK (ST_SRID(geometry) = 4326
+                   AND ST_SRID(geometry_lod1) = 4326
+                   AND ST_SRID(geometry_lod2) = 4326
+                   AND ST_SRID(geometry_lod3) = 4326)
+            NOT VALID;
+    END IF;
+END
+$$;
@@ -14,6 +14,12 @@
 
 -- SQL Dialect: PostgreSQL + PostGIS
 
+DROP TABLE IF EXISTS schema_version;
+DROP VIEW IF EXISTS geoserver_lod;
+DROP VIEW IF EXISTS geoserver_lod0;
+DROP VIEW IF EXISTS geoserver_lod1;
+DROP VIEW IF EXISTS geoserver_lod2;
+DROP VIEW IF EXISTS geoserver_lod3;
 DROP VIEW IF EXISTS geoserver;
 DROP VIEW IF EXISTS provenance;
 DROP TABLE IF EXISTS detection;
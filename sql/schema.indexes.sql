@@ -0,0 +1,27 @@
+-- Copyright 2016, RadiantBlue Technologies, Inc.
+--
+-- Licensed under the Apache License, Version 2.0 (the "License"); you may not
+-- use this file except in compliance with the License. You may obtain a copy
+-- of the License at
+--
+-- http://www.apache.org/licenses/LICENSE-2.0
+--
+-- Unless required by applicable law or agreed to in writing, software
+-- distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+-- WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+-- License for the specific language governing permissions and limitations
+-- under the License.
+
+-- SQL Dialect: PostgreSQL + PostGIS
+
+-- Indexes on tables that can be too large to lock while the server starts.
+-- Once the server is up, one process builds whichever of these are missing,
+-- one statement at a time and without blocking writes.  schema.install.sql
+-- carries the same indexes, so a fresh install has nothing left to build.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS detection_geometry_idx ON detection USING GIST (geometry);
+
+-- One per simplified tier, matching the geometry its geoserver_lodN view exposes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS detection_geometry_lod1_idx ON detection USING GIST (COALESCE(geometry_lod1, geometry));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS detection_geometry_lod2_idx ON detection USING GIST (COALESCE(geometry_lod2, geometry));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS detection_geometry_lod3_idx ON detection USING GIST (COALESCE(geometry_lod3, geometry));
@@ -32,6 +32,8 @@ CREATE TABLE scene (
     catalog_uri       VARCHAR(255)   NOT NULL
 );
 
+CREATE INDEX scene_geometry_idx ON scene USING GIST (geometry);
+
 CREATE TABLE job (
     job_id            VARCHAR(64)    PRIMARY KEY,
     algorithm_id      VARCHAR(64)    NOT NULL,
@@ -45,20 +47,41 @@ CREATE TABLE job (
     tide              FLOAT,
     tide_min_24h      FLOAT,
     tide_max_24h      FLOAT,
+    claimed_by        VARCHAR(64),
+    lease_expires_on  TIMESTAMPTZ,
+    updated_on        TIMESTAMPTZ    NOT NULL    DEFAULT CURRENT_TIMESTAMP,  -- last change of status or error
 
     FOREIGN KEY (created_by) REFERENCES useraccount(user_id) ON DELETE CASCADE,
     FOREIGN KEY (scene_id) REFERENCES scene(scene_id) ON DELETE CASCADE
 );
 
+CREATE INDEX job_status_idx ON job (status);
+CREATE INDEX job_scene_id_idx ON job (scene_id);
+CREATE INDEX job_algorithm_id_scene_id_idx ON job (algorithm_id, scene_id);
+CREATE INDEX job_created_on_idx ON job (created_on, job_id);
+
 CREATE TABLE detection (
     job_id            VARCHAR(64),
     feature_id        INT,
     geometry          GEOMETRY       NOT NULL,
+    geometry_lod1     GEOMETRY,                 -- simplified to ~10m
+    geometry_lod2     GEOMETRY,                 -- simplified to ~100m
+    geometry_lod3     GEOMETRY,                 -- simplified to ~1km
 
     PRIMARY KEY (job_id, feature_id),
-    FOREIGN KEY (job_id) REFERENCES job(job_id) ON DELETE CASCADE
+    FOREIGN KEY (job_id) REFERENCES job(job_id) ON DELETE CASCADE,
+    CONSTRAINT detection_geometry_srid_check
+        CHECK (ST_SRID(geometry) = 4326
+               AND ST_SRID(geometry_lod1) = 4326
+               AND ST_SRID(geometry_lod2) = 4326
+               AND ST_SRID(geometry_lod3) = 4326)
 );
 
+CREATE INDEX detection_geometry_idx ON detection USING GIST (geometry);
+CREATE INDEX detection_geometry_lod1_idx ON detection USING GIST (COALESCE(geometry_lod1, geometry));
+CREATE INDEX detection_geometry_lod2_idx ON detection USING GIST (COALESCE(geometry_lod2, geometry));
+CREATE INDEX detection_geometry_lod3_idx ON detection USING GIST (COALESCE(geometry_lod3, geometry));
+
 CREATE TABLE job_user (
     job_id            VARCHAR(64),
     user_id           VARCHAR(255),
@@ -68,6 +91,8 @@ CREATE TABLE job_user (
     FOREIGN KEY (user_id) REFERENCES useraccount(user_id) ON DELETE CASCADE
 );
 
+CREATE INDEX job_user_user_id_idx ON job_user (user_id);
+
 CREATE TABLE job_error (
     job_id            VARCHAR(64)    PRIMARY KEY,
     error_message     VARCHAR(64)    NOT NULL,
@@ -98,6 +123,8 @@ CREATE TABLE productline (
     FOREIGN KEY (owned_by) REFERENCES useraccount(user_id) ON DELETE CASCADE
 );
 
+CREATE INDEX productline_bbox_idx ON productline USING GIST (bbox);
+
 CREATE TABLE productline_job (
     productline_id    VARCHAR(64),
     job_id            VARCHAR(64),
@@ -107,6 +134,8 @@ CREATE TABLE productline_job (
     FOREIGN KEY (job_id) REFERENCES job(job_id) ON DELETE CASCADE
 );
 
+CREATE INDEX productline_job_job_id_idx ON productline_job (job_id);
+
 CREATE VIEW provenance AS
 SELECT j.job_id,
        j.algorithm_id,
@@ -136,3 +165,39 @@ SELECT p.*,
   FROM detection d
        JOIN provenance p ON (p.job_id = d.job_id)
        LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE VIEW geoserver_lod0 AS
+SELECT p.*,
+       d.feature_id,
+       d.geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE VIEW geoserver_lod1 AS
+SELECT p.*,
+       d.feature_id,
+       COALESCE(d.geometry_lod1, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE VIEW geoserver_lod2 AS
+SELECT p.*,
+       d.feature_id,
+       COALESCE(d.geometry_lod2, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
+
+CREATE VIEW geoserver_lod3 AS
+SELECT p.*,
+       d.feature_id,
+       COALESCE(d.geometry_lod3, d.geometry) AS geometry,
+       plj.productline_id
+  FROM detection d
+       JOIN provenance p ON (p.job_id = d.job_id)
+       LEFT OUTER JOIN productline_job plj ON (plj.job_id = d.job_id);
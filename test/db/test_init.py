@@ -13,6 +13,8 @@
 
 import unittest.mock
 
+from test import helpers
+
 from beachfront import db
 
 
@@ -24,9 +26,249 @@ class GetConnectionTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
 
+class BuildIndexesTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.autocommit_conn = self.conn.execution_options.return_value
+        self.autocommit_conn.execute.return_value.scalar.return_value = None
+        self._patches = [
+            unittest.mock.patch('beachfront.db._engine'),
+            unittest.mock.patch('beachfront.db._read_sql_file', return_value='''
+                -- Test indexes
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS test_a_idx ON test_a (x);
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS test_b_idx ON test_b USING GIST (y);
+            '''),
+            unittest.mock.patch('beachfront.db.locks.try_advisory_lock', return_value=True),
+            unittest.mock.patch('beachfront.db.print_diagnostics'),
+            unittest.mock.patch('beachfront.db._normalize_detection_srids'),
+        ]
+        mocks = [p.start() for p in self._patches]
+        mocks[0].connect.return_value = self.conn
+        self.mock_try_lock = mocks[2]
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+
+    @property
+    def statements(self):
+        return [c[0][0] for c in self.autocommit_conn.execute.call_args_list if isinstance(c[0][0], str)]
+
+    def test_builds_missing_indexes_one_at_a_time(self):
+        db._build_indexes()
+        self.assertEqual([
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS test_a_idx ON test_a (x)',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS test_b_idx ON test_b USING GIST (y)',
+        ], self.statements)
+
+    def test_builds_outside_of_a_transaction(self):
+        db._build_indexes()
+        self.conn.execution_options.assert_called_once_with(isolation_level='AUTOCOMMIT')
+
+    def test_skips_valid_indexes(self):
+        self.autocommit_conn.execute.return_value.scalar.return_value = True
+        db._build_indexes()
+        self.assertEqual([], self.statements)
+
+    def test_rebuilds_invalid_indexes(self):
+        self.autocommit_conn.execute.return_value.scalar.side_effect = [False, True]
+        db._build_indexes()
+        self.assertEqual([
+            'DROP INDEX CONCURRENTLY IF EXISTS test_a_idx',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS test_a_idx ON test_a (x)',
+        ], self.statements)
+
+    def test_leaves_building_to_the_process_holding_the_lock(self):
+        self.mock_try_lock.return_value = False
+        db._build_indexes()
+        self.assertEqual({'key': db.INDEX_LOCK_KEY}, self.mock_try_lock.call_args[1])
+        self.assertFalse(self.conn.execution_options.called)
+        self.assertTrue(self.conn.close.called)
+
+    def test_keeps_session_out_of_the_pool(self):
+        db._build_indexes()
+        self.assertTrue(self.conn.detach.called)
+        self.assertTrue(self.autocommit_conn.close.called)
+
+    def test_stops_at_failed_build(self):
+        self.autocommit_conn.execute.side_effect = helpers.create_database_error()
+        db._build_indexes()
+        self.assertEqual(1, self.autocommit_conn.execute.call_count)
+        self.assertTrue(self.autocommit_conn.close.called)
+
+
+class NormalizeDetectionSridsTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.is_valid = False
+        self.batches = [{'job_id': 'test-job-id', 'feature_id': 10000}, None]
+        self.conn.execute.side_effect = self.execute
+
+    def execute(self, query, **params):
+        result = unittest.mock.Mock()
+        if 'convalidated' in str(query):
+            result.scalar.return_value = self.is_valid
+        elif 'WITH batch' in str(query):
+            result.fetchone.return_value = self.batches.pop(0)
+        return result
+
+    @property
+    def batch_params(self):
+        return [c[1] for c in self.conn.execute.call_args_list if 'WITH batch' in str(c[0][0])]
+
+    def test_updates_in_batches_then_validates_constraint(self):
+        db._normalize_detection_srids(self.conn)
+        self.assertEqual([
+            {'after_job_id': None, 'after_feature_id': None, 'batch_size': db.BACKFILL_BATCH_SIZE},
+            {'after_job_id': 'test-job-id', 'after_feature_id': 10000, 'batch_size': db.BACKFILL_BATCH_SIZE},
+        ], self.batch_params)
+        self.assertEqual('ALTER TABLE detection VALIDATE CONSTRAINT detection_geometry_srid_check',
+                         self.conn.execute.call_args[0][0])
+
+    def test_does_nothing_once_constraint_is_valid(self):
+        self.is_valid = True
+        db._normalize_detection_srids(self.conn)
+        self.assertEqual(1, self.conn.execute.call_count)
+
+    def test_does_nothing_without_constraint(self):
+        self.is_valid = None
+        db._normalize_detection_srids(self.conn)
+        self.assertEqual(1, self.conn.execute.call_count)
+
+    def test_runs_after_building_indexes(self):
+        with unittest.mock.patch('beachfront.db._engine') as mock_engine, \
+                unittest.mock.patch('beachfront.db._read_sql_file', return_value=''), \
+                unittest.mock.patch('beachfront.db.locks.try_advisory_lock', return_value=True), \
+                unittest.mock.patch('beachfront.db._normalize_detection_srids') as mock_normalize:
+            db._build_indexes()
+        mock_normalize.assert_called_once_with(mock_engine.connect.return_value.execution_options.return_value)
+
+
 class InstallTest(unittest.TestCase):
     def setUp(self):
         self.conn = unittest.mock.Mock()
 
     def test_does_things(self):
         self.skipTest('Not yet implemented')
+
+
+class ListMigrationsTest(unittest.TestCase):
+    def test_lists_migrations_in_order(self):
+        migrations = db._list_migrations()
+        self.assertEqual((1, '0001_index_hot_queries.sql'), migrations[0])
+        self.assertEqual(sorted(migrations), migrations)
+
+    def test_throws_on_duplicate_versions(self):
+        with unittest.mock.patch('os.listdir', return_value=['0001_a.sql', '01_b.sql']):
+            with self.assertRaises(db.MigrationError):
+                db._list_migrations()
+
+    def test_ignores_other_files(self):
+        with unittest.mock.patch('os.listdir', return_value=['0002_b.sql', 'README.md', '0001_a.sql']):
+            self.assertEqual([(1, '0001_a.sql'), (2, '0002_b.sql')], db._list_migrations())
+
+
+class ReadIndexStatementsTest(unittest.TestCase):
+    def test_reads_shipped_indexes(self):
+        names = [name for name, _ in db._read_index_statements()]
+        self.assertIn('detection_geometry_idx', names)
+
+    def test_throws_on_statements_that_would_block_writes(self):
+        with unittest.mock.patch('beachfront.db._read_sql_file', return_value='CREATE INDEX test_idx ON test (x);'):
+            with self.assertRaises(db.MigrationError):
+                db._read_index_statements()
+
+
+class MigrateTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.conn.execute.return_value.scalar.return_value = 1
+        self.transaction = self.conn.begin.return_value
+        self._patches = [
+            unittest.mock.patch('beachfront.db._list_migrations', return_value=[
+                (1, '0001_test.sql'),
+                (2, '0002_test.sql'),
+                (3, '0003_test.sql'),
+            ]),
+            unittest.mock.patch('beachfront.db._read_sql_file', side_effect=lambda name: '-- {}'.format(name)),
+            unittest.mock.patch('beachfront.db.print_diagnostics'),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+
+    def test_creates_version_table(self):
+        db._migrate(self.conn)
+        query = self.conn.execution_options.return_value.execute.call_args[0][0]
+        self.assertIn('CREATE TABLE IF NOT EXISTS schema_version', query)
+
+    def test_applies_only_newer_migrations_in_order(self):
+        db._migrate(self.conn)
+        applied = [str(c[0][0]) for c in self.conn.execute.call_args_list if str(c[0][0]).startswith('--')]
+        self.assertEqual(['-- migrations/0002_test.sql', '-- migrations/0003_test.sql'], applied)
+
+    def test_records_each_migration(self):
+        db._migrate(self.conn)
+        recorded = [c[1] for c in self.conn.execute.call_args_list if 'INSERT INTO schema_version' in str(c[0][0])]
+        self.assertEqual([
+            {'version': 2, 'filename': '0002_test.sql'},
+            {'version': 3, 'filename': '0003_test.sql'},
+        ], recorded)
+
+    def test_commits_each_migration_separately(self):
+        db._migrate(self.conn)
+        self.assertEqual(2, self.conn.begin.call_count)
+        self.assertEqual(2, self.transaction.commit.call_count)
+
+    def test_does_nothing_when_up_to_date(self):
+        self.conn.execute.return_value.scalar.return_value = 3
+        db._migrate(self.conn)
+        self.assertFalse(self.conn.begin.called)
+
+    def test_stops_at_failed_migration(self):
+        def execute(query, *_, **__):
+            if str(query).startswith('-- migrations/0002'):
+                raise helpers.create_database_error()
+            return unittest.mock.DEFAULT
+
+        self.conn.execute.side_effect = execute
+        with self.assertRaises(db.MigrationError):
+            db._migrate(self.conn)
+        self.assertTrue(self.transaction.rollback.called)
+        self.assertEqual(1, self.conn.begin.call_count)
+
+
+class UpgradeSchemaTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self._patches = [
+            unittest.mock.patch('beachfront.db._engine'),
+            unittest.mock.patch('beachfront.db._install_if_needed'),
+            unittest.mock.patch('beachfront.db._migrate'),
+            unittest.mock.patch('beachfront.db.locks.advisory_lock'),
+            unittest.mock.patch('beachfront.db.locks.advisory_unlock'),
+        ]
+        mocks = [p.start() for p in self._patches]
+        mocks[0].connect.return_value = self.conn
+        self.mock_install, self.mock_migrate, self.mock_lock, self.mock_unlock = mocks[1:]
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+
+    def test_installs_then_migrates_under_lock(self):
+        db._upgrade_schema()
+        self.assertEqual({'key': db.SCHEMA_LOCK_KEY}, self.mock_lock.call_args[1])
+        self.assertTrue(self.mock_install.called)
+        self.mock_migrate.assert_called_once_with(self.conn)
+        self.assertTrue(self.mock_unlock.called)
+
+    def test_releases_lock_on_failure(self):
+        self.mock_migrate.side_effect = db.MigrationError('test-error')
+        with self.assertRaises(db.MigrationError):
+            db._upgrade_schema()
+        self.assertTrue(self.mock_unlock.called)
+        self.assertTrue(self.conn.close.called)
@@ -11,9 +11,13 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import json
 import unittest.mock
+from datetime import datetime, timedelta
 
-from beachfront.db import jobs as jobsdb
+import psycopg2
+
+from beachfront.db import DatabaseError, jobs as jobsdb
 
 
 class DeleteJobUserTest(unittest.TestCase):
@@ -44,18 +48,342 @@ class ExistsTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
 
-class InsertDetectionTest(unittest.TestCase):
+class ClaimOutstandingJobsTest(unittest.TestCase):
     def setUp(self):
         self.conn = unittest.mock.Mock()
+        self.execute = self.conn.execution_options.return_value.execute
 
-    def test_sends_correct_query(self):
-        self.skipTest('Not yet implemented')
+    def claim(self):
+        return jobsdb.claim_outstanding_jobs(self.conn, worker_id='test-worker-id', lease=timedelta(minutes=10), limit=50)
+
+    def test_skips_rows_claimed_concurrently(self):
+        self.claim()
+        self.assertIn('FOR UPDATE SKIP LOCKED', self.execute.call_args[0][0])
+
+    def test_only_claims_jobs_whose_lease_has_expired(self):
+        self.claim()
+        self.assertIn('lease_expires_on IS NULL OR lease_expires_on <= NOW()', self.execute.call_args[0][0])
+
+    def test_returns_time_since_status_changed(self):
+        self.claim()
+        self.assertIn('NOW() - j.updated_on) AS status_age', self.execute.call_args[0][0])
 
     def test_sends_correct_parameters(self):
-        self.skipTest('Not yet implemented')
+        self.claim()
+        self.assertEqual({
+            'worker_id': 'test-worker-id',
+            'lease': timedelta(minutes=10),
+            'limit': 50,
+        }, self.execute.call_args[0][1])
+
+    def test_commits_claim_immediately(self):
+        self.claim()
+        self.conn.execution_options.assert_called_once_with(autocommit=True)
 
     def test_throws_when_connection_throws(self):
-        self.skipTest('Not yet implemented')
+        self.execute.side_effect = DatabaseError('test-query', None, Exception('test-error'))
+        with self.assertRaises(DatabaseError):
+            self.claim()
+
+
+class ClaimIngestionTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.execute = self.conn.execution_options.return_value.execute
+        self.execute.return_value.rowcount = 1
+
+    def claim(self):
+        return jobsdb.claim_ingestion(self.conn, job_id='test-job-id', worker_id='test-worker-id',
+                                      lease=timedelta(minutes=10))
+
+    def test_only_claims_outstanding_jobs(self):
+        self.claim()
+        self.assertIn('status = ANY(%(statuses)s)', self.execute.call_args[0][0])
+        self.assertEqual(['Submitted', 'Pending', 'Running'], self.execute.call_args[0][1]['statuses'])
+
+    def test_does_not_take_live_claims_from_other_workers(self):
+        self.claim()
+        self.assertIn('claimed_by = %(worker_id)s OR lease_expires_on IS NULL OR lease_expires_on <= NOW()',
+                      self.execute.call_args[0][0])
+
+    def test_commits_claim_immediately(self):
+        self.claim()
+        self.conn.execution_options.assert_called_once_with(autocommit=True)
+
+    def test_returns_true_when_claimed(self):
+        self.assertTrue(self.claim())
+
+    def test_returns_false_when_not_claimed(self):
+        self.execute.return_value.rowcount = 0
+        self.assertFalse(self.claim())
+
+
+class RenewClaimsTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_only_renews_own_claims(self):
+        jobsdb.renew_claims(self.conn, worker_id='test-worker-id', leases={'test-job-id': timedelta(seconds=60)})
+        self.assertIn('claimed_by = %(worker_id)s', self.conn.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        jobsdb.renew_claims(self.conn, worker_id='test-worker-id', leases={'test-job-id': timedelta(seconds=60)})
+        self.assertEqual({
+            'worker_id': 'test-worker-id',
+            'job_ids': ['test-job-id'],
+            'leases': [timedelta(seconds=60)],
+        }, self.conn.execute.call_args[0][1])
+
+
+class SelectClaimLeasesTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_only_selects_own_claims_on_outstanding_jobs(self):
+        jobsdb.select_claim_leases(self.conn, worker_id='test-worker-id', job_ids=['test-job-id'])
+        query = self.conn.execute.call_args[0][0]
+        self.assertIn('claimed_by = %(worker_id)s', query)
+        self.assertIn('status = ANY(%(statuses)s)', query)
+
+    def test_sends_correct_parameters(self):
+        jobsdb.select_claim_leases(self.conn, worker_id='test-worker-id', job_ids=['test-job-id'])
+        self.assertEqual({
+            'worker_id': 'test-worker-id',
+            'job_ids': ['test-job-id'],
+            'statuses': ['Submitted', 'Pending', 'Running'],
+        }, self.conn.execute.call_args[0][1])
+
+
+class CopyDetectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.cursor = self.conn.connection.cursor.return_value
+        self.copied = []
+        self.cursor.copy_expert.side_effect = lambda _, fp: self.copied.append(fp.read())
+
+    def test_sends_correct_query(self):
+        jobsdb.copy_detections(self.conn, job_id='test-job-id', features=[create_feature()])
+        self.assertEqual('COPY detection (job_id, feature_id, geometry) FROM STDIN',
+                         self.cursor.copy_expert.call_args[0][0].strip())
+
+    def test_sends_correct_rows(self):
+        jobsdb.copy_detections(self.conn, job_id='test-job-id', features=[create_feature(0), create_feature(1)])
+        self.assertEqual(['test-job-id\t1\tSRID=4326;LINESTRING (0 0,1 1)\n'
+                          'test-job-id\t2\tSRID=4326;LINESTRING (1 1,2 2)\n'], self.copied)
+
+    def test_flushes_in_batches(self):
+        count = jobsdb.copy_detections(self.conn, job_id='test-job-id',
+                                       features=(create_feature(i) for i in range(5)), batch_size=2)
+        self.assertEqual(5, count)
+        self.assertEqual([2, 2, 1], [len(s.splitlines()) for s in self.copied])
+
+    def test_skips_features_without_geometry(self):
+        count = jobsdb.copy_detections(self.conn, job_id='test-job-id',
+                                       features=[{'geometry': None}, create_feature()])
+        self.assertEqual(1, count)
+        self.assertEqual(['test-job-id\t1\tSRID=4326;LINESTRING (0 0,1 1)\n'], self.copied)
+
+    def test_throws_on_features_that_are_not_objects(self):
+        with self.assertRaises(ValueError):
+            jobsdb.copy_detections(self.conn, job_id='test-job-id', features=[create_feature(), 'lolwut'])
+        self.assertTrue(self.cursor.close.called)
+
+    def test_throws_on_malformed_geometry(self):
+        with self.assertRaises(ValueError):
+            jobsdb.copy_detections(self.conn, job_id='test-job-id',
+                                   features=[{'geometry': {'type': 'LineString', 'coordinates': [1, 2]}}])
+
+    def test_does_not_copy_when_there_are_no_features(self):
+        jobsdb.copy_detections(self.conn, job_id='test-job-id', features=[])
+        self.assertFalse(self.cursor.copy_expert.called)
+
+    def test_closes_cursor(self):
+        jobsdb.copy_detections(self.conn, job_id='test-job-id', features=[create_feature()])
+        self.assertTrue(self.cursor.close.called)
+
+    def test_throws_when_connection_throws(self):
+        self.cursor.copy_expert.side_effect = psycopg2.Error('test-error')
+        with self.assertRaises(DatabaseError):
+            jobsdb.copy_detections(self.conn, job_id='test-job-id', features=[create_feature()])
+        self.assertTrue(self.cursor.close.called)
+
+
+class InsertDetectionTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.cursor = self.conn.connection.cursor.return_value
+
+    def test_parses_feature_collection(self):
+        count = jobsdb.insert_detection(self.conn, job_id='test-job-id', feature_collection=json.dumps({
+            'type': 'FeatureCollection',
+            'features': [create_feature(0), create_feature(1), create_feature(2)],
+        }))
+        self.assertEqual(3, count)
+
+    def test_parses_streamed_feature_collection(self):
+        data = json.dumps({
+            'type': 'FeatureCollection',
+            'features': [create_feature(0), create_feature(1), create_feature(2)],
+        }).encode()
+        count = jobsdb.insert_detection(self.conn, job_id='test-job-id',
+                                        feature_collection=(data[i:i + 16] for i in range(0, len(data), 16)))
+        self.assertEqual(3, count)
+
+    def test_stages_features_in_temporary_table(self):
+        jobsdb.insert_detection(self.conn, job_id='test-job-id', feature_collection=json.dumps({
+            'type': 'FeatureCollection',
+            'features': [create_feature(0)],
+        }))
+        self.assertIn('CREATE TEMPORARY TABLE detection_staging', self.conn.execute.call_args_list[0][0][0])
+        self.assertEqual('COPY detection_staging (job_id, feature_id, geometry) FROM STDIN',
+                         self.cursor.copy_expert.call_args[0][0].strip())
+        self.assertEqual('DROP TABLE detection_staging', self.conn.execute.call_args_list[-1][0][0].strip())
+
+    def test_computes_simplified_tiers_while_inserting(self):
+        jobsdb.insert_detection(self.conn, job_id='test-job-id', feature_collection=json.dumps({
+            'type': 'FeatureCollection',
+            'features': [create_feature(0)],
+        }))
+        query, params = self.conn.execute.call_args_list[1][0]
+        self.assertIn('INSERT INTO detection (job_id, feature_id, geometry, geometry_lod1, geometry_lod2, geometry_lod3)',
+                      query)
+        self.assertIn('ST_SimplifyPreserveTopology(s.geometry, %(tolerance_3)s)', query)
+        self.assertIn('FROM detection_staging s', query)
+        self.assertEqual(jobsdb.DETECTION_LOD_TOLERANCES,
+                         (params['tolerance_1'], params['tolerance_2'], params['tolerance_3']))
+        self.assertNotIn('UPDATE', ''.join(c[0][0] for c in self.conn.execute.call_args_list))
+
+    def test_commits_staging_and_insert_together(self):
+        jobsdb.insert_detection(self.conn, job_id='test-job-id', feature_collection=json.dumps({
+            'type': 'FeatureCollection',
+            'features': [create_feature(0)],
+        }))
+        self.assertTrue(self.conn.begin.return_value.commit.called)
+        self.assertFalse(self.conn.begin.return_value.rollback.called)
+
+    def test_rolls_back_when_copy_fails(self):
+        self.cursor.copy_expert.side_effect = psycopg2.Error('test-error')
+        with self.assertRaises(DatabaseError):
+            jobsdb.insert_detection(self.conn, job_id='test-job-id', feature_collection=json.dumps({
+                'type': 'FeatureCollection',
+                'features': [create_feature(0)],
+            }))
+        self.assertTrue(self.conn.begin.return_value.rollback.called)
+        self.assertFalse(self.conn.begin.return_value.commit.called)
+
+    def test_throws_on_malformed_feature_collection(self):
+        with self.assertRaises(ValueError):
+            jobsdb.insert_detection(self.conn, job_id='test-job-id', feature_collection='lorem ipsum')
+
+
+class ListenForStatusChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_listens_on_status_channel(self):
+        jobsdb.listen_for_status_changes(self.conn)
+        self.assertEqual('LISTEN {}'.format(jobsdb.STATUS_CHANNEL), self.conn.execute.call_args[0][0])
+
+
+class LodForResolutionTest(unittest.TestCase):
+    def test_uses_full_geometry_at_fine_resolutions(self):
+        self.assertEqual(0, jobsdb.lod_for_resolution(0.00005))
+
+    def test_uses_coarsest_tier_within_resolution(self):
+        self.assertEqual(1, jobsdb.lod_for_resolution(0.0005))
+        self.assertEqual(2, jobsdb.lod_for_resolution(0.001))
+        self.assertEqual(3, jobsdb.lod_for_resolution(1))
+
+
+class SelectDetectionFeaturesTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_selects_full_geometry_by_default(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id')
+        query = self.conn.execution_options.return_value.execute.call_args[0][0]
+        self.assertIn('ST_AsGeoJSON(d.geometry)', query)
+
+    def test_selects_simplified_geometry_tier(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id', lod=2)
+        query = self.conn.execution_options.return_value.execute.call_args[0][0]
+        self.assertIn('ST_AsGeoJSON(COALESCE(d.geometry_lod2, d.geometry))', query)
+
+    def test_throws_on_unknown_geometry_tier(self):
+        with self.assertRaises(ValueError):
+            jobsdb.select_detection_features(self.conn, job_id='test-job-id', lod=4)
+
+    def test_uses_server_side_cursor(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id')
+        self.assertEqual({'stream_results': True}, self.conn.execution_options.call_args[1])
+
+    def test_sends_correct_parameters(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id', bbox=(-10, -5, 10, 5), after=42, limit=100)
+        self.assertEqual({
+            'job_id': 'test-job-id',
+            'xmin': -10,
+            'ymin': -5,
+            'xmax': 10,
+            'ymax': 5,
+            'after': 42,
+            'limit': 100,
+        }, self.conn.execution_options.return_value.execute.call_args[0][1])
+
+    def test_selects_every_detection_by_default(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id')
+        params = self.conn.execution_options.return_value.execute.call_args[0][1]
+        self.assertEqual({'test-job-id'}, {v for v in params.values() if v is not None})
+
+    def test_includes_all_properties_by_default(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id')
+        query = self.conn.execution_options.return_value.execute.call_args[0][0]
+        self.assertIn("'properties', to_json(p)", query)
+
+    def test_projects_properties(self):
+        jobsdb.select_detection_features(self.conn, job_id='test-job-id', properties=['name', 'tide'])
+        query = self.conn.execution_options.return_value.execute.call_args[0][0]
+        self.assertIn("'properties', json_build_object('name', p.name, 'tide', p.tide)", query)
+
+    def test_throws_on_unknown_property(self):
+        with self.assertRaises(ValueError):
+            jobsdb.select_detection_features(self.conn, job_id='test-job-id', properties=['1; DROP TABLE job'])
+
+
+class SelectDetectionTileTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_sends_correct_parameters(self):
+        jobsdb.select_detection_tile(self.conn, bounds=(0, 1, 2, 3), extent=4096, buffer=64, layer_name='test-layer',
+                                     productline_id='test-productline-id')
+        self.assertEqual({
+            'xmin': 0,
+            'ymin': 1,
+            'xmax': 2,
+            'ymax': 3,
+            'margin': 0.03125,
+            'extent': 4096,
+            'buffer': 64,
+            'layer_name': 'test-layer',
+            'job_id': None,
+            'productline_id': 'test-productline-id',
+            'scene_id': None,
+        }, self.conn.execute.call_args[0][1])
+
+    def test_filters_by_buffered_bounds(self):
+        jobsdb.select_detection_tile(self.conn, bounds=(0, 1, 2, 3), extent=4096, buffer=64, layer_name='test-layer')
+        self.assertIn('&& ST_Transform(ST_Expand(b.geometry, %(margin)s), 4326)', self.conn.execute.call_args[0][0])
+
+    def test_selects_simplified_geometry_tier(self):
+        jobsdb.select_detection_tile(self.conn, bounds=(0, 1, 2, 3), extent=4096, buffer=64, layer_name='test-layer',
+                                     lod=3)
+        self.assertIn('COALESCE(d.geometry_lod3, d.geometry)', self.conn.execute.call_args[0][0])
+
+    def test_encodes_tile_in_database(self):
+        jobsdb.select_detection_tile(self.conn, bounds=(0, 1, 2, 3), extent=4096, buffer=64, layer_name='test-layer')
+        query = self.conn.execute.call_args[0][0]
+        self.assertIn('ST_AsMVTGeom', query)
+        self.assertIn('ST_AsMVT(', query)
 
 
 class InsertJobTest(unittest.TestCase):
@@ -100,6 +428,40 @@ class InsertJobUserTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
 
+class SelectFingerprintForUserTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_sends_correct_parameters(self):
+        jobsdb.select_fingerprint_for_user(self.conn, user_id='test-user-id')
+        self.assertEqual({'user_id': 'test-user-id'}, self.conn.execute.call_args[0][1])
+
+    def test_does_not_serialize_geometries(self):
+        jobsdb.select_fingerprint_for_user(self.conn, user_id='test-user-id')
+        self.assertNotIn('ST_AsGeoJSON', self.conn.execute.call_args[0][0])
+
+
+class SelectJobStatusTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_sends_correct_parameters(self):
+        jobsdb.select_job_status(self.conn, job_id='test-job-id')
+        self.assertEqual({'job_id': 'test-job-id'}, self.conn.execute.call_args[0][1])
+
+
+class SelectJobUsersTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_sends_correct_parameters(self):
+        jobsdb.select_job_users(self.conn, job_ids={'test-job-id'}, user_ids=['test-user-id'])
+        self.assertEqual({
+            'job_ids': ['test-job-id'],
+            'user_ids': ['test-user-id'],
+        }, self.conn.execute.call_args[0][1])
+
+
 class SelectJobTest(unittest.TestCase):
     def setUp(self):
         self.conn = unittest.mock.Mock()
@@ -164,7 +526,48 @@ class SelectJobsForUserTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
     def test_sends_correct_parameters(self):
-        self.skipTest('Not yet implemented')
+        jobsdb.select_jobs_for_user(self.conn, user_id='test-user-id')
+        self.assertEqual({
+            'user_id': 'test-user-id',
+            'changed_since': None,
+            'statuses': None,
+            'after_created_on': None,
+            'after_job_id': None,
+            'limit': None,
+        }, self.conn.execute.call_args[0][1])
+
+    def test_can_select_only_changed_jobs(self):
+        since = datetime.utcnow()
+        jobsdb.select_jobs_for_user(self.conn, user_id='test-user-id', changed_since=since)
+        self.assertEqual(since, self.conn.execute.call_args[0][1]['changed_since'])
+        self.assertIn('j.updated_on > %(changed_since)s', self.conn.execute.call_args[0][0])
+
+    def test_can_filter_by_status(self):
+        jobsdb.select_jobs_for_user(self.conn, user_id='test-user-id', statuses=('Running', 'Pending'))
+        self.assertEqual(['Running', 'Pending'], self.conn.execute.call_args[0][1]['statuses'])
+        self.assertIn('j.status = ANY(%(statuses)s)', self.conn.execute.call_args[0][0])
+
+    def test_can_select_page_after_a_job(self):
+        created_on = datetime.utcnow()
+        jobsdb.select_jobs_for_user(self.conn, user_id='test-user-id', after=(created_on, 'test-job-id'), limit=10)
+        query, params = self.conn.execute.call_args[0]
+        self.assertIn('(j.created_on, j.job_id) > (%(after_created_on)s, %(after_job_id)s)', query)
+        self.assertIn('ORDER BY j.created_on ASC, j.job_id ASC', query)
+        self.assertIn('LIMIT %(limit)s', query)
+        self.assertEqual(created_on, params['after_created_on'])
+        self.assertEqual('test-job-id', params['after_job_id'])
+        self.assertEqual(10, params['limit'])
+
+    def test_selects_every_job_by_default(self):
+        jobsdb.select_jobs_for_user(self.conn, user_id='test-user-id')
+        query = self.conn.execute.call_args[0][0]
+        self.assertNotIn('LIMIT', query)
+        self.assertNotIn('j.status = ANY', query)
+        self.assertIn('ST_AsGeoJSON(s.geometry)', query)
+
+    def test_can_leave_out_geometries(self):
+        jobsdb.select_jobs_for_user(self.conn, user_id='test-user-id', include_geometry=False)
+        self.assertNotIn('ST_AsGeoJSON', self.conn.execute.call_args[0][0])
 
     def test_throws_when_connection_throws(self):
         self.skipTest('Not yet implemented')
@@ -188,6 +591,29 @@ class UpdateStatusTest(unittest.TestCase):
     def setUp(self):
         self.conn = unittest.mock.Mock()
 
+    def test_stamps_row_with_time_of_statement(self):
+        jobsdb.update_status(self.conn, job_id='test-job-id', status='Running')
+        self.assertIn('updated_on = clock_timestamp()', self.conn.execute.call_args[0][0])
+        self.assertNotIn('CURRENT_TIMESTAMP', self.conn.execute.call_args[0][0])
+
+    def test_can_guard_on_current_status(self):
+        jobsdb.update_status(self.conn, job_id='test-job-id', status='Success', from_statuses=('Running',))
+        query, params = self.conn.execute.call_args[0]
+        self.assertIn('status = ANY(%(from_statuses)s)', query)
+        self.assertEqual(['Running'], params['from_statuses'])
+
+    def test_updates_regardless_of_current_status_by_default(self):
+        jobsdb.update_status(self.conn, job_id='test-job-id', status='Success')
+        self.assertIsNone(self.conn.execute.call_args[0][1]['from_statuses'])
+
+    def test_returns_number_of_jobs_updated(self):
+        self.conn.execute.return_value.rowcount = 0
+        self.assertEqual(0, jobsdb.update_status(self.conn, job_id='test-job-id', status='Success'))
+
+    def test_announces_change(self):
+        jobsdb.update_status(self.conn, job_id='test-job-id', status='Running')
+        self.assertIn("pg_notify('{}'".format(jobsdb.STATUS_CHANNEL), self.conn.execute.call_args[0][0])
+
     def test_sends_correct_query(self):
         self.skipTest('Not yet implemented')
 
@@ -196,3 +622,58 @@ class UpdateStatusTest(unittest.TestCase):
 
     def test_throws_when_connection_throws(self):
         self.skipTest('Not yet implemented')
+
+
+class UpdateStatusesTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_updates_all_rows_in_one_statement(self):
+        jobsdb.update_statuses(self.conn, statuses={'test-job-1': 'Running', 'test-job-2': 'Error'})
+        self.assertEqual(1, self.conn.execute.call_count)
+        self.assertIn('FROM (VALUES (%(job_id_0)s, %(status_0)s), (%(job_id_1)s, %(status_1)s))',
+                      self.conn.execute.call_args[0][0])
+
+    def test_skips_rows_whose_status_is_unchanged(self):
+        jobsdb.update_statuses(self.conn, statuses={'test-job-id': 'Running'})
+        self.assertIn('j.status IS DISTINCT FROM v.status', self.conn.execute.call_args[0][0])
+
+    def test_stamps_changed_rows_with_time_of_statement(self):
+        jobsdb.update_statuses(self.conn, statuses={'test-job-id': 'Running'})
+        self.assertIn('updated_on = clock_timestamp()', self.conn.execute.call_args[0][0])
+
+    def test_announces_changed_rows(self):
+        jobsdb.update_statuses(self.conn, statuses={'test-job-id': 'Running'})
+        self.assertIn("pg_notify('{}'".format(jobsdb.STATUS_CHANNEL), self.conn.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        jobsdb.update_statuses(self.conn, statuses={'test-job-2': 'Error', 'test-job-1': 'Running'})
+        self.assertEqual({
+            'job_id_0': 'test-job-1',
+            'status_0': 'Running',
+            'job_id_1': 'test-job-2',
+            'status_1': 'Error',
+        }, self.conn.execute.call_args[0][1])
+
+    def test_returns_number_of_rows_updated(self):
+        self.conn.execute.return_value.rowcount = 1
+        self.assertEqual(1, jobsdb.update_statuses(self.conn, statuses={'test-job-id': 'Running'}))
+
+    def test_does_nothing_without_statuses(self):
+        self.assertEqual(0, jobsdb.update_statuses(self.conn, statuses={}))
+        self.assertFalse(self.conn.execute.called)
+
+
+#
+# Helpers
+#
+
+def create_feature(offset: int = 0):
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'LineString',
+            'coordinates': [[offset, offset], [offset + 1, offset + 1]],
+        },
+        'properties': {},
+    }
@@ -0,0 +1,85 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import unittest
+import unittest.mock
+
+from beachfront.db import locks as locksdb
+
+
+class AdvisoryLockTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.execute = self.conn.execution_options.return_value.execute
+
+    def test_waits_for_lock(self):
+        locksdb.advisory_lock(self.conn, key=1)
+        self.assertIn('pg_advisory_lock(%(namespace)s, %(key)s)', self.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        locksdb.advisory_lock(self.conn, key=1)
+        self.assertEqual({'namespace': locksdb.LOCK_NAMESPACE, 'key': 1}, self.execute.call_args[0][1])
+
+    def test_runs_outside_of_a_transaction(self):
+        locksdb.advisory_lock(self.conn, key=1)
+        self.conn.execution_options.assert_called_once_with(autocommit=True)
+
+
+class TryAdvisoryLockTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.execute = self.conn.execution_options.return_value.execute
+
+    def test_sends_correct_query(self):
+        locksdb.try_advisory_lock(self.conn, key=1)
+        self.assertIn('pg_try_advisory_lock(%(namespace)s, %(key)s)', self.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        locksdb.try_advisory_lock(self.conn, key=1)
+        self.assertEqual({'namespace': locksdb.LOCK_NAMESPACE, 'key': 1}, self.execute.call_args[0][1])
+
+    def test_runs_outside_of_a_transaction(self):
+        locksdb.try_advisory_lock(self.conn, key=1)
+        self.conn.execution_options.assert_called_once_with(autocommit=True)
+
+    def test_returns_whether_lock_was_acquired(self):
+        self.execute.return_value.scalar.return_value = False
+        self.assertFalse(locksdb.try_advisory_lock(self.conn, key=1))
+
+
+class HoldsAdvisoryLockTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.execute = self.conn.execution_options.return_value.execute
+
+    def test_only_considers_locks_held_by_this_session(self):
+        locksdb.holds_advisory_lock(self.conn, key=1)
+        self.assertIn('pid = pg_backend_pid()', self.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        locksdb.holds_advisory_lock(self.conn, key=1)
+        self.assertEqual({'namespace': locksdb.LOCK_NAMESPACE, 'key': 1}, self.execute.call_args[0][1])
+
+
+class AdvisoryUnlockTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+        self.execute = self.conn.execution_options.return_value.execute
+
+    def test_sends_correct_query(self):
+        locksdb.advisory_unlock(self.conn, key=1)
+        self.assertIn('pg_advisory_unlock(%(namespace)s, %(key)s)', self.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        locksdb.advisory_unlock(self.conn, key=1)
+        self.assertEqual({'namespace': locksdb.LOCK_NAMESPACE, 'key': 1}, self.execute.call_args[0][1])
@@ -56,3 +56,28 @@ class InsertOrUpdateUserTest(unittest.TestCase):
 
     def test_throws_when_connection_throws(self):
         self.skipTest('Not yet implemented')
+
+
+class ListenForApiKeyRotationsTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_listens_on_api_key_channel(self):
+        usersdb.listen_for_api_key_rotations(self.conn)
+        self.assertEqual('LISTEN {}'.format(usersdb.API_KEY_CHANNEL), self.conn.execute.call_args[0][0])
+
+
+class NotifyApiKeyRotatedTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = unittest.mock.Mock()
+
+    def test_announces_on_api_key_channel(self):
+        usersdb.notify_api_key_rotated(self.conn, user_id='test-user-id')
+        self.assertIn('pg_notify(%(channel)s, %(user_id)s)', self.conn.execute.call_args[0][0])
+
+    def test_sends_correct_parameters(self):
+        usersdb.notify_api_key_rotated(self.conn, user_id='test-user-id')
+        self.assertEqual({
+            'channel': usersdb.API_KEY_CHANNEL,
+            'user_id': 'test-user-id',
+        }, self.conn.execute.call_args[0][1])
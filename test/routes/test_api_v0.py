@@ -12,8 +12,15 @@
 # specific language governing permissions and limitations under the License.
 
 import unittest
+from datetime import datetime
+
+import dateutil.tz
+import flask
+
+from test import helpers
 
 from beachfront.routes import api_v0 as routes
+from beachfront.services import events, jobs, tiles, users
 
 
 class GetAlgorithmTest(unittest.TestCase):
@@ -31,14 +38,159 @@ class CreateJobTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
 
+class DownloadGeojsonTest(helpers.MockableTestCase):
+    def setUp(self):
+        self.mock_get_fingerprint = self.create_mock('beachfront.services.jobs.get_detections_fingerprint',
+                                                     return_value='test-fingerprint')
+        self.mock_get_stream = self.create_mock('beachfront.services.jobs.get_detections_stream',
+                                                return_value=iter(['{"type":"FeatureCollection","features":[]}']))
+        self.client = create_client()
+
+    def test_sets_etag_and_cache_control(self):
+        response = self.client.get('/job/test-job-id.geojson')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+        self.assertEqual('private, no-cache', response.headers['Cache-Control'])
+
+    def test_returns_304_when_etag_matches(self):
+        etag = self.client.get('/job/test-job-id.geojson').headers['ETag']
+
+        response = self.client.get('/job/test-job-id.geojson', headers={'If-None-Match': etag})
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response.headers['ETag'])
+        self.assertEqual(1, self.mock_get_stream.call_count)
+
+    def test_etag_varies_with_query(self):
+        etags = {self.client.get('/job/test-job-id.geojson' + query).headers['ETag'] for query in (
+            '',
+            '?resolution=10',
+            '?bbox=0,0,1,1',
+            '?cursor=100',
+            '?limit=100',
+            '?properties=area',
+        )}
+
+        self.assertEqual(6, len(etags))
+
+    def test_does_not_revalidate_unfinished_jobs(self):
+        self.mock_get_fingerprint.return_value = None
+
+        response = self.client.get('/job/test-job-id.geojson')
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('ETag', response.headers)
+        self.assertNotIn('Cache-Control', response.headers)
+
+
 class ForgetJobTest(unittest.TestCase):
     def test_does_things(self):
         self.skipTest('Not yet implemented')
 
 
-class ListJobsTest(unittest.TestCase):
-    def test_does_things(self):
-        self.skipTest('Not yet implemented')
+class ListJobsTest(helpers.MockableTestCase):
+    def setUp(self):
+        self.mock_get_fingerprint = self.create_mock('beachfront.services.jobs.get_all_fingerprint',
+                                                     return_value='test-fingerprint')
+        self.mock_get_all = self.create_mock('beachfront.services.jobs.get_all', return_value=[])
+        self.create_mock('beachfront.services.jobs.get_changes_cursor', return_value=datetime(2017, 1, 2, 3, 4, 5))
+        self.client = create_client()
+
+    def test_sets_etag_and_cache_control(self):
+        response = self.client.get('/job')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+        self.assertEqual('private, no-cache', response.headers['Cache-Control'])
+
+    def test_returns_304_when_etag_matches(self):
+        etag = self.client.get('/job').headers['ETag']
+
+        response = self.client.get('/job', headers={'If-None-Match': etag})
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response.headers['ETag'])
+        self.assertEqual(1, self.mock_get_all.call_count)
+
+    def test_does_not_revalidate_deltas(self):
+        response = self.client.get('/job?changed_since=2017-01-01T00:00:00.000000Z')
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_passes_statuses(self):
+        self.client.get('/job?status=Running,Success')
+
+        _, kwargs = self.mock_get_all.call_args
+        self.assertEqual(['Running', 'Success'], kwargs['statuses'])
+
+    def test_treats_empty_status_as_absent(self):
+        self.client.get('/job?status=')
+
+        _, kwargs = self.mock_get_all.call_args
+        self.assertIsNone(kwargs['statuses'])
+
+    def test_rejects_unknown_statuses(self):
+        self.mock_get_all.side_effect = jobs.InvalidQuery('unknown status `lolwut`')
+
+        response = self.client.get('/job?status=lolwut')
+
+        self.assertEqual(400, response.status_code)
+
+    def test_fetches_one_extra_job_to_detect_next_page(self):
+        self.client.get('/job?limit=2')
+
+        _, kwargs = self.mock_get_all.call_args
+        self.assertEqual(3, kwargs['limit'])
+
+    def test_returns_next_after_when_more_jobs_follow(self):
+        self.mock_get_all.return_value = [
+            create_job('test-job-id-1', datetime(2017, 1, 1, tzinfo=dateutil.tz.tzutc())),
+            create_job('test-job-id-2', datetime(2017, 1, 2, tzinfo=dateutil.tz.tzutc())),
+            create_job('test-job-id-3', datetime(2017, 1, 3, tzinfo=dateutil.tz.tzutc())),
+        ]
+
+        body = self.client.get('/job?limit=2').get_json()
+
+        self.assertEqual(['test-job-id-1', 'test-job-id-2'], [f['id'] for f in body['jobs']['features']])
+        self.assertEqual('2017-01-02T00:00:00.000000Z_test-job-id-2', body['next_after'])
+
+    def test_omits_next_after_on_last_page(self):
+        self.mock_get_all.return_value = [
+            create_job('test-job-id-1', datetime(2017, 1, 1, tzinfo=dateutil.tz.tzutc())),
+        ]
+
+        body = self.client.get('/job?limit=2').get_json()
+
+        self.assertNotIn('next_after', body)
+
+    def test_passes_after(self):
+        self.client.get('/job?after=2017-01-02T00:00:00.000000Z_test-job-id-2')
+
+        _, kwargs = self.mock_get_all.call_args
+        self.assertEqual((datetime(2017, 1, 2, tzinfo=dateutil.tz.tzutc()), 'test-job-id-2'), kwargs['after'])
+
+    def test_can_omit_geometry(self):
+        self.client.get('/job?geometry=false')
+
+        _, kwargs = self.mock_get_all.call_args
+        self.assertFalse(kwargs['include_geometry'])
+
+    def test_includes_geometry_by_default(self):
+        self.client.get('/job')
+
+        _, kwargs = self.mock_get_all.call_args
+        self.assertTrue(kwargs['include_geometry'])
+
+    def test_rejects_invalid_query(self):
+        for query in ('limit=0', 'limit=lolwut', 'after=lolwut', 'after=2017-01-02T00:00:00', 'geometry=lolwut',
+                      'changed_since=lolwut'):
+            with self.subTest(query=query):
+                response = self.client.get('/job?' + query)
+
+                self.assertEqual(400, response.status_code)
+        self.assertFalse(self.mock_get_all.called)
 
 
 class ListJobsForProductlineTest(unittest.TestCase):
@@ -46,9 +198,26 @@ class ListJobsForProductlineTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
 
-class ListJobsForSceneTest(unittest.TestCase):
-    def test_does_things(self):
-        self.skipTest('Not yet implemented')
+class ListJobsForSceneTest(helpers.MockableTestCase):
+    def setUp(self):
+        self.create_mock('beachfront.services.jobs.get_by_scene_fingerprint', return_value='test-fingerprint')
+        self.mock_get_by_scene = self.create_mock('beachfront.services.jobs.get_by_scene', return_value=[])
+        self.client = create_client()
+
+    def test_sets_etag_and_cache_control(self):
+        response = self.client.get('/job/by_scene/test-scene-id')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+        self.assertEqual('private, no-cache', response.headers['Cache-Control'])
+
+    def test_returns_304_when_etag_matches(self):
+        etag = self.client.get('/job/by_scene/test-scene-id').headers['ETag']
+
+        response = self.client.get('/job/by_scene/test-scene-id', headers={'If-None-Match': etag})
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, self.mock_get_by_scene.call_count)
 
 
 class GetJobTest(unittest.TestCase):
@@ -61,9 +230,26 @@ class CreateProductlineTest(unittest.TestCase):
         self.skipTest('Not yet implemented')
 
 
-class ListProductlinesTest(unittest.TestCase):
-    def test_does_things(self):
-        self.skipTest('Not yet implemented')
+class ListProductlinesTest(helpers.MockableTestCase):
+    def setUp(self):
+        self.create_mock('beachfront.services.productlines.get_all_fingerprint', return_value='test-fingerprint')
+        self.mock_get_all = self.create_mock('beachfront.services.productlines.get_all', return_value=[])
+        self.client = create_client()
+
+    def test_sets_etag_and_cache_control(self):
+        response = self.client.get('/productline')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+        self.assertEqual('private, no-cache', response.headers['Cache-Control'])
+
+    def test_returns_304_when_etag_matches(self):
+        etag = self.client.get('/productline').headers['ETag']
+
+        response = self.client.get('/productline', headers={'If-None-Match': etag})
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, self.mock_get_all.call_count)
 
 
 class OnHarvestEventTest(unittest.TestCase):
@@ -74,3 +260,116 @@ class OnHarvestEventTest(unittest.TestCase):
 class ListSupportingServicesTest(unittest.TestCase):
     def test_does_things(self):
         self.skipTest('Not yet implemented')
+
+
+class StreamJobEventsTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._logger = helpers.get_logger(events.__name__)
+        self.listener = events._Listener()
+        self.create_mock('beachfront.services.events._get_listener', return_value=self.listener)
+        self.client = create_client()
+
+    def tearDown(self):
+        self._logger.destroy()
+
+    def test_streams_server_sent_events(self):
+        response = self.client.get('/job/events', buffered=False)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/event-stream', response.headers['Content-Type'])
+        self.assertEqual('no-cache', response.headers['Cache-Control'])
+        response.close()
+
+    def test_returns_503_when_too_many_streams_are_open(self):
+        self.create_mock('beachfront.services.events.stream', side_effect=events.TooManyStreams())
+
+        response = self.client.get('/job/events')
+
+        self.assertEqual(503, response.status_code)
+        self.assertEqual('30', response.headers['Retry-After'])
+
+    def test_releases_subscription_when_response_closes(self):
+        response = self.client.get('/job/events', buffered=False)
+        self.assertEqual({'test-user-id'}, set(self.listener._subscriptions))
+
+        response.close()
+
+        self.assertEqual({}, self.listener._subscriptions)
+        self.assertEqual(0, self.listener._count)
+
+
+class GetDetectionTileTest(helpers.MockableTestCase):
+    def setUp(self):
+        self.get_tile = tiles.get_tile
+        self.mock_get_tile = self.create_mock('beachfront.services.tiles.get_tile', return_value=b'test-tile')
+        self.client = create_client()
+
+    def test_returns_vector_tile(self):
+        response = self.client.get('/tiles/1/0/1.mvt?job_id=test-job-id')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/vnd.mapbox-vector-tile', response.headers['Content-Type'])
+        self.assertEqual(b'test-tile', response.data)
+        self.mock_get_tile.assert_called_once_with(1, 0, 1, job_id='test-job-id', productline_id=None, scene_id=None)
+
+    def test_returns_empty_tile(self):
+        self.mock_get_tile.return_value = b''
+
+        response = self.client.get('/tiles/1/0/1.mvt')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/vnd.mapbox-vector-tile', response.headers['Content-Type'])
+        self.assertEqual(b'', response.data)
+
+    def test_returns_400_on_invalid_tile(self):
+        self.mock_get_tile.side_effect = self.get_tile  # Rejected before any query
+        for path in ('/tiles/1/2/0.mvt', '/tiles/1/0/2.mvt', '/tiles/25/0/0.mvt'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+
+                self.assertEqual(400, response.status_code)
+
+    def test_returns_500_on_database_error(self):
+        self.mock_get_tile.side_effect = helpers.create_database_error()
+
+        response = self.client.get('/tiles/1/0/1.mvt')
+
+        self.assertEqual(500, response.status_code)
+
+
+#
+# Helpers
+#
+
+def create_job(job_id: str = 'test-job-id', created_on: datetime = None):
+    return jobs.Job(
+        algorithm_name='test-algo-name',
+        algorithm_version='test-algo-version',
+        created_by='test-user-id',
+        created_on=created_on or datetime.utcnow().replace(tzinfo=dateutil.tz.tzutc()),
+        geometry={'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]},
+        job_id=job_id,
+        name='test-name',
+        scene_sensor_name='test-sensor-name',
+        scene_time_of_collect=datetime(2017, 1, 1, tzinfo=dateutil.tz.tzutc()),
+        scene_id='test-scene-id',
+        status='Success',
+        tide=5.4,
+        tide_min_24h=-10.0,
+        tide_max_24h=20.0,
+    )
+
+
+def create_client():
+    app = flask.Flask(__name__)
+    app.register_blueprint(routes.blueprint)
+
+    @app.before_request
+    def authenticate():
+        flask.request.user = users.User(
+            user_id='test-user-id',
+            name='test-name',
+            api_key='test-api-key',
+        )
+
+    return app.test_client()
@@ -11,6 +11,7 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 
@@ -19,6 +20,9 @@ from beachfront.services import algorithms, piazza
 
 @patch('beachfront.services.piazza.get_services')
 class ListAllTest(unittest.TestCase):
+    def setUp(self):
+        algorithms.invalidate()
+
     def test_requests_algorithms_from_piazza(self, mock: MagicMock):
         algorithms.list_all()
         self.assertEqual(('^BF_Algo_',), mock.call_args[0])
@@ -110,6 +114,47 @@ class ListAllTest(unittest.TestCase):
 
 @patch('beachfront.services.piazza.get_service')
 class GetTest(unittest.TestCase):
+    def setUp(self):
+        algorithms.invalidate()
+        patcher = patch('beachfront.services.piazza.get_services', return_value=[])
+        self.addCleanup(patcher.stop)
+        self.mock_get_services = patcher.start()
+
+    def test_fills_cold_cache_with_one_request(self, mock: MagicMock):
+        self.mock_get_services.return_value = [create_service('test-algo-1'), create_service('test-algo-2')]
+        algo = algorithms.get('test-algo-1')
+        self.assertEqual('test-algo-1', algo.service_id)
+        self.assertEqual(1, self.mock_get_services.call_count)
+        self.assertFalse(mock.called)
+        algorithms.get('test-algo-2')
+        self.assertEqual(1, self.mock_get_services.call_count)
+
+    def test_shares_cold_refresh_with_concurrent_callers(self, mock: MagicMock):
+        fetching = threading.Event()
+        release = threading.Event()
+
+        def get_services(_):
+            fetching.set()
+            release.wait(5)
+            return [create_service('test-algo-1')]
+
+        self.mock_get_services.side_effect = get_services
+        shared_before = algorithms._cache_flights.stats['shared']
+        leader = threading.Thread(target=algorithms.list_all)
+        leader.start()
+        fetching.wait(5)
+        follower = threading.Thread(target=algorithms.get, args=('test-algo-1',))
+        follower.start()
+        for _ in range(100):
+            if algorithms._cache_flights.stats['shared'] > shared_before:
+                break
+            follower.join(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(1, self.mock_get_services.call_count)
+        self.assertFalse(mock.called)
+
     def test_requests_algorithms_from_piazza(self, mock: MagicMock):
         mock.return_value = create_service()
         algorithms.get('test-service-id')
@@ -195,6 +240,118 @@ class GetTest(unittest.TestCase):
             algorithms.get('test-service-id')
 
 
+@patch('time.time')
+@patch('beachfront.services.piazza.get_service')
+@patch('beachfront.services.piazza.get_services')
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        algorithms.invalidate()
+        self._mockthread = self.create_mock('threading.Thread')
+        self.create_mock('beachfront.services.algorithms._cache_refreshing', False)
+
+    def create_mock(self, target_name, *args):
+        patcher = patch(target_name, *args)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_serves_list_from_cache_within_ttl(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        mock_time.return_value += 599
+        algorithms.list_all()
+        self.assertEqual(1, mock_get_services.call_count)
+
+    def test_returned_list_is_a_copy_of_the_cache(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all().pop()
+        self.assertEqual(1, len(algorithms.list_all()))
+
+    def test_serves_stale_list_and_refreshes_in_background(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        mock_time.return_value += 601
+        items = algorithms.list_all()
+        self.assertEqual(1, len(items))
+        self.assertEqual(1, mock_get_services.call_count)
+        self._mockthread.assert_called_once_with(target=algorithms._refresh_in_background, daemon=True)
+        self._mockthread.return_value.start.assert_called_once_with()
+
+    def test_starts_only_one_background_refresh(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        mock_time.return_value += 601
+        algorithms.list_all()
+        algorithms.list_all()
+        self.assertEqual(1, self._mockthread.call_count)
+
+    def test_background_refresh_replaces_snapshot(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service('test-algo-1')]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        mock_get_services.return_value = [create_service('test-algo-2')]
+        algorithms._refresh_in_background()
+        self.assertEqual(['test-algo-2'], [a.service_id for a in algorithms.list_all()])
+
+    def test_background_refresh_keeps_snapshot_when_piazza_throws(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        mock_get_services.side_effect = piazza.ServerError(500)
+        algorithms._refresh_in_background()
+        self.assertEqual(1, len(algorithms.list_all()))
+
+    def test_refetches_synchronously_when_too_stale(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        mock_time.return_value += (6 * 3600) + 601
+        algorithms.list_all()
+        self.assertEqual(2, mock_get_services.call_count)
+        self.assertFalse(self._mockthread.called)
+
+    def test_invalidate_discards_snapshot(self, mock_get_services: MagicMock, _, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service()]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        algorithms.invalidate()
+        algorithms.list_all()
+        self.assertEqual(2, mock_get_services.call_count)
+
+    def test_get_serves_from_snapshot(self, mock_get_services: MagicMock, mock_get_service: MagicMock, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service('test-algo-1')]
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        algo = algorithms.get('test-algo-1')
+        self.assertEqual('test-algo-1', algo.service_id)
+        self.assertFalse(mock_get_service.called)
+
+    def test_get_falls_back_to_piazza_when_not_in_snapshot(self, mock_get_services: MagicMock, mock_get_service: MagicMock, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service('test-algo-1')]
+        mock_get_service.return_value = create_service('test-algo-2')
+        mock_time.return_value = 1400000000.0
+        algorithms.list_all()
+        algorithms.get('test-algo-2')
+        self.assertEqual(('test-algo-2',), mock_get_service.call_args[0])
+
+    def test_counts_hits_and_misses(self, mock_get_services: MagicMock, mock_get_service: MagicMock, mock_time: MagicMock):
+        mock_get_services.return_value = [create_service('test-algo-1')]
+        mock_get_service.return_value = create_service('test-algo-2')
+        mock_time.return_value = 1400000000.0
+        before = algorithms.get_cache_stats()
+        algorithms.list_all()
+        algorithms.list_all()
+        algorithms.get('test-algo-1')
+        algorithms.get('test-algo-2')
+        after = algorithms.get_cache_stats()
+        self.assertEqual(3, after['hits'] - before['hits'])
+        self.assertEqual(2, after['misses'] - before['misses'])
+        self.assertEqual(1, after['cached'])
+
+
 #
 # Helpers
 #
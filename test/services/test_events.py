@@ -0,0 +1,247 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import collections
+import json
+import unittest.mock
+from datetime import timedelta
+
+from test import helpers
+
+from beachfront.services import events
+
+
+class StreamTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self._logger = helpers.get_logger(events.__name__)
+        self.listener = events._Listener()
+        self.mock_select = self.create_mock('beachfront.db.jobs.select_job_users')
+        self.mock_select.return_value.fetchall.return_value = [
+            {'job_id': 'test-job-id', 'user_id': 'test-user-id'},
+        ]
+        self.create_mock('beachfront.services.events._get_listener', return_value=self.listener)
+        self.create_mock('beachfront.services.geoserver.invalidate_tiles')
+        self.create_mock('beachfront.services.tiles.invalidate')
+        self.create_mock('beachfront.services.events.JOB_EVENTS_HEARTBEAT', new=timedelta(seconds=0.01))
+        self.create_mock('beachfront.services.events.JOB_EVENTS_STREAM_TTL', new=timedelta(seconds=0.05))
+
+    def tearDown(self):
+        self._mockdb.destroy()
+        self._logger.destroy()
+
+    def test_begins_with_retry_delay(self):
+        stream = events.stream('test-user-id')
+        self.assertEqual('retry: {}\n\n'.format(events.RETRY_DELAY), next(stream))
+        stream.close()
+
+    def test_yields_status_changes_of_tracked_jobs(self):
+        stream = events.stream('test-user-id')
+        next(stream)
+        self.listener.dispatch([json.dumps({'job_id': 'test-job-id', 'status': 'Success'})])
+        self.assertEqual('event: status\ndata: {}\n\n'.format(json.dumps({
+            'job_id': 'test-job-id',
+            'status': 'Success',
+        })), next(stream))
+        stream.close()
+
+    def test_ignores_jobs_the_user_does_not_track(self):
+        self.mock_select.return_value.fetchall.return_value = []
+        stream = events.stream('test-user-id')
+        next(stream)
+        self.listener.dispatch([json.dumps({'job_id': 'some-other-job-id', 'status': 'Success'})])
+        self.assertEqual(': keepalive\n\n', next(stream))
+        stream.close()
+
+    def test_looks_up_users_once_per_batch(self):
+        stream = events.stream('test-user-id')
+        self.listener.dispatch([
+            json.dumps({'job_id': 'test-job-id', 'status': 'Running'}),
+            json.dumps({'job_id': 'test-job-id', 'status': 'Success'}),
+        ])
+        self.assertEqual(1, self.mock_select.call_count)
+        self.assertEqual(['test-user-id'], self.mock_select.call_args[1]['user_ids'])
+        stream.close()
+
+    def test_skips_lookup_without_subscribers(self):
+        self.listener.dispatch([json.dumps({'job_id': 'test-job-id', 'status': 'Success'})])
+        self.assertFalse(self.mock_select.called)
+
+    def test_discards_malformed_payloads(self):
+        stream = events.stream('test-user-id')
+        self.listener.dispatch(['lolwut', json.dumps({'job_id': 'test-job-id'})])
+        self.assertFalse(self.mock_select.called)
+        self.assertEqual(2, len([l for l in self._logger.lines if 'Discarding malformed job event' in l]))
+        stream.close()
+
+    def test_sends_heartbeats(self):
+        stream = events.stream('test-user-id')
+        next(stream)
+        self.assertEqual(': keepalive\n\n', next(stream))
+        stream.close()
+
+    def test_ends_after_ttl(self):
+        stream = events.stream('test-user-id')
+        self.assertTrue(all(chunk in ('retry: {}\n\n'.format(events.RETRY_DELAY), ': keepalive\n\n')
+                            for chunk in stream))
+
+    def test_ends_when_subscriber_falls_behind(self):
+        self.create_mock('beachfront.services.events.QUEUE_SIZE', new=1)
+        stream = events.stream('test-user-id')
+        next(stream)
+        self.listener.dispatch([
+            json.dumps({'job_id': 'test-job-id', 'status': 'Running'}),
+            json.dumps({'job_id': 'test-job-id', 'status': 'Success'}),
+        ])
+        with self.assertRaises(StopIteration):
+            next(stream)
+        stream.close()
+
+    def test_ends_when_lookup_fails(self):
+        self.mock_select.side_effect = helpers.create_database_error()
+        stream = events.stream('test-user-id')
+        next(stream)
+        self.listener.dispatch([json.dumps({'job_id': 'test-job-id', 'status': 'Success'})])
+        with self.assertRaises(StopIteration):
+            next(stream)
+        stream.close()
+
+    def test_releases_subscription_when_ended(self):
+        self.create_mock('beachfront.services.events.JOB_EVENTS_MAX_STREAMS', new=1)
+        list(events.stream('test-user-id'))
+        events.stream('test-user-id').close()
+
+    def test_releases_subscription_when_closed_before_iterating(self):
+        self.create_mock('beachfront.services.events.JOB_EVENTS_MAX_STREAMS', new=1)
+        events.stream('test-user-id').close()
+        events.stream('test-user-id').close()
+
+    def test_throws_when_too_many_streams_are_open(self):
+        self.create_mock('beachfront.services.events.JOB_EVENTS_MAX_STREAMS', new=1)
+        stream = events.stream('test-user-id')
+        with self.assertRaises(events.TooManyStreams):
+            events.stream('some-other-user-id')
+        stream.close()
+
+
+class InvalidateTilesTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self._logger = helpers.get_logger(events.__name__)
+        self.listener = events._Listener()
+        self.mock_invalidate_tiles = self.create_mock('beachfront.services.geoserver.invalidate_tiles')
+        self.mock_invalidate_vector_tiles = self.create_mock('beachfront.services.tiles.invalidate')
+        self.mock_wms_cache = self.create_mock('beachfront.services.geoserver.get_tile_cache').return_value
+        self.mock_mvt_cache = self.create_mock('beachfront.services.tiles.get_tile_cache').return_value
+        self.create_mock('beachfront.db.jobs.listen_for_status_changes')
+        self.create_mock('beachfront.db.users.listen_for_api_key_rotations')
+        self.create_mock('beachfront.services.users.forget_all_api_keys')
+        self.create_mock('beachfront.services.events.select.select', side_effect=RuntimeError('test-error'))
+
+    def tearDown(self):
+        self._mockdb.destroy()
+        self._logger.destroy()
+
+    def test_invalidates_tiles_of_successful_jobs_without_subscribers(self):
+        self.listener.dispatch([json.dumps({'job_id': 'test-job-id', 'status': 'Success'})])
+        self.mock_invalidate_tiles.assert_called_once_with('test-job-id')
+        self.mock_invalidate_vector_tiles.assert_called_once_with('test-job-id')
+
+    def test_keeps_tiles_of_unfinished_jobs(self):
+        self.listener.dispatch([
+            json.dumps({'job_id': 'test-job-id', 'status': 'Running'}),
+            json.dumps({'job_id': 'test-job-id', 'status': 'Error'}),
+        ])
+        self.assertFalse(self.mock_invalidate_tiles.called)
+        self.assertFalse(self.mock_invalidate_vector_tiles.called)
+
+    def test_keeps_tiles_when_first_listening(self):
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.assertFalse(self.mock_wms_cache.clear.called)
+        self.assertFalse(self.mock_mvt_cache.clear.called)
+
+    def test_clears_tiles_when_listening_again(self):
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.mock_wms_cache.clear.assert_called_once_with()
+        self.mock_mvt_cache.clear.assert_called_once_with()
+
+
+class ForgetApiKeysTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self._logger = helpers.get_logger(events.__name__)
+        self.listener = events._Listener()
+        self._mockdb.execution_options.return_value = unittest.mock.Mock()
+        self.raw_conn = self._mockdb.execution_options.return_value.connection.connection
+        self.raw_conn.notifies = []
+        self.mock_listen_for_rotations = self.create_mock('beachfront.db.users.listen_for_api_key_rotations')
+        self.mock_forget_api_key = self.create_mock('beachfront.services.users.forget_api_key')
+        self.mock_forget_all_api_keys = self.create_mock('beachfront.services.users.forget_all_api_keys')
+        self.mock_dispatch = self.create_mock('beachfront.services.events._Listener.dispatch')
+        self.create_mock('beachfront.db.jobs.listen_for_status_changes')
+        self.create_mock('beachfront.services.geoserver.get_tile_cache')
+        self.create_mock('beachfront.services.tiles.get_tile_cache')
+        self.mock_select = self.create_mock('beachfront.services.events.select.select')
+        self.mock_select.side_effect = [([self.raw_conn], [], []), RuntimeError('test-error')]
+
+    def tearDown(self):
+        self._mockdb.destroy()
+        self._logger.destroy()
+
+    def test_listens_for_rotations(self):
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.assertTrue(self.mock_listen_for_rotations.called)
+
+    def test_forgets_keys_of_user_whose_key_was_reset(self):
+        self.raw_conn.notifies = [Notify('api_key_rotated', 'test-user-id')]
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.mock_forget_api_key.assert_called_once_with(user_id='test-user-id')
+        self.assertFalse(self.mock_dispatch.called)
+
+    def test_dispatches_only_status_changes(self):
+        self.raw_conn.notifies = [
+            Notify('api_key_rotated', 'test-user-id'),
+            Notify('job_status', json.dumps({'job_id': 'test-job-id', 'status': 'Success'})),
+        ]
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.mock_dispatch.assert_called_once_with([json.dumps({'job_id': 'test-job-id', 'status': 'Success'})])
+
+    def test_forgets_all_keys_when_listening_again(self):
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.assertFalse(self.mock_forget_all_api_keys.called)
+        self.mock_select.side_effect = RuntimeError('test-error')
+        with self.assertRaises(RuntimeError):
+            self.listener._listen()
+        self.mock_forget_all_api_keys.assert_called_once_with()
+
+
+class StartListenerTest(helpers.MockableTestCase):
+    def test_starts_listener(self):
+        mock_get_listener = self.create_mock('beachfront.services.events._get_listener')
+        events.start_listener()
+        self.assertTrue(mock_get_listener.called)
+
+
+#
+# Helpers
+#
+
+Notify = collections.namedtuple('Notify', 'channel payload')
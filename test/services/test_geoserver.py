@@ -11,14 +11,19 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import threading
+import time
 import unittest
 import xml.etree.ElementTree as et
 from unittest.mock import patch
 
+import requests
 import requests_mock
 from requests import ConnectionError
 
 from beachfront.services import geoserver
+from beachfront.utils.singleflight import SingleFlight
+from beachfront.utils.tilecache import TileCache
 
 XMLNS = {'sld': 'http://www.opengis.net/sld'}
 
@@ -29,6 +34,7 @@ class InstallIfNeededTest(unittest.TestCase):
         m.get('/geoserver/rest/workspaces/beachfront')
         m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres')
         m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
         m.get('/geoserver/rest/styles/detections')
 
         geoserver.install_if_needed()
@@ -37,6 +43,7 @@ class InstallIfNeededTest(unittest.TestCase):
             'http://vcap-geoserver.test.localdomain/geoserver/rest/workspaces/beachfront',
             'http://vcap-geoserver.test.localdomain/geoserver/rest/workspaces/beachfront/datastores/postgres',
             'http://vcap-geoserver.test.localdomain/geoserver/rest/layers/all_detections',
+            'http://vcap-geoserver.test.localdomain/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections',
             'http://vcap-geoserver.test.localdomain/geoserver/rest/styles/detections',
         ], [h.url for h in m.request_history])
 
@@ -44,6 +51,7 @@ class InstallIfNeededTest(unittest.TestCase):
         m.get('/geoserver/rest/workspaces/beachfront')
         m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres')
         m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
         m.get('/geoserver/rest/styles/detections')
 
         geoserver.install_if_needed()
@@ -53,12 +61,14 @@ class InstallIfNeededTest(unittest.TestCase):
             'Basic dGVzdC11c2VybmFtZTp0ZXN0LXBhc3N3b3Jk',
             'Basic dGVzdC11c2VybmFtZTp0ZXN0LXBhc3N3b3Jk',
             'Basic dGVzdC11c2VybmFtZTp0ZXN0LXBhc3N3b3Jk',
+            'Basic dGVzdC11c2VybmFtZTp0ZXN0LXBhc3N3b3Jk',
         ], [h.headers['Authorization'] for h in m.request_history])
 
     def test_installs_workspace_if_missing(self, m):
         m.get('/geoserver/rest/workspaces/beachfront', status_code=404)
         m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres')
         m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
         m.get('/geoserver/rest/styles/detections')
 
         with patch('beachfront.services.geoserver.install_workspace') as stub:
@@ -70,6 +80,7 @@ class InstallIfNeededTest(unittest.TestCase):
         m.get('/geoserver/rest/workspaces/beachfront')
         m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres', status_code=404)
         m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
         m.get('/geoserver/rest/styles/detections')
 
         with patch('beachfront.services.geoserver.install_datastore') as stub:
@@ -91,12 +102,327 @@ class InstallIfNeededTest(unittest.TestCase):
         m.get('/geoserver/rest/workspaces/beachfront')
         m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres')
         m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
         m.get('/geoserver/rest/styles/detections', status_code=404)
 
         with patch('beachfront.services.geoserver.install_style') as stub:
             geoserver.install_if_needed()
             stub.assert_called_once_with('detections')
 
+    def test_updates_detections_layer_if_outdated(self, m):
+        m.get('/geoserver/rest/workspaces/beachfront')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres')
+        m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml('SELECT * FROM geoserver_lod WHERE lod = %lod%'))
+        m.get('/geoserver/rest/styles/detections')
+
+        with patch('beachfront.services.geoserver.install_layer') as install_stub, \
+                patch('beachfront.services.geoserver.update_layer') as update_stub:
+            geoserver.install_if_needed()
+            update_stub.assert_called_once_with('all_detections')
+            self.assertFalse(install_stub.called)
+
+    def test_does_not_update_detections_layer_if_current(self, m):
+        m.get('/geoserver/rest/workspaces/beachfront')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres')
+        m.get('/geoserver/rest/layers/all_detections')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
+        m.get('/geoserver/rest/styles/detections')
+
+        with patch('beachfront.services.geoserver.update_layer') as stub:
+            geoserver.install_if_needed()
+            self.assertFalse(stub.called)
+
+
+@requests_mock.Mocker()
+class GetWmsTileTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = TileCache(memory_size=1024)
+        self.flights = SingleFlight()
+        for target, new in (('beachfront.services.geoserver._tile_cache', self.cache),
+                            ('beachfront.services.geoserver._wms_flights', self.flights),
+                            ('beachfront.services.geoserver._wms_stats', {'upstream_requests': 0})):
+            patcher = patch(target, new)
+            self.addCleanup(patcher.stop)
+            patcher.start()
+
+    def test_forwards_request_to_geoserver(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual('http://vcap-geoserver.test.localdomain/geoserver/wms', m.request_history[0].url.split('?')[0])
+        self.assertEqual(['getmap'], m.request_history[0].qs['request'])
+
+    def test_picks_detection_geometry_tier_for_resolution(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params['SRS'] = 'EPSG:4326'
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['jobid:test-job-id;sceneid:;lod:3'], m.request_history[0].qs['viewparams'])
+
+    def test_picks_detection_geometry_tier_for_web_mercator_resolution(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(SRS='EPSG:3857', BBOX='0,0,2445.98,2445.98', VIEWPARAMS='')
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['lod:0'], m.request_history[0].qs['viewparams'])
+
+    def test_accounts_for_latitude_in_web_mercator_resolution(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(SRS='EPSG:3857', BBOX='0,0,4275,4275', VIEWPARAMS='')
+        geoserver.get_wms_tile(params)
+        params.update(BBOX='0,8399738,4275,8404013')  # ~60°N, where a pixel spans half the latitude
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['lod:1'], m.request_history[0].qs['viewparams'])
+        self.assertEqual(['lod:0'], m.request_history[1].qs['viewparams'])
+
+    def test_picks_detection_geometry_tier_per_layer(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(SRS='EPSG:4326', LAYERS='beachfront:all_detections,beachfront:other',
+                      VIEWPARAMS='jobid:test-job-id,test-key:test-value')
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['jobid:test-job-id;lod:3,test-key:test-value'], m.request_history[0].qs['viewparams'])
+
+    def test_picks_detection_geometry_tier_for_detections_layer_anywhere_in_list(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(SRS='EPSG:4326', LAYERS='beachfront:other,beachfront:all_detections', VIEWPARAMS='jobid:test-job-id')
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['jobid:test-job-id,jobid:test-job-id;lod:3'], m.request_history[0].qs['viewparams'])
+
+    def test_leaves_tier_alone_for_other_layers(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(SRS='EPSG:4326', LAYERS='beachfront:other')
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['jobid:test-job-id;sceneid:'], m.request_history[0].qs['viewparams'])
+
+    def test_tags_cached_tile_with_filters_of_every_layer(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(LAYERS='beachfront:all_detections,beachfront:all_detections',
+                      VIEWPARAMS='jobid:some-other-job-id,jobid:test-job-id')
+        geoserver.get_wms_tile(params)
+        self.assertEqual(1, geoserver.invalidate_tiles('test-job-id'))
+
+    def test_keeps_detection_geometry_tier_picked_by_client(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params.update(SRS='EPSG:4326', VIEWPARAMS='lod:1')
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['lod:1'], m.request_history[0].qs['viewparams'])
+
+    def test_leaves_tier_to_geoserver_for_unknown_projections(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        params = create_getmap_params()
+        params['SRS'] = 'EPSG:32618'
+        geoserver.get_wms_tile(params)
+        self.assertEqual(['jobid:test-job-id;sceneid:'], m.request_history[0].qs['viewparams'])
+
+    def test_returns_tile_and_headers(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        content, headers = geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(b'test-tile', content)
+        self.assertEqual({'Content-Type': 'image/png', 'Content-Length': '9'}, headers)
+
+    def test_forwards_validators_from_geoserver(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={
+            'Content-Type': 'image/png',
+            'ETag': '"test-etag"',
+            'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT',
+            'Server': 'test-server',
+        })
+        _, headers = geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual('"test-etag"', headers['ETag'])
+        self.assertEqual('Mon, 01 Jan 2018 00:00:00 GMT', headers['Last-Modified'])
+        self.assertNotIn('Server', headers)
+
+    def test_serves_repeat_requests_from_cache(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png', 'ETag': '"test-etag"'})
+        geoserver.get_wms_tile(create_getmap_params())
+        content, headers = geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(1, m.call_count)
+        self.assertEqual(b'test-tile', content)
+        self.assertEqual({'Content-Type': 'image/png', 'Content-Length': '9', 'ETag': '"test-etag"'}, headers)
+
+    def test_ignores_parameter_order_and_case_in_cache_key(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        geoserver.get_wms_tile(create_getmap_params())
+        params = {k.lower(): v for k, v in reversed(list(create_getmap_params().items()))}
+        params['viewparams'] = 'sceneid:;jobid:test-job-id'
+        geoserver.get_wms_tile(params)
+        self.assertEqual(1, m.call_count)
+
+    def test_does_not_cache_non_image_responses(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'<ServiceExceptionReport/>', headers={'Content-Type': 'application/vnd.ogc.se_xml'})
+        geoserver.get_wms_tile(create_getmap_params())
+        geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(2, m.call_count)
+
+    def test_does_not_cache_other_wms_operations(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'<WMS_Capabilities/>', headers={'Content-Type': 'image/png'})
+        geoserver.get_wms_tile({'SERVICE': 'WMS', 'REQUEST': 'GetCapabilities'})
+        geoserver.get_wms_tile({'SERVICE': 'WMS', 'REQUEST': 'GetCapabilities'})
+        self.assertEqual(2, m.call_count)
+
+    def test_throws_on_http_error(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', status_code=500)
+        with self.assertRaises(geoserver.Error):
+            geoserver.get_wms_tile(create_getmap_params())
+
+    def test_coalesces_concurrent_identical_requests(self, m: requests_mock.Mocker):
+        def render(request, context):
+            # Hold the upstream call open until the other callers have joined it
+            deadline = time.time() + 5
+            while self.flights.stats['shared'] < 3 and time.time() < deadline:
+                time.sleep(0.001)
+            return b'test-tile'
+
+        m.get('/geoserver/wms', content=render, headers={'Content-Type': 'image/png'})
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(geoserver.get_wms_tile(create_getmap_params())))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, m.call_count)
+        self.assertEqual([b'test-tile'] * 4, [content for content, _ in results])
+
+    def test_times_out_upstream_requests(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(geoserver.TIMEOUT, m.request_history[0].timeout)
+
+    def test_throws_when_upstream_request_times_out(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', exc=requests.exceptions.ReadTimeout)
+        with self.assertRaises(geoserver.Unreachable):
+            geoserver.get_wms_tile(create_getmap_params())
+
+    def test_releases_coalesced_requests_when_upstream_fails(self, m: requests_mock.Mocker):
+        def render(request, context):
+            deadline = time.time() + 5
+            while self.flights.stats['shared'] < 3 and time.time() < deadline:
+                time.sleep(0.001)
+            raise requests.exceptions.ReadTimeout(request=request)
+
+        m.get('/geoserver/wms', content=render, headers={'Content-Type': 'image/png'})
+        errors = []
+
+        def get_tile():
+            try:
+                geoserver.get_wms_tile(create_getmap_params())
+            except geoserver.Error as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=get_tile) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(1, m.call_count)
+        self.assertEqual(4, len(errors))
+        self.assertTrue(all(isinstance(err, geoserver.Unreachable) for err in errors))
+
+    def test_reports_upstream_calls_saved(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'test-tile', headers={'Content-Type': 'image/png'})
+        self.flights.stats['shared'] = 3
+        geoserver.get_wms_tile(create_getmap_params())
+        geoserver.get_wms_tile(create_getmap_params())
+        stats = geoserver.get_wms_stats()
+        self.assertEqual(1, stats['upstream_requests'])
+        self.assertEqual(3, stats['coalesced_requests'])
+        self.assertEqual(1, stats['cache_memory_hits'])
+
+    def test_reports_stats_without_creating_tile_cache(self, _):
+        with patch('beachfront.services.geoserver._tile_cache', None):
+            stats = geoserver.get_wms_stats()
+            self.assertIsNone(geoserver._tile_cache)
+        self.assertNotIn('cache_memory_hits', stats)
+        self.assertIn('upstream_requests', stats)
+
+    def test_streams_other_wms_operations(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'<WMS_Capabilities/>', headers={'Content-Type': 'text/xml', 'Content-Length': '19'})
+        body, headers = geoserver.get_wms_tile({'SERVICE': 'WMS', 'REQUEST': 'GetCapabilities'})
+        self.assertNotIsInstance(body, bytes)
+        self.assertEqual(b'<WMS_Capabilities/>', b''.join(body))
+        self.assertEqual({'Content-Type': 'text/xml', 'Content-Length': '19'}, headers)
+
+    def test_streams_tiles_too_large_to_cache(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'x' * 20000, headers={'Content-Type': 'image/png', 'Content-Length': '20000'})
+        with patch('beachfront.services.geoserver.WMS_CACHE_MAX_TILE_SIZE', 10000):
+            body, headers = geoserver.get_wms_tile(create_getmap_params())
+            self.assertEqual(b'x' * 20000, b''.join(body))
+            self.assertEqual('20000', headers['Content-Length'])
+            geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(2, m.call_count)
+
+    def test_streams_tiles_found_too_large_while_buffering(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'x' * 20000, headers={'Content-Type': 'image/png'})
+        with patch('beachfront.services.geoserver.WMS_CACHE_MAX_TILE_SIZE', 10000):
+            body, _ = geoserver.get_wms_tile(create_getmap_params())
+            self.assertEqual(b'x' * 20000, b''.join(body))
+            geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(2, m.call_count)
+
+    def test_drops_content_length_of_compressed_responses(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'<WMS_Capabilities/>', headers={
+            'Content-Type': 'text/xml',
+            'Content-Length': '12',
+            'Content-Encoding': 'identity',
+        })
+        _, headers = geoserver.get_wms_tile({'SERVICE': 'WMS', 'REQUEST': 'GetCapabilities'})
+        self.assertNotIn('Content-Length', headers)
+
+    def test_closes_upstream_response_once_streamed(self, m: requests_mock.Mocker):
+        m.get('/geoserver/wms', content=b'<WMS_Capabilities/>', headers={'Content-Type': 'text/xml'})
+        with patch('requests.Response.close') as mock_close:
+            body, _ = geoserver.get_wms_tile({'SERVICE': 'WMS', 'REQUEST': 'GetCapabilities'})
+            list(body)
+        self.assertTrue(mock_close.called)
+
+    def test_does_not_cache_tile_rendered_across_an_invalidation(self, m: requests_mock.Mocker):
+        def render(request, context):
+            geoserver.invalidate_tiles('test-job-id')
+            return b'test-tile'
+
+        m.get('/geoserver/wms', content=render, headers={'Content-Type': 'image/png'})
+        geoserver.get_wms_tile(create_getmap_params())
+        geoserver.get_wms_tile(create_getmap_params())
+        self.assertEqual(2, m.call_count)
+
+
+class InvalidateTilesTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = TileCache(memory_size=1024)
+        patcher = patch('beachfront.services.geoserver._tile_cache', self.cache)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def test_drops_tiles_for_job(self):
+        self.cache.put('a', b'tile', {'Content-Type': 'image/png'}, frozenset({('jobid', 'test-job-id')}))
+        geoserver.invalidate_tiles('test-job-id')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_drops_unfiltered_tiles(self):
+        self.cache.put('a', b'tile', {'Content-Type': 'image/png'}, frozenset())
+        geoserver.invalidate_tiles('test-job-id')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_drops_tiles_for_productlines_and_scenes(self):
+        self.cache.put('a', b'tile', {'Content-Type': 'image/png'}, frozenset({('productlineid', 'testpl')}))
+        self.cache.put('b', b'tile', {'Content-Type': 'image/png'}, frozenset({('sceneid', 'planetscope:test')}))
+        self.assertEqual(2, geoserver.invalidate_tiles('test-job-id'))
+
+    def test_keeps_tiles_for_other_jobs(self):
+        self.cache.put('a', b'tile', {'Content-Type': 'image/png'}, frozenset({('jobid', 'some-other-job-id')}))
+        geoserver.invalidate_tiles('test-job-id')
+        self.assertEqual((b'tile', {'Content-Type': 'image/png'}), self.cache.get('a'))
+
 
 @requests_mock.Mocker()
 class InstallLayerTest(unittest.TestCase):
@@ -123,8 +449,9 @@ class InstallLayerTest(unittest.TestCase):
         self.assertEqual('180.0', xml.findtext('./nativeBoundingBox/maxx'))
         self.assertEqual('90.0', xml.findtext('./nativeBoundingBox/maxy'))
         self.assertEqual('test-layer-id', xml.findtext('./metadata/entry[@key="JDBC_VIRTUAL_TABLE"]/virtualTable/name'))
-        self.assertIn('SELECT * FROM geoserver',
+        self.assertIn('SELECT * FROM geoserver_lod%lod%',
                       xml.findtext('./metadata/entry[@key="JDBC_VIRTUAL_TABLE"]/virtualTable/sql'))
+        self.assertEqual('0', xml.findtext('./metadata/entry[@key="JDBC_VIRTUAL_TABLE"]/virtualTable/parameter[name="lod"]/defaultValue'))
 
     def test_throws_on_http_error(self, m: requests_mock.Mocker):
         m.post('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes', status_code=500)
@@ -234,6 +561,74 @@ class LayerExistsTest(unittest.TestCase):
                 geoserver.layer_exists('test-layer-id')
 
 
+@requests_mock.Mocker()
+class LayerIsCurrentTest(unittest.TestCase):
+    def test_calls_correct_url(self, m: requests_mock.Mocker):
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
+        geoserver.layer_is_current('all_detections')
+        self.assertEqual('http://vcap-geoserver.test.localdomain/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', m.request_history[0].url)
+
+    def test_returns_true_if_query_matches(self, m: requests_mock.Mocker):
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml())
+        self.assertTrue(geoserver.layer_is_current('all_detections'))
+
+    def test_ignores_whitespace_differences(self, m: requests_mock.Mocker):
+        sql = et.fromstring(geoserver._layer_xml('all_detections')).findtext('.//virtualTable/sql')
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml(' '.join(sql.split())))
+        self.assertTrue(geoserver.layer_is_current('all_detections'))
+
+    def test_returns_false_if_query_differs(self, m: requests_mock.Mocker):
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text=create_featuretype_xml('SELECT * FROM geoserver_lod WHERE lod = %lod%'))
+        self.assertFalse(geoserver.layer_is_current('all_detections'))
+
+    def test_returns_false_if_definition_is_unreadable(self, m: requests_mock.Mocker):
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', text='lorem ipsum')
+        self.assertFalse(geoserver.layer_is_current('all_detections'))
+
+    def test_returns_false_if_not_found(self, m: requests_mock.Mocker):
+        m.get('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/all_detections', status_code=404)
+        self.assertFalse(geoserver.layer_is_current('all_detections'))
+
+    def test_throws_if_geoserver_is_unreachable(self, _):
+        with patch('requests.get') as stub:
+            stub.side_effect = ConnectionError()
+            with self.assertRaises(geoserver.InstallError):
+                geoserver.layer_is_current('all_detections')
+
+
+@requests_mock.Mocker()
+class UpdateLayerTest(unittest.TestCase):
+    def test_calls_correct_url(self, m: requests_mock.Mocker):
+        m.put('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/test-layer-id')
+        geoserver.update_layer('test-layer-id')
+        self.assertEqual('http://vcap-geoserver.test.localdomain/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/test-layer-id',
+                         m.request_history[0].url)
+
+    def test_sends_correct_credentials(self, m: requests_mock.Mocker):
+        m.put('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/test-layer-id')
+        geoserver.update_layer('test-layer-id')
+        self.assertEqual('Basic dGVzdC11c2VybmFtZTp0ZXN0LXBhc3N3b3Jk', m.request_history[0].headers['Authorization'])
+
+    def test_sends_same_payload_as_install(self, m: requests_mock.Mocker):
+        m.put('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/test-layer-id')
+        geoserver.update_layer('test-layer-id')
+        xml = et.fromstring(m.request_history[0].text)  # type: et.ElementTree
+        self.assertEqual('test-layer-id', xml.findtext('./name'))
+        self.assertIn('SELECT * FROM geoserver_lod%lod%',
+                      xml.findtext('./metadata/entry[@key="JDBC_VIRTUAL_TABLE"]/virtualTable/sql'))
+
+    def test_throws_on_http_error(self, m: requests_mock.Mocker):
+        m.put('/geoserver/rest/workspaces/beachfront/datastores/postgres/featuretypes/test-layer-id', status_code=500)
+        with self.assertRaises(geoserver.InstallError):
+            geoserver.update_layer('test-layer-id')
+
+    def test_throws_if_geoserver_is_unreachable(self, _):
+        with patch('requests.put') as stub:
+            stub.side_effect = ConnectionError()
+            with self.assertRaises(geoserver.InstallError):
+                geoserver.update_layer('test-layer-id')
+
+
 @requests_mock.Mocker()
 class StyleExistsTest(unittest.TestCase):
     def test_calls_correct_url(self, m: requests_mock.Mocker):
@@ -259,3 +654,38 @@ class StyleExistsTest(unittest.TestCase):
             stub.side_effect = ConnectionError()
             with self.assertRaises(geoserver.InstallError):
                 geoserver.style_exists('test-style-id')
+
+
+#
+# Helpers
+#
+
+def create_getmap_params():
+    return {
+        'SERVICE': 'WMS',
+        'REQUEST': 'GetMap',
+        'LAYERS': 'beachfront:all_detections',
+        'BBOX': '-180,-90,180,90',
+        'WIDTH': '256',
+        'HEIGHT': '256',
+        'FORMAT': 'image/png',
+        'VIEWPARAMS': 'jobid:test-job-id;sceneid:',
+    }
+
+
+def create_featuretype_xml(sql: str = None):
+    if sql is None:
+        return geoserver._layer_xml('all_detections')
+    return """
+        <featureType>
+            <name>all_detections</name>
+            <metadata>
+                <entry key="JDBC_VIRTUAL_TABLE">
+                    <virtualTable>
+                        <name>all_detections</name>
+                        <sql>{}</sql>
+                    </virtualTable>
+                </entry>
+            </metadata>
+        </featureType>
+    """.format(sql)
@@ -12,6 +12,7 @@
 # specific language governing permissions and limitations under the License.
 
 import json
+import threading
 import unittest
 from datetime import datetime, timedelta
 from unittest.mock import call, patch, Mock
@@ -435,7 +436,50 @@ class GetAllJobsTest(unittest.TestCase):
     def test_queries_on_correct_userid(self, mock: Mock):
         mock.return_value.fetchall.return_value = []
         jobs.get_all('test-user-id')
-        self.assertEqual({'user_id': 'test-user-id'}, mock.call_args[1])
+        self.assertEqual('test-user-id', mock.call_args[1]['user_id'])
+
+    def test_can_list_only_changed_jobs(self, mock: Mock):
+        mock.return_value.fetchall.return_value = []
+        since = datetime.utcnow()
+        jobs.get_all('test-user-id', changed_since=since)
+        self.assertEqual(since, mock.call_args[1]['changed_since'])
+
+    def test_selects_every_job_by_default(self, mock: Mock):
+        mock.return_value.fetchall.return_value = []
+        jobs.get_all('test-user-id')
+        self.assertEqual({
+            'user_id': 'test-user-id',
+            'changed_since': None,
+            'statuses': None,
+            'after': None,
+            'limit': None,
+            'include_geometry': True,
+        }, mock.call_args[1])
+
+    def test_can_list_a_page_of_jobs(self, mock: Mock):
+        mock.return_value.fetchall.return_value = []
+        created_on = datetime.utcnow()
+        jobs.get_all('test-user-id', after=(created_on, 'test-job-id'), limit=10)
+        self.assertEqual((created_on, 'test-job-id'), mock.call_args[1]['after'])
+        self.assertEqual(10, mock.call_args[1]['limit'])
+
+    def test_can_filter_by_status(self, mock: Mock):
+        mock.return_value.fetchall.return_value = []
+        jobs.get_all('test-user-id', statuses=['Running', 'Pending'])
+        self.assertEqual(['Running', 'Pending'], mock.call_args[1]['statuses'])
+
+    def test_throws_on_unknown_status(self, mock: Mock):
+        with self.assertRaises(jobs.InvalidQuery):
+            jobs.get_all('test-user-id', statuses=['lolwut'])
+        self.assertFalse(mock.called)
+
+    def test_can_leave_out_geometries(self, mock: Mock):
+        record = create_job_db_record()
+        record['geometry'] = None
+        mock.return_value.fetchall.return_value = [record]
+        job = jobs.get_all('test-user-id', include_geometry=False).pop()
+        self.assertFalse(mock.call_args[1]['include_geometry'])
+        self.assertIsNone(job.geometry)
 
     def test_can_handle_empty_recordset(self, mock: Mock):
         mock.return_value.fetchall.return_value = []
@@ -528,9 +572,9 @@ class GetAllJobsTest(unittest.TestCase):
             jobs.get_all('test-user-id')
 
 
-@patch('beachfront.db.jobs.select_detections')
+@patch('beachfront.db.jobs.select_detection_features')
 @patch('beachfront.db.jobs.exists', return_value=True)
-class GetDetectionsTest(unittest.TestCase):
+class GetDetectionsStreamTest(unittest.TestCase):
     def setUp(self):
         self._mockdb = helpers.mock_database()
         self.logger = helpers.get_logger('beachfront.services.jobs')
@@ -539,36 +583,121 @@ class GetDetectionsTest(unittest.TestCase):
         self._mockdb.destroy()
         self.logger.destroy()
 
-    def test_returns_a_stringified_feature_collection(self, _, mock_select_detections: Mock):
-        mock_select_detections.return_value.scalar.return_value = '{"type":"FeatureCollection","features":[]}'
-        detections = jobs.get_detections('test-job-id')
-        self.assertEqual('{"type":"FeatureCollection","features":[]}', detections)
-
-    def test_queries_on_correct_jobid(self, mock_exists: Mock, mock_select_detections: Mock):
-        mock_select_detections.return_value.scalar.return_value = '{"type":"FeatureCollection","features":[]}'
-        jobs.get_detections('test-job-id')
+    def test_yields_a_valid_feature_collection(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.side_effect = [
+            [{'feature': '{"id":"a"}'}, {'feature': '{"id":"b"}'}],
+            [{'feature': '{"id":"c"}'}],
+            [],
+        ]
+        stream = jobs.get_detections_stream('test-job-id')
+        self.assertEqual({
+            'type': 'FeatureCollection',
+            'features': [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}],
+        }, json.loads(''.join(stream)))
+
+    def test_yields_a_valid_feature_collection_when_job_has_no_detections(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = []
+        stream = jobs.get_detections_stream('test-job-id')
+        self.assertEqual({'type': 'FeatureCollection', 'features': []}, json.loads(''.join(stream)))
+
+    def test_reads_rows_in_batches(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = []
+        list(jobs.get_detections_stream('test-job-id'))
+        self.assertEqual(call(jobs.DETECTIONS_STREAM_BATCH_SIZE), mock_select.return_value.fetchmany.call_args)
+
+    def test_queries_on_correct_jobid(self, mock_exists: Mock, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = []
+        list(jobs.get_detections_stream('test-job-id'))
         self.assertEqual({'job_id': 'test-job-id'}, mock_exists.call_args[1])
+        self.assertEqual({
+            'job_id': 'test-job-id',
+            'lod': 0,
+            'bbox': None,
+            'after': None,
+            'limit': None,
+            'properties': None,
+        }, mock_select.call_args[1])
+
+    def test_simplifies_geometries_to_requested_resolution(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = []
+        list(jobs.get_detections_stream('test-job-id', resolution=0.005))
+        self.assertEqual(2, mock_select.call_args[1]['lod'])
+
+    def test_passes_filters_to_query(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = []
+        list(jobs.get_detections_stream('test-job-id', bbox=(-10, -5, 10, 5), cursor=42, properties=['name']))
+        self.assertEqual((-10, -5, 10, 5), mock_select.call_args[1]['bbox'])
+        self.assertEqual(42, mock_select.call_args[1]['after'])
+        self.assertEqual(['name'], mock_select.call_args[1]['properties'])
+
+    def test_yields_next_cursor_when_more_detections_remain(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.side_effect = [
+            [{'feature_id': 1, 'feature': '{"id":"a"}'},
+             {'feature_id': 2, 'feature': '{"id":"b"}'},
+             {'feature_id': 3, 'feature': '{"id":"c"}'}],
+            [],
+        ]
+        stream = jobs.get_detections_stream('test-job-id', limit=2)
+        self.assertEqual(3, mock_select.call_args[1]['limit'])
+        self.assertEqual({
+            'type': 'FeatureCollection',
+            'features': [{'id': 'a'}, {'id': 'b'}],
+            'next_cursor': 2,
+        }, json.loads(''.join(stream)))
+
+    def test_yields_next_cursor_when_page_ends_on_batch_boundary(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.side_effect = [
+            [{'feature_id': 1, 'feature': '{"id":"a"}'}, {'feature_id': 2, 'feature': '{"id":"b"}'}],
+            [{'feature_id': 3, 'feature': '{"id":"c"}'}],
+            [],
+        ]
+        stream = jobs.get_detections_stream('test-job-id', limit=2)
+        self.assertEqual(2, json.loads(''.join(stream))['next_cursor'])
 
-    def test_can_handle_big_feature_collections(self, _, mock_select_detections: Mock):
-        some_huge_number = 1024 * 100000
-        mock_select_detections.return_value.scalar.return_value = 'x' * some_huge_number
-        detections = jobs.get_detections('test-job-id')
-        self.assertEqual(some_huge_number, len(detections))
-
-    def test_handles_database_errors_gracefully(self, _, mock_select_detections: Mock):
-        mock_select_detections.side_effect = helpers.create_database_error()
+    def test_omits_next_cursor_on_last_page(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.side_effect = [
+            [{'feature_id': 1, 'feature': '{"id":"a"}'}, {'feature_id': 2, 'feature': '{"id":"b"}'}],
+            [],
+        ]
+        stream = jobs.get_detections_stream('test-job-id', limit=2)
+        self.assertNotIn('next_cursor', json.loads(''.join(stream)))
+
+    def test_throws_on_unknown_property(self, _, mock_select: Mock):
+        with self.assertRaises(jobs.InvalidQuery):
+            jobs.get_detections_stream('test-job-id', properties=['lorem'])
+        self.assertFalse(mock_select.called)
+
+    def test_holds_connection_open_until_stream_is_consumed(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = []
+        stream = jobs.get_detections_stream('test-job-id')
+        self.assertFalse(self._mockdb.close.called)
+        list(stream)
+        self.assertTrue(self._mockdb.close.called)
+
+    def test_closes_connection_when_stream_is_abandoned(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.return_value = [{'feature': '{}'}]
+        stream = jobs.get_detections_stream('test-job-id')
+        next(stream)
+        stream.close()
+        self.assertTrue(self._mockdb.close.called)
+
+    def test_handles_database_errors_gracefully(self, _, mock_select: Mock):
+        mock_select.side_effect = helpers.create_database_error()
         with self.assertRaises(DatabaseError):
-            jobs.get_detections('test-job-id')
+            jobs.get_detections_stream('test-job-id')
+        self.assertTrue(self._mockdb.close.called)
 
-    def test_handles_database_errors_gracefully_during_existence_check(self, mock_exists: Mock, _):
-        mock_exists.side_effect = helpers.create_database_error()
+    def test_handles_database_errors_gracefully_during_streaming(self, _, mock_select: Mock):
+        mock_select.return_value.fetchmany.side_effect = helpers.create_database_error()
         with self.assertRaises(DatabaseError):
-            jobs.get_detections('test-job-id')
+            list(jobs.get_detections_stream('test-job-id'))
+        self.assertTrue(self._mockdb.close.called)
 
     def test_throws_if_job_not_found(self, mock_exists: Mock, _):
         mock_exists.return_value = False
         with self.assertRaises(jobs.NotFound):
-            jobs.get_detections('test-job-id')
+            jobs.get_detections_stream('test-job-id')
+        self.assertTrue(self._mockdb.close.called)
 
 
 @patch('beachfront.db.jobs.insert_job_user')
@@ -791,6 +920,98 @@ class GetByProductlineTest(unittest.TestCase):
             jobs.get_by_productline('test-productline-id', LAST_WEEK)
 
 
+class GetFingerprintTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self.logger = helpers.get_logger('beachfront.services.jobs')
+        self.mock_for_user = self.create_mock('beachfront.db.jobs.select_fingerprint_for_user')
+        self.mock_for_productline = self.create_mock('beachfront.db.jobs.select_fingerprint_for_productline')
+        self.mock_for_scene = self.create_mock('beachfront.db.jobs.select_fingerprint_for_scene')
+
+    def tearDown(self):
+        self._mockdb.destroy()
+        self.logger.destroy()
+
+    def test_returns_fingerprint_for_user(self):
+        self.mock_for_user.return_value.scalar.return_value = '3:test-fingerprint'
+        self.assertEqual('3:test-fingerprint', jobs.get_all_fingerprint('test-user-id'))
+        self.assertEqual({'user_id': 'test-user-id'}, self.mock_for_user.call_args[1])
+
+    def test_returns_fingerprint_for_productline(self):
+        since = datetime.utcnow()
+        self.mock_for_productline.return_value.scalar.return_value = '3:test-fingerprint'
+        self.assertEqual('3:test-fingerprint', jobs.get_by_productline_fingerprint('test-productline-id', since))
+        self.assertEqual({'productline_id': 'test-productline-id', 'since': since}, self.mock_for_productline.call_args[1])
+
+    def test_returns_fingerprint_for_scene(self):
+        self.mock_for_scene.return_value.scalar.return_value = '3:test-fingerprint'
+        self.assertEqual('3:test-fingerprint', jobs.get_by_scene_fingerprint('test-scene-id'))
+        self.assertEqual({'scene_id': 'test-scene-id'}, self.mock_for_scene.call_args[1])
+
+    def test_does_not_load_jobs(self):
+        mock_select_jobs = self.create_mock('beachfront.db.jobs.select_jobs_for_user')
+        jobs.get_all_fingerprint('test-user-id')
+        self.assertFalse(mock_select_jobs.called)
+
+    def test_closes_connection(self):
+        jobs.get_all_fingerprint('test-user-id')
+        self.assertTrue(self._mockdb.close.called)
+
+    def test_throws_on_database_error(self):
+        self.mock_for_user.side_effect = helpers.create_database_error()
+        with self.assertRaises(DatabaseError):
+            jobs.get_all_fingerprint('test-user-id')
+
+
+@patch('beachfront.db.jobs.select_job_status')
+class GetDetectionsFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self.logger = helpers.get_logger('beachfront.services.jobs')
+
+    def tearDown(self):
+        self._mockdb.destroy()
+        self.logger.destroy()
+
+    def test_returns_fingerprint_for_successful_job(self, mock_select: Mock):
+        mock_select.return_value.scalar.return_value = 'Success'
+        self.assertEqual('test-job-id:Success', jobs.get_detections_fingerprint('test-job-id'))
+
+    def test_returns_nothing_until_job_succeeds(self, mock_select: Mock):
+        mock_select.return_value.scalar.return_value = 'Running'
+        self.assertIsNone(jobs.get_detections_fingerprint('test-job-id'))
+
+    def test_returns_nothing_for_unknown_job(self, mock_select: Mock):
+        mock_select.return_value.scalar.return_value = None
+        self.assertIsNone(jobs.get_detections_fingerprint('test-job-id'))
+
+
+@patch('beachfront.db.jobs.select_current_timestamp')
+class GetChangesCursorTest(unittest.TestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self.logger = helpers.get_logger('beachfront.services.jobs')
+
+    def tearDown(self):
+        self._mockdb.destroy()
+        self.logger.destroy()
+
+    def test_overlaps_previous_cursor(self, mock: Mock):
+        now = datetime.utcnow()
+        mock.return_value.scalar.return_value = now
+        self.assertEqual(now - jobs.CHANGES_CURSOR_OVERLAP, jobs.get_changes_cursor())
+
+    def test_closes_connection(self, mock: Mock):
+        mock.return_value.scalar.return_value = datetime.utcnow()
+        jobs.get_changes_cursor()
+        self.assertTrue(self._mockdb.close.called)
+
+    def test_throws_on_database_error(self, mock: Mock):
+        mock.side_effect = helpers.create_database_error()
+        with self.assertRaises(DatabaseError):
+            jobs.get_changes_cursor()
+
+
 @patch('beachfront.db.jobs.select_jobs_for_scene')
 class GetBySceneTest(unittest.TestCase):
     def setUp(self):
@@ -932,7 +1153,11 @@ class StartWorkerTest(unittest.TestCase):
             job_ttl=timedelta(12),
             interval=timedelta(34),
         )
-        self.assertEqual((timedelta(12), timedelta(34)), mock.call_args[0])
+        self.assertEqual((timedelta(12), timedelta(34)), mock.call_args[0][0:2])
+
+    def test_passes_concurrency_to_worker(self, mock: Mock):
+        jobs.start_worker(concurrency=42)
+        self.assertEqual(42, mock.call_args[0][2])
 
     def test_throws_if_worker_already_exists(self, _):
         jobs.start_worker()
@@ -977,13 +1202,28 @@ class WorkerRunTest(unittest.TestCase):
         self._logger_for_module.disabled = True
 
         self.mock_sleep = self.create_mock('time.sleep')
-        self.mock_thread = self.create_mock('threading.Thread')
+        self.mock_time = self.create_mock('time.time')
+        self.mock_time.return_value = 1400000000.0
         self.mock_getfile = self.create_mock('beachfront.services.piazza.get_file')
+        self.mock_streamfile = self.create_mock('beachfront.services.piazza.stream_file')
         self.mock_getstatus = self.create_mock('beachfront.services.piazza.get_status')
         self.mock_insert_detections = self.create_mock('beachfront.db.jobs.insert_detection')
-        self.mock_select_jobs = self.create_mock('beachfront.db.jobs.select_outstanding_jobs')
+        self.mock_claim_ingestion = self.create_mock('beachfront.db.jobs.claim_ingestion')
+        self.mock_claim_ingestion.return_value = True
+        self.mock_holds_lock = self.create_mock('beachfront.db.locks.holds_advisory_lock')
+        self.mock_holds_lock.return_value = True
+        self.mock_try_lock = self.create_mock('beachfront.db.locks.try_advisory_lock')
+        self.mock_try_lock.return_value = True
+        self.mock_unlock = self.create_mock('beachfront.db.locks.advisory_unlock')
+        self.mock_select_jobs = self.create_mock('beachfront.db.jobs.claim_outstanding_jobs')
+        self.mock_renew_claims = self.create_mock('beachfront.db.jobs.renew_claims')
+        self.mock_select_leases = self.create_mock('beachfront.db.jobs.select_claim_leases')
+        self.mock_select_leases.return_value.fetchall.return_value = []
+        self.mock_uniform = self.create_mock('random.uniform')
+        self.mock_uniform.side_effect = lambda a, b: (a + b) / 2
         self.mock_select_jobs.return_value.fetchall.return_value = []
         self.mock_update_status = self.create_mock('beachfront.db.jobs.update_status')
+        self.mock_update_statuses = self.create_mock('beachfront.db.jobs.update_statuses')
         self.mock_insert_job_failure = self.create_mock('beachfront.db.jobs.insert_job_failure')
 
     def tearDown(self):
@@ -1010,7 +1250,209 @@ class WorkerRunTest(unittest.TestCase):
     def test_closes_database_connection_after_each_cycle(self):
         worker = self.create_worker(max_cycles=13)
         worker.run()
-        self.assertEqual(13, self._mockdb.close.call_count)
+        self.assertEqual(13 + 1, self._mockdb.close.call_count)  # plus the connection holding the worker lock
+
+    def test_keeps_lock_connection_out_of_pool(self):
+        worker = self.create_worker(max_cycles=3)
+        worker.run()
+        self.assertEqual(1, self._mockdb.detach.call_count)
+
+    def test_returns_contending_connection_to_pool_without_worker_lock(self):
+        self.mock_try_lock.return_value = False
+        worker = self.create_worker()
+        worker.run()
+        self.assertFalse(self._mockdb.detach.called)
+
+    def test_does_not_poll_without_worker_lock(self):
+        self.mock_try_lock.return_value = False
+        worker = self.create_worker()
+        worker.run()
+        self.assertFalse(self.mock_select_jobs.called)
+
+    def test_logs_standing_by_only_once(self):
+        self.mock_try_lock.return_value = False
+        worker = self.create_worker(max_cycles=3)
+        worker.run()
+        self.assertEqual([
+            'INFO - Standing by; another instance holds the worker lock',
+            'INFO - Stopped',
+        ], self.logger.lines)
+
+    def test_takes_over_when_worker_lock_becomes_available(self):
+        self.mock_try_lock.side_effect = [False, True]
+        worker = self.create_worker(max_cycles=2)
+        worker.run()
+        self.assertEqual(1, self.mock_select_jobs.call_count)
+
+    def test_keeps_worker_lock_between_cycles(self):
+        worker = self.create_worker(max_cycles=3)
+        worker.run()
+        self.assertEqual(1, self.mock_try_lock.call_count)
+        self.assertEqual(2, self.mock_holds_lock.call_count)
+        self.assertEqual(3, self.mock_select_jobs.call_count)
+
+    def test_contends_again_when_worker_lock_is_lost(self):
+        self.mock_holds_lock.return_value = False
+        self.mock_try_lock.side_effect = [True, False]
+        worker = self.create_worker(max_cycles=2)
+        worker.run()
+        self.assertEqual(2, self.mock_try_lock.call_count)
+        self.assertEqual(1, self.mock_select_jobs.call_count)
+
+    def test_contends_again_when_lock_connection_fails(self):
+        self.mock_holds_lock.side_effect = helpers.create_database_error()
+        worker = self.create_worker(max_cycles=2)
+        worker.run()
+        self.assertEqual(2, self.mock_try_lock.call_count)
+        self.assertEqual(2, self.mock_select_jobs.call_count)
+
+    def test_takes_any_free_poller_slot(self):
+        self.mock_try_lock.side_effect = [False, True]
+        with patch('beachfront.services.jobs.JOB_WORKER_POLLERS', 3):
+            worker = self.create_worker()
+        worker.run()
+        self.assertEqual([jobs.WORKER_LOCK_KEY, jobs.WORKER_LOCK_KEY + 1],
+                         [c[1]['key'] for c in self.mock_try_lock.call_args_list])
+        self.assertEqual(1, self.mock_select_jobs.call_count)
+
+    def test_claims_jobs_for_itself(self):
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual(worker.worker_id, self.mock_select_jobs.call_args[1]['worker_id'])
+        self.assertEqual(jobs.JOB_WORKER_CLAIM_TTL, self.mock_select_jobs.call_args[1]['lease'])
+
+    def test_renews_claims_for_next_poll_after_cycle(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual([call(self._mockdb, worker_id=worker.worker_id, leases={'test-job-id': timedelta(seconds=60)})],
+                         self.mock_renew_claims.call_args_list)
+
+    def test_does_not_renew_claims_for_jobs_that_finished(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_CANCELLED)
+        worker = self.create_worker()
+        worker.run()
+        self.assertFalse(self.mock_renew_claims.called)
+
+    def test_polls_newly_running_jobs_sooner(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(status='Pending')]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual({'test-job-id': jobs.JOB_WORKER_FAST_INTERVAL}, self.mock_renew_claims.call_args[1]['leases'])
+        self.assertEqual(call(15), self.mock_sleep.call_args)
+
+    def test_backs_off_jobs_stuck_in_queue(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1', age=timedelta(minutes=5), status='Submitted'),
+            create_job_db_summary('test-job-2', age=timedelta(minutes=35), status='Submitted'),
+            create_job_db_summary('test-job-3', age=ONE_WEEK, status='Submitted'),
+        ]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUBMITTED)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual({
+            'test-job-1': timedelta(seconds=60),
+            'test-job-2': timedelta(seconds=240),
+            'test-job-3': jobs.JOB_WORKER_MAX_INTERVAL,
+        }, self.mock_renew_claims.call_args[1]['leases'])
+
+    def test_falls_back_to_interval_when_poll_fails(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(status='Pending')]
+        self.mock_getstatus.side_effect = piazza.ServerError(500)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual({'test-job-id': timedelta(seconds=60)}, self.mock_renew_claims.call_args[1]['leases'])
+
+    def test_jitters_next_poll(self):
+        self.mock_uniform.side_effect = None
+        self.mock_uniform.return_value = 1.1
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual(call(1 - jobs.JOB_WORKER_JITTER, 1 + jobs.JOB_WORKER_JITTER), self.mock_uniform.call_args)
+        self.assertEqual({'test-job-id': timedelta(seconds=66)}, self.mock_renew_claims.call_args[1]['leases'])
+
+    def test_does_not_oversleep_scheduled_polls(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=timedelta(minutes=20))]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual(call(30), self.mock_sleep.call_args)
+
+    def test_backs_off_running_jobs_from_when_they_started_running(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1', age=ONE_WEEK, status_age=timedelta(minutes=5)),
+            create_job_db_summary('test-job-2', age=ONE_WEEK, status_age=timedelta(minutes=15)),
+        ]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual({
+            'test-job-1': jobs.JOB_WORKER_FAST_INTERVAL,
+            'test-job-2': jobs.JOB_WORKER_FAST_INTERVAL * 2,
+        }, self.mock_renew_claims.call_args[1]['leases'])
+
+    def test_requeues_due_polls_that_could_not_be_claimed(self):
+        self.mock_sleep.side_effect = lambda seconds: setattr(self.mock_time, 'return_value',
+                                                              self.mock_time.return_value + seconds)
+        self.mock_select_jobs.return_value.fetchall.side_effect = [[create_job_db_summary(age=timedelta(minutes=1))], []]
+        self.mock_select_leases.return_value.fetchall.return_value = [{'job_id': 'test-job-id', 'remaining': 5.0}]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(max_cycles=2, interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual(call(self._mockdb, worker_id=worker.worker_id, job_ids=['test-job-id']),
+                         self.mock_select_leases.call_args)
+        self.assertEqual([call(15), call(5)], self.mock_sleep.call_args_list)
+
+    def test_does_not_requeue_due_polls_that_were_claimed(self):
+        self.mock_sleep.side_effect = lambda seconds: setattr(self.mock_time, 'return_value',
+                                                              self.mock_time.return_value + seconds)
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=timedelta(minutes=1))]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(max_cycles=2, interval=timedelta(seconds=60))
+        worker.run()
+        self.assertFalse(self.mock_select_leases.called)
+
+    def test_waits_for_next_run_when_due_polls_cannot_be_requeued(self):
+        self.mock_sleep.side_effect = lambda seconds: setattr(self.mock_time, 'return_value',
+                                                              self.mock_time.return_value + seconds)
+        self.mock_select_jobs.return_value.fetchall.side_effect = [[create_job_db_summary(age=timedelta(minutes=1))], []]
+        self.mock_select_leases.side_effect = helpers.create_database_error()
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = self.create_worker(max_cycles=2, interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual([call(15), call(60)], self.mock_sleep.call_args_list)
+
+    def test_does_not_schedule_polls_when_claims_cannot_be_renewed(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(status='Pending')]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        self.mock_renew_claims.side_effect = helpers.create_database_error()
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker.run()
+        self.assertEqual(call(60), self.mock_sleep.call_args)
+
+    def test_renews_claims_when_cycle_fails(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(status='Pending')]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        self.mock_update_statuses.side_effect = helpers.create_database_error()
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual(1, self.mock_renew_claims.call_count)
+
+    def test_does_not_renew_claims_when_nothing_was_claimed(self):
+        worker = self.create_worker()
+        worker.run()
+        self.assertFalse(self.mock_renew_claims.called)
+
+    def test_releases_worker_lock_when_stopped(self):
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual(1, self.mock_unlock.call_count)
+        self.assertEqual(jobs.WORKER_LOCK_KEY, self.mock_unlock.call_args[1]['key'])
 
     def test_runs_first_cycle_immediately(self):
         worker = self.create_worker()
@@ -1033,6 +1475,7 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Nothing to do; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1043,8 +1486,10 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Error; age=7 days, 12:34:56)',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1056,56 +1501,73 @@ class WorkerRunTest(unittest.TestCase):
 
         worker = self.create_worker()
         worker.run()
+
+        # Ingestion runs alongside polling, so its lines may interleave with the cycle's
+        ingestion_lines = [l for l in self.logger.lines if 'detections' in l]
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Success; age=7 days, 12:34:56)',
-            'INFO - <001/test-job-id> Resolving detections data ID (via <test-execution-output-id>)',
-            'ERROR - <001/test-job-id> Could not resolve detections data ID: during postprocessing, could not fetch execution output: Piazza server error (HTTP 404)',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
-        ], self.logger.lines)
+        ], [l for l in self.logger.lines if l not in ingestion_lines])
+        self.assertEqual([
+            'INFO - <001/test-job-id> Resolving detections data ID (via <test-execution-output-id>)',
+            'ERROR - <001/test-job-id> Could not resolve detections data ID: during postprocessing, could not fetch execution output: Piazza server error (HTTP 404)',
+        ], ingestion_lines)
 
     def test_logs_jobs_failing_during_geometry_retrieval(self):
-        def getfile(id_):
-            if id_ == 'test-execution-output-id':
-                return Mock(json=lambda: create_execution_output())
-            raise piazza.ServerError(404)
-
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=ONE_WEEK)]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
-        self.mock_getfile.side_effect = getfile
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.side_effect = piazza.ServerError(404)
 
         worker = self.create_worker()
         worker.run()
+
+        # Ingestion runs alongside polling, so its lines may interleave with the cycle's
+        ingestion_lines = [l for l in self.logger.lines if 'detections' in l]
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Success; age=7 days, 12:34:56)',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
+            'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
+            'INFO - Stopped',
+        ], [l for l in self.logger.lines if l not in ingestion_lines])
+        self.assertEqual([
             'INFO - <001/test-job-id> Resolving detections data ID (via <test-execution-output-id>)',
             'INFO - <001/test-job-id> Fetching detections from Piazza',
             'ERROR - <001/test-job-id> Could not fetch data ID <test-detections-id>: Piazza server error (HTTP 404)',
-            'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
-            'INFO - Stopped',
-        ], self.logger.lines)
+        ], ingestion_lines)
 
     def test_logs_jobs_failing_during_geometry_insertion(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=ONE_WEEK)]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
         self.mock_getfile.return_value.json.return_value = create_execution_output()
-        self.mock_getfile.return_value.text = 'lorem ipsum'
+        self.mock_streamfile.return_value = [b'lorem ipsum']
         self.mock_insert_detections.side_effect = helpers.create_database_error()
 
         worker = self.create_worker()
         worker.run()
+
+        # Ingestion runs alongside polling, so its lines may interleave with the cycle's
+        ingestion_lines = [l for l in self.logger.lines if 'detections' in l]
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Success; age=7 days, 12:34:56)',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
+            'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
+            'INFO - Stopped',
+        ], [l for l in self.logger.lines if l not in ingestion_lines])
+        self.assertEqual([
             'INFO - <001/test-job-id> Resolving detections data ID (via <test-execution-output-id>)',
             'INFO - <001/test-job-id> Fetching detections from Piazza',
-            'INFO - <001/test-job-id> Saving detections to database (0.0MB)',
+            'INFO - <001/test-job-id> Streaming detections to database',
             'ERROR - <001/test-job-id> Could not save status and detections to database',
-            'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
-            'INFO - Stopped',
-        ], self.logger.lines)
+        ], ingestion_lines)
 
     def test_logs_jobs_that_are_still_running(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=timedelta(minutes=20))]
@@ -1113,9 +1575,11 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Running; age=0:20:00)',
-            'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
+            'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow() + timedelta(seconds=30)),
             'INFO - Stopped',
         ], self.logger.lines)
 
@@ -1123,18 +1587,27 @@ class WorkerRunTest(unittest.TestCase):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
         self.mock_getfile.return_value.json.return_value = create_execution_output()
-        self.mock_getfile.return_value.text = 'X' * 2048000
+        self.mock_streamfile.return_value = [b'X' * 2048000]
+        self.mock_insert_detections.side_effect = lambda _, **kwargs: len(list(kwargs['feature_collection']))
         worker = self.create_worker()
         worker.run()
+
+        # Ingestion runs alongside polling, so its lines may interleave with the cycle's
+        ingestion_lines = [l for l in self.logger.lines if 'detections' in l]
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Success; age=7 days, 12:34:56)',
-            'INFO - <001/test-job-id> Resolving detections data ID (via <test-execution-output-id>)',
-            'INFO - <001/test-job-id> Fetching detections from Piazza',
-            'INFO - <001/test-job-id> Saving detections to database (2.0MB)',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
-        ], self.logger.lines)
+        ], [l for l in self.logger.lines if l not in ingestion_lines])
+        self.assertEqual([
+            'INFO - <001/test-job-id> Resolving detections data ID (via <test-execution-output-id>)',
+            'INFO - <001/test-job-id> Fetching detections from Piazza',
+            'INFO - <001/test-job-id> Streaming detections to database',
+            'INFO - <001/test-job-id> Saved detections (2.0MB)',
+        ], ingestion_lines)
 
     def test_logs_jobs_that_time_out(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=ONE_WEEK)]
@@ -1142,9 +1615,11 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Running; age=7 days, 12:34:56)',
             'WARNING - <001/test-job-id> appears to have stalled and will no longer be tracked',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1155,8 +1630,10 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'ERROR - <001/test-job-id> call to Piazza failed: Piazza server error (HTTP 500)',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1167,8 +1644,10 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'ERROR - <001/test-job-id> call to Piazza failed: invalid Piazza response: test-error',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1179,8 +1658,10 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'ERROR - <001/test-job-id> credentials rejected during polling!',
+            'INFO - Polled 1 jobs in 0.0s; slowest lookup was <test-job-id> (0.0s)',
             'INFO - Cycle complete; next run at {:%TZ}'.format(datetime.utcnow()),
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1190,6 +1671,7 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'ERROR - Could not list running jobs',
             "WARNING - Recovered from failure (attempt 1 of 3); DatabaseError: (builtins.Exception) test-error [SQL: 'test-query']",
             'INFO - Stopped',
@@ -1198,12 +1680,14 @@ class WorkerRunTest(unittest.TestCase):
     def test_report_error_and_retry_when_database_throws_during_update(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_CANCELLED)
-        self.mock_update_status.side_effect = helpers.create_database_error()
+        self.mock_update_statuses.side_effect = helpers.create_database_error()
         worker = self.create_worker()
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'INFO - Begin cycle for 1 records',
             'INFO - <001/test-job-id> polled (Cancelled; age=7 days, 12:34:56)',
+            'ERROR - Could not save 1 status changes to database',
             "WARNING - Recovered from failure (attempt 1 of 3); DatabaseError: (builtins.Exception) test-error [SQL: 'test-query']",
             'INFO - Stopped',
         ], self.logger.lines)
@@ -1213,6 +1697,7 @@ class WorkerRunTest(unittest.TestCase):
         worker = self.create_worker(max_cycles=4)
         worker.run()
         self.assertEqual([
+            'INFO - Acquired worker lock; this instance will poll jobs',
             'ERROR - Could not list running jobs',
             "WARNING - Recovered from failure (attempt 1 of 3); DatabaseError: (builtins.Exception) test-error [SQL: 'test-query']",
             'ERROR - Could not list running jobs',
@@ -1224,7 +1709,7 @@ class WorkerRunTest(unittest.TestCase):
 
             # Start stack trace truncation
             'Traceback (most recent call last):',
-        ], self.logger.lines[0:9])
+        ], self.logger.lines[0:10])
         self.assertEqual([
             "sqlalchemy.exc.DatabaseError: (builtins.Exception) test-error [SQL: 'test-query']",
             # End stack trace truncation
@@ -1237,19 +1722,66 @@ class WorkerRunTest(unittest.TestCase):
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_ERROR)
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error')],
-                         self.mock_update_status.call_args_list)
+        self.assertEqual([call(self._mockdb, statuses={'test-job-id': 'Error'})],
+                         self.mock_update_statuses.call_args_list)
         self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_ALGORITHM,
                                error_message='Job failed during algorithm execution')],
                          self.mock_insert_job_failure.call_args_list)
 
+    def test_saves_status_changes_in_one_batch(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1', age=timedelta(minutes=20), status='Submitted'),
+            create_job_db_summary('test-job-2', age=timedelta(minutes=20), status='Pending'),
+            create_job_db_summary('test-job-3', age=timedelta(minutes=20), status='Running'),
+        ]
+        self.mock_getstatus.side_effect = [
+            piazza.Status(piazza.STATUS_PENDING),
+            piazza.Status(piazza.STATUS_RUNNING),
+            piazza.Status(piazza.STATUS_FAIL),
+        ]
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1), concurrency=1)
+        worker._run_cycle()
+        self.assertEqual([call(self._mockdb, statuses={
+            'test-job-1': 'Pending',
+            'test-job-2': 'Running',
+            'test-job-3': 'Error',
+        })], self.mock_update_statuses.call_args_list)
+        self.assertEqual([call(self._mockdb, job_id='test-job-3', execution_step=jobs.STEP_ALGORITHM,
+                               error_message='Job failed during algorithm execution')],
+                         self.mock_insert_job_failure.call_args_list)
+        self.assertFalse(self.mock_update_status.called)
+
+    def test_does_not_rewrite_unchanged_statuses(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1', age=timedelta(minutes=20), status='Pending'),
+            create_job_db_summary('test-job-2', age=timedelta(minutes=20), status='Running'),
+        ]
+        self.mock_getstatus.side_effect = lambda job_id: piazza.Status({
+            'test-job-1': piazza.STATUS_PENDING,
+            'test-job-2': piazza.STATUS_RUNNING,
+        }[job_id])
+        worker = self.create_worker()
+        worker.run()
+        self.assertFalse(self.mock_update_statuses.called)
+
+    def test_saves_status_changes_in_one_transaction(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1'),
+            create_job_db_summary('test-job-2'),
+        ]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_CANCELLED)
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual(1, len(self._mockdb.transactions))
+        self.assertEqual(1, self._mockdb.transactions[0].commit.call_count)
+
     def test_updates_status_for_job_timing_out_while_queued(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary(age=ONE_WEEK)]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUBMITTED)
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Timed Out')],
-                         self.mock_update_status.call_args_list)
+        self.assertEqual([call(self._mockdb, statuses={'test-job-id': 'Timed Out'})],
+                         self.mock_update_statuses.call_args_list)
         self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_QUEUED,
                                error_message='Submission wait time exceeded')],
                          self.mock_insert_job_failure.call_args_list)
@@ -1259,8 +1791,8 @@ class WorkerRunTest(unittest.TestCase):
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Timed Out')],
-                         self.mock_update_status.call_args_list)
+        self.assertEqual([call(self._mockdb, statuses={'test-job-id': 'Timed Out'})],
+                         self.mock_update_statuses.call_args_list)
         self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_PROCESSING,
                                error_message='Processing time exceeded')],
                          self.mock_insert_job_failure.call_args_list)
@@ -1272,25 +1804,43 @@ class WorkerRunTest(unittest.TestCase):
 
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error')],
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
                          self.mock_update_status.call_args_list)
         self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_RESOLVE,
                                error_message='during postprocessing, could not fetch execution output: Piazza server error (HTTP 500)')],
                          self.mock_insert_job_failure.call_args_list)
 
     def test_updates_status_for_job_failing_during_geometry_retrieval(self):
-        def getfile(id_):
-            if id_ == 'test-execution-output-id':
-                return Mock(json=lambda: create_execution_output())
-            raise piazza.ServerError(404)
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.side_effect = piazza.ServerError(404)
+
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
+                         self.mock_update_status.call_args_list)
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_COLLECT_GEOJSON,
+                               error_message='Could not retrieve GeoJSON from Piazza')],
+                         self.mock_insert_job_failure.call_args_list)
+
+    def test_updates_status_for_job_losing_connection_during_geometry_retrieval(self):
+        def streamfile(_):
+            yield b'{"features": ['
+            raise piazza.Unreachable()
 
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
-        self.mock_getfile.side_effect = getfile
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.side_effect = streamfile
+        self.mock_insert_detections.side_effect = lambda _, **kwargs: list(kwargs['feature_collection'])
 
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error')],
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
                          self.mock_update_status.call_args_list)
         self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_COLLECT_GEOJSON,
                                error_message='Could not retrieve GeoJSON from Piazza')],
@@ -1300,30 +1850,69 @@ class WorkerRunTest(unittest.TestCase):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
         self.mock_getfile.return_value.json.return_value = create_execution_output()
-        self.mock_getfile.return_value.text = 'lorem ipsum'
+        self.mock_streamfile.return_value = [b'lorem ipsum']
         self.mock_insert_detections.side_effect = helpers.create_database_error()
 
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error')],
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
                          self.mock_update_status.call_args_list)
         self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_COLLECT_GEOJSON,
                                error_message='Could not insert GeoJSON to database')],
                          self.mock_insert_job_failure.call_args_list)
 
+    def test_updates_status_for_job_failing_during_geometry_parsing(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.return_value = [b'lorem ipsum']
+        self.mock_insert_detections.side_effect = ValueError('test-error')
+
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
+                         self.mock_update_status.call_args_list)
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', execution_step=jobs.STEP_COLLECT_GEOJSON,
+                               error_message='Could not parse GeoJSON from Piazza')],
+                         self.mock_insert_job_failure.call_args_list)
+
     def test_updates_status_for_successful_job(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
         self.mock_getfile.return_value.json.return_value = create_execution_output()
-        self.mock_getfile.return_value.text = 'test-feature-collection'
+        self.mock_streamfile.return_value = [b'test-feature-collection']
+
+        self.mock_insert_detections.side_effect = lambda _, **kwargs: inserted.append(b''.join(kwargs['feature_collection']))
+        inserted = []
 
         worker = self.create_worker()
         worker.run()
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', feature_collection='test-feature-collection')],
-                         self.mock_insert_detections.call_args_list)
-        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Success')],
+        self.assertEqual([b'test-feature-collection'], inserted)
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Success',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
                          self.mock_update_status.call_args_list)
 
+    def test_marks_job_successful_after_saving_detections(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.return_value = [b'test-feature-collection']
+        steps = []
+        self.mock_insert_detections.side_effect = lambda *_, **__: steps.append('insert_detection')
+
+        def update_status(*_, **__):
+            steps.append('update_status' if not self._mockdb.transactions[-1].commit.called else 'update_status after commit')
+            return 1
+        self.mock_update_status.side_effect = update_status
+
+        worker = self.create_worker()
+        worker.run()
+        # Stamped last, so `updated_on` is as close as possible to when the change becomes visible
+        self.assertEqual(['insert_detection', 'update_status'], steps)
+        self.assertTrue(self._mockdb.transactions[-1].commit.called)
+
     def test_can_handle_multi_record_cycles(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [
             create_job_db_summary('test-job-1'),
@@ -1333,16 +1922,264 @@ class WorkerRunTest(unittest.TestCase):
         ]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
         self.mock_getfile.return_value.json.return_value = create_execution_output()
-        self.mock_getfile.return_value.text = 'test-feature-collection'
+        self.mock_streamfile.return_value = [b'test-feature-collection']
 
         worker = self.create_worker()
         worker.run()
         self.assertEqual(1, self.mock_select_jobs.call_count)
         self.assertEqual(4, self.mock_getstatus.call_count)
-        self.assertEqual(8, self.mock_getfile.call_count)
+        self.assertEqual(4, self.mock_getfile.call_count)
+        self.assertEqual(4, self.mock_streamfile.call_count)
         self.assertEqual(4, self.mock_insert_detections.call_count)
         self.assertEqual(4, self.mock_update_status.call_count)
 
+    def test_looks_up_statuses_in_one_batch(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1'),
+            create_job_db_summary('test-job-2'),
+            create_job_db_summary('test-job-3'),
+        ]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        with patch('beachfront.services.piazza.get_statuses', wraps=piazza.get_statuses) as mock_getstatuses:
+            worker = self.create_worker()
+            worker.run()
+        self.assertEqual([call(['test-job-1', 'test-job-2', 'test-job-3'], concurrency=jobs.JOB_WORKER_CONCURRENCY,
+                               durations=unittest.mock.ANY)], mock_getstatuses.call_args_list)
+        self.assertEqual(3, self.mock_getstatus.call_count)
+
+    def test_bounds_concurrent_lookups(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1'),
+            create_job_db_summary('test-job-2'),
+            create_job_db_summary('test-job-3'),
+        ]
+        barrier = threading.Barrier(3, timeout=5)
+
+        def getstatus(_):
+            barrier.wait()  # Deadlocks unless all three lookups are in flight at once
+            return piazza.Status(piazza.STATUS_RUNNING)
+
+        self.mock_getstatus.side_effect = getstatus
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1), concurrency=3)
+        with patch('beachfront.services.piazza.get_statuses', wraps=piazza.get_statuses) as mock_getstatuses:
+            worker._run_cycle()
+        self.assertEqual(3, mock_getstatuses.call_args[1]['concurrency'])
+        self.assertEqual(3, self.mock_getstatus.call_count)
+        self.assertFalse(barrier.broken)
+
+    def test_ingests_detections_without_holding_up_polling(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1', age=timedelta(minutes=20)),
+            create_job_db_summary('test-job-2', age=timedelta(minutes=20), status='Pending'),
+        ]
+        released = threading.Event()
+
+        def getstatus(job_id):
+            if job_id == 'test-job-1':
+                return piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+            return piazza.Status(piazza.STATUS_RUNNING)
+
+        def streamfile(_):
+            released.wait(5)
+            return [b'test-feature-collection']
+
+        self.mock_getstatus.side_effect = getstatus
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.side_effect = streamfile
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1))
+        worker._run_cycle()
+        self.assertEqual([call(self._mockdb, statuses={'test-job-2': 'Running'})],
+                         self.mock_update_statuses.call_args_list)
+        self.assertEqual(1, worker.stats()['ingestion']['queue_depth'])
+
+        released.set()
+        worker._ingest_pool.shutdown(wait=True)
+        self.assertEqual(1, self.mock_insert_detections.call_count)
+        self.assertEqual(0, worker.stats()['ingestion']['queue_depth'])
+
+    def test_defers_ingestion_when_queue_is_full(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        worker = self.create_worker(interval=timedelta(seconds=60))
+        worker._ingesting = {'test-other-job-{}'.format(i)
+                             for i in range(jobs.JOB_WORKER_INGEST_CONCURRENCY + jobs.JOB_WORKER_INGEST_QUEUE_SIZE)}
+        worker.run()
+        self.assertFalse(self.mock_getfile.called)
+        self.assertEqual({'test-job-id': timedelta(seconds=60)}, self.mock_renew_claims.call_args_list[0][1]['leases'])
+        self.assertIn('WARNING - <001/test-job-id> Ingestion queue is full; will retry on next poll', self.logger.lines)
+
+    def test_does_not_ingest_a_job_twice(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        worker = self.create_worker()
+        worker._ingesting = {'test-job-id'}
+        worker.run()
+        self.assertFalse(self.mock_getfile.called)
+        self.assertEqual([{'test-job-id': jobs.JOB_WORKER_CLAIM_TTL}],
+                         [c[1]['leases'] for c in self.mock_renew_claims.call_args_list])
+
+    def test_renews_claims_on_jobs_being_ingested(self):
+        worker = self.create_worker()
+        worker._ingesting = {'test-job-1', 'test-job-2'}
+        worker.run()
+        self.assertEqual([call(self._mockdb, worker_id=worker.worker_id,
+                               leases={'test-job-1': jobs.JOB_WORKER_CLAIM_TTL, 'test-job-2': jobs.JOB_WORKER_CLAIM_TTL})],
+                         self.mock_renew_claims.call_args_list)
+
+    def test_claims_job_before_ingesting(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', worker_id=worker.worker_id,
+                               lease=jobs.JOB_WORKER_CLAIM_TTL)],
+                         self.mock_claim_ingestion.call_args_list)
+        self.assertTrue(self.mock_insert_detections.called)
+
+    def test_skips_ingestion_when_job_cannot_be_claimed(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_claim_ingestion.return_value = False
+        worker = self.create_worker()
+        worker.run()
+        self.assertFalse(self.mock_getfile.called)
+        self.assertFalse(self.mock_insert_detections.called)
+        self.assertFalse(self.mock_update_status.called)
+
+    def test_discards_detections_when_job_finished_meanwhile(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_update_status.return_value = 0
+        worker = self.create_worker()
+        worker.run()
+        self.assertTrue(self.mock_insert_detections.called)
+        self.assertFalse(self._mockdb.transactions[-1].commit.called)
+        self.assertTrue(self._mockdb.transactions[-1].rollback.called)
+
+    def test_does_not_overwrite_finished_job_with_ingestion_error(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id')
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_insert_detections.side_effect = helpers.create_database_error()
+        self.mock_update_status.return_value = 0
+        worker = self.create_worker()
+        worker.run()
+        self.assertEqual([call(self._mockdb, job_id='test-job-id', status='Error',
+                               from_statuses=('Submitted', 'Pending', 'Running'))],
+                         self.mock_update_status.call_args_list)
+        self.assertFalse(self.mock_insert_job_failure.called)
+
+    def test_reports_metrics_for_each_stage(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1'),
+            create_job_db_summary('test-job-2'),
+            create_job_db_summary('test-job-3'),
+        ]
+        self.mock_getstatus.side_effect = [
+            piazza.Status(piazza.STATUS_SUCCESS, data_id='test-execution-output-id'),
+            piazza.Status(piazza.STATUS_RUNNING),
+            piazza.ServerError(500),
+        ]
+        self.mock_getfile.return_value.json.return_value = create_execution_output()
+        self.mock_streamfile.return_value = [b'test-feature-collection']
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1), concurrency=1)
+        worker._run_cycle()
+        worker._ingest_pool.shutdown(wait=True)
+        stats = worker.stats()
+        self.assertEqual((0, 2, 1), (stats['polling']['queue_depth'],
+                                     stats['polling']['completed'],
+                                     stats['polling']['failed']))
+        self.assertEqual((0, 1, 0), (stats['ingestion']['queue_depth'],
+                                     stats['ingestion']['completed'],
+                                     stats['ingestion']['failed']))
+        self.assertGreater(stats['ingestion']['throughput'], 0)
+
+    def test_does_not_count_jobs_as_queued_when_lookups_fail(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1))
+        with patch('beachfront.services.piazza.get_statuses', side_effect=RuntimeError('test-error')):
+            with self.assertRaises(RuntimeError):
+                worker._run_cycle()
+        self.assertEqual(0, worker.stats()['polling']['queue_depth'])
+
+    def test_does_not_count_jobs_as_queued_when_cycle_fails_midway(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1'),
+            create_job_db_summary('test-job-2'),
+            create_job_db_summary('test-job-3'),
+        ]
+        self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1))
+        worker._updater = Mock(side_effect=[piazza.STATUS_RUNNING, RuntimeError('test-error')])
+        with self.assertRaises(RuntimeError):
+            worker._run_cycle()
+        stats = worker.stats()['polling']
+        self.assertEqual((0, 1, 1), (stats['queue_depth'], stats['completed'], stats['failed']))
+
+    def test_logs_stats_periodically(self):
+        stats_logger = helpers.get_logger('beachfront.services.jobs.stats')
+        self.addCleanup(stats_logger.destroy)
+        clock = {'now': 1400000000.0}
+        self.mock_time.side_effect = lambda: clock['now']
+        self.mock_sleep.side_effect = lambda seconds: clock.update(now=clock['now'] + seconds)
+        worker = self.create_worker(max_cycles=3)
+        worker._seconds_until_next_poll = lambda: jobs.JOB_WORKER_STATS_INTERVAL.total_seconds() * 0.6
+        worker.run()
+        self.assertEqual(2, len(stats_logger.lines))
+        self.assertTrue(stats_logger.lines[0].startswith('INFO - Stats: {'))
+
+    def test_logs_wms_stats_alongside_worker_stats(self):
+        stats_logger = helpers.get_logger('beachfront.services.jobs.stats')
+        self.addCleanup(stats_logger.destroy)
+        self.create_mock('beachfront.services.geoserver.get_wms_stats').return_value = {'upstream_requests': 5}
+        worker = self.create_worker()
+        worker.run()
+        stats = json.loads(stats_logger.lines[0].partition('Stats: ')[2])
+        self.assertEqual({'upstream_requests': 5}, stats['wms'])
+
+    def test_logs_algorithm_cache_stats_alongside_worker_stats(self):
+        stats_logger = helpers.get_logger('beachfront.services.jobs.stats')
+        self.addCleanup(stats_logger.destroy)
+        self.create_mock('beachfront.services.algorithms.get_cache_stats').return_value = {'hits': 3}
+        worker = self.create_worker()
+        worker.run()
+        stats = json.loads(stats_logger.lines[0].partition('Stats: ')[2])
+        self.assertEqual({'hits': 3}, stats['algorithm_cache'])
+        self.assertEqual(['ingestion', 'polling'], sorted(stats['worker']))
+
+    def test_logs_cycle_summary(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [
+            create_job_db_summary('test-job-1'),
+            create_job_db_summary('test-job-2'),
+        ]
+        clock = {'test-job-1': 1.0, 'test-job-2': 3.5, 'now': 100.0}
+
+        def getstatus(job_id):
+            clock['now'] += clock[job_id]
+            return piazza.Status(piazza.STATUS_RUNNING)
+
+        self.mock_getstatus.side_effect = getstatus
+        self.mock_time.side_effect = lambda: clock['now']
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1), concurrency=1)
+        worker._run_cycle()
+        self.assertIn('INFO - Polled 2 jobs in 4.5s; slowest lookup was <test-job-2> (3.5s)', self.logger.lines)
+
+    def test_reports_lookup_duration_as_poll_duration(self):
+        self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
+        clock = {'now': 100.0}
+
+        def getstatus(_):
+            clock['now'] += 2.0
+            return piazza.Status(piazza.STATUS_RUNNING)
+
+        self.mock_getstatus.side_effect = getstatus
+        self.mock_time.side_effect = lambda: clock['now']
+        worker = jobs.Worker(job_ttl=timedelta(1), interval=timedelta(1), concurrency=1)
+        worker._run_cycle()
+        self.assertEqual(2.0, worker.stats()['polling']['mean_duration'])
+
     def test_can_handle_large_number_of_cycles(self):
         self.mock_select_jobs.return_value.fetchall.return_value = [create_job_db_summary()]
         self.mock_getstatus.return_value = piazza.Status(piazza.STATUS_RUNNING)
@@ -1395,10 +2232,16 @@ def create_job_db_record(job_id: str = 'test-job-id'):
     }
 
 
-def create_job_db_summary(job_id: str = 'test-job-id', age: timedelta = None):
+def create_job_db_summary(
+        job_id: str = 'test-job-id',
+        age: timedelta = None,
+        status: str = 'Running',
+        status_age: timedelta = None):
     return {
         'job_id': job_id,
         'age': age or ONE_WEEK,
+        'status': status,
+        'status_age': status_age or age or ONE_WEEK,
     }
 
 
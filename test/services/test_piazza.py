@@ -12,13 +12,66 @@
 # specific language governing permissions and limitations under the License.
 
 import json
+import threading
 import unittest.mock
 
+import requests
 from requests import ConnectionError, Response
 from requests_mock import Mocker
 
 from beachfront.services import piazza
 
+
+@Mocker()
+class ClientTest(unittest.TestCase):
+    def setUp(self):
+        self._original_api_key = piazza.PIAZZA_API_KEY
+        piazza.PIAZZA_API_KEY = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+
+    def tearDown(self):
+        piazza.PIAZZA_API_KEY = self._original_api_key
+
+    def test_get_client_returns_shared_instance(self, _):
+        self.assertIs(piazza.get_client(), piazza.get_client())
+
+    def test_reuses_one_session_across_calls(self, m: Mocker):
+        m.get('/job/test-job-id', text=RESPONSE_JOB_RUNNING)
+        client = piazza.Client()
+        with unittest.mock.patch.object(client._session, 'request', wraps=client._session.request) as spy:
+            client.get('/job/test-job-id')
+            client.get('/job/test-job-id')
+        self.assertEqual(2, spy.call_count)
+
+    def test_sizes_connection_pool(self, _):
+        client = piazza.Client(pool_size=42)
+        adapter = client._session.get_adapter('https://test-piazza-host.localdomain')
+        self.assertEqual(42, adapter._pool_maxsize)
+
+    def test_calls_correct_url(self, m: Mocker):
+        m.get('/job/test-job-id', text=RESPONSE_JOB_RUNNING)
+        piazza.Client().get('/job/test-job-id')
+        self.assertEqual('https://test-piazza-host.localdomain/job/test-job-id', m.request_history[0].url)
+
+    def test_sends_correct_api_key(self, m: Mocker):
+        m.get('/job/test-job-id', text=RESPONSE_JOB_RUNNING)
+        piazza.Client().get('/job/test-job-id')
+        self.assertEqual('Basic YWFhYWFhYWEtYmJiYi1jY2NjLWRkZGQtZWVlZWVlZWVlZWVlOg==', m.request_history[0].headers['Authorization'])
+
+    def test_applies_default_timeout(self, m: Mocker):
+        m.get('/job/test-job-id', text=RESPONSE_JOB_RUNNING)
+        piazza.Client().get('/job/test-job-id')
+        self.assertEqual(piazza.TIMEOUT_DEFAULT, m.request_history[0].timeout)
+
+    def test_applies_per_endpoint_timeouts(self, m: Mocker):
+        m.get('/file/test-data-id', text='lorem ipsum')
+        m.get('/job/test-job-id', text=RESPONSE_JOB_RUNNING)
+        client = piazza.Client(timeouts={'job': (1, 2)})
+        client.get('/file/test-data-id')
+        client.get('/job/test-job-id')
+        self.assertEqual(piazza.TIMEOUTS['file'], m.request_history[0].timeout)
+        self.assertEqual((1, 2), m.request_history[1].timeout)
+
+
 @Mocker()
 class CreateTriggerTest(unittest.TestCase):
     maxDiff = 4096
@@ -101,7 +154,7 @@ class CreateTriggerTest(unittest.TestCase):
             )
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.post') as mock:
+        with unittest.mock.patch('requests.Session.request') as mock:
             mock.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.create_trigger(
@@ -216,7 +269,7 @@ class DeployTest(unittest.TestCase):
             piazza.deploy(data_id='test-data-id', poll_interval=0, max_poll_attempts=2)
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.post') as stub:
+        with unittest.mock.patch('requests.Session.request') as stub:
             stub.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.deploy(data_id='test-data-id', poll_interval=0, max_poll_attempts=2)
@@ -293,7 +346,7 @@ class ExecuteTest(unittest.TestCase):
             piazza.execute('test-service-id', {})
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.post') as stub:
+        with unittest.mock.patch('requests.Session.request') as stub:
             stub.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.execute('test-service-id', {})
@@ -351,7 +404,7 @@ class GetFileTest(unittest.TestCase):
             piazza.get_file('test-data-id')
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.get') as stub:
+        with unittest.mock.patch('requests.Session.request') as stub:
             stub.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.get_file('test-data-id')
@@ -362,6 +415,50 @@ class GetFileTest(unittest.TestCase):
             piazza.get_file('test-data-id')
 
 
+@Mocker()
+class StreamFileTest(unittest.TestCase):
+    def setUp(self):
+        self._original_api_key = piazza.PIAZZA_API_KEY
+        piazza.PIAZZA_API_KEY = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+
+    def tearDown(self):
+        piazza.PIAZZA_API_KEY = self._original_api_key
+
+    def test_calls_correct_url(self, m: Mocker):
+        m.get('/file/test-data-id', text=RESPONSE_FILE)
+        piazza.stream_file('test-data-id')
+        self.assertEqual('https://test-piazza-host.localdomain/file/test-data-id', m.request_history[0].url)
+
+    def test_yields_contents_in_chunks(self, m: Mocker):
+        m.get('/file/test-data-id', text=RESPONSE_FILE)
+        chunks = list(piazza.stream_file('test-data-id', chunk_size=4))
+        self.assertEqual(RESPONSE_FILE.encode(), b''.join(chunks))
+        self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+
+    def test_throws_http_errors_before_streaming(self, m: Mocker):
+        m.get('/file/test-data-id', text=RESPONSE_ERROR_GENERIC, status_code=500)
+        with self.assertRaises(piazza.ServerError):
+            piazza.stream_file('test-data-id')
+
+    def test_throws_when_credentials_are_rejected(self, m: Mocker):
+        m.get('/file/test-data-id', text=RESPONSE_ERROR_GENERIC, status_code=401)
+        with self.assertRaises(piazza.Unauthorized):
+            piazza.stream_file('test-data-id')
+
+    def test_throws_when_piazza_is_unreachable(self, _):
+        with unittest.mock.patch('requests.Session.request') as stub:
+            stub.side_effect = ConnectionError(request=unittest.mock.Mock())
+            with self.assertRaises(piazza.Unreachable):
+                piazza.stream_file('test-data-id')
+
+    def test_throws_when_connection_is_lost_while_streaming(self, _):
+        with unittest.mock.patch('requests.Session.request') as stub:
+            stub.return_value.iter_content.side_effect = ConnectionError()
+            with self.assertRaises(piazza.Unreachable):
+                list(piazza.stream_file('test-data-id'))
+            self.assertTrue(stub.return_value.close.called)
+
+
 @Mocker()
 class GetStatusTest(unittest.TestCase):
     def setUp(self):
@@ -441,7 +538,7 @@ class GetStatusTest(unittest.TestCase):
             piazza.get_status('test-job-id')
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.get') as stub:
+        with unittest.mock.patch('requests.Session.request') as stub:
             stub.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.get_status('test-job-id')
@@ -540,7 +637,7 @@ class GetServiceTest(unittest.TestCase):
             piazza.get_service(service_id='test-id')
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.get') as stub:
+        with unittest.mock.patch('requests.Session.request') as stub:
             stub.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.get_service(service_id='test-id')
@@ -637,7 +734,7 @@ class GetServicesTest(unittest.TestCase):
             piazza.get_services(pattern='^test-pattern$')
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.get') as stub:
+        with unittest.mock.patch('requests.Session.request') as stub:
             stub.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.get_services(pattern='^test-pattern$')
@@ -673,6 +770,75 @@ class GetServicesTest(unittest.TestCase):
             piazza.get_services(pattern='^test-pattern$')
 
 
+@Mocker()
+class GetStatusesTest(unittest.TestCase):
+    def setUp(self):
+        self._original_api_key = piazza.PIAZZA_API_KEY
+        piazza.PIAZZA_API_KEY = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+
+    def tearDown(self):
+        piazza.PIAZZA_API_KEY = self._original_api_key
+
+    def test_calls_correct_urls(self, m: Mocker):
+        m.get('/job/test-job-1', text=RESPONSE_JOB_RUNNING)
+        m.get('/job/test-job-2', text=RESPONSE_JOB_RUNNING)
+        piazza.get_statuses(['test-job-1', 'test-job-2'])
+        self.assertEqual({'https://test-piazza-host.localdomain/job/test-job-1',
+                          'https://test-piazza-host.localdomain/job/test-job-2'},
+                         {r.url for r in m.request_history})
+
+    def test_returns_status_for_each_job(self, m: Mocker):
+        m.get('/job/test-job-1', text=RESPONSE_JOB_RUNNING)
+        m.get('/job/test-job-2', text=RESPONSE_JOB_RUNNING)
+        statuses = piazza.get_statuses(['test-job-1', 'test-job-2'])
+        self.assertEqual(['test-job-1', 'test-job-2'], sorted(statuses))
+        self.assertEqual(piazza.STATUS_RUNNING, statuses['test-job-1'].status)
+        self.assertEqual(piazza.STATUS_RUNNING, statuses['test-job-2'].status)
+
+    def test_returns_errors_alongside_statuses(self, m: Mocker):
+        m.get('/job/test-job-1', text=RESPONSE_JOB_RUNNING)
+        m.get('/job/test-job-2', text=RESPONSE_ERROR_GENERIC, status_code=404)
+        statuses = piazza.get_statuses(['test-job-1', 'test-job-2'])
+        self.assertEqual(piazza.STATUS_RUNNING, statuses['test-job-1'].status)
+        self.assertIsInstance(statuses['test-job-2'], piazza.ServerError)
+        self.assertEqual(404, statuses['test-job-2'].status_code)
+
+    def test_fetches_statuses_concurrently(self, _):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def get_status(job_id):
+            barrier.wait()  # Deadlocks unless all three lookups are in flight at once
+            return piazza.Status(piazza.STATUS_RUNNING)
+
+        with unittest.mock.patch('beachfront.services.piazza.get_status', side_effect=get_status):
+            statuses = piazza.get_statuses(['test-job-1', 'test-job-2', 'test-job-3'], concurrency=3)
+        self.assertEqual(3, len(statuses))
+        self.assertFalse(barrier.broken)
+
+    def test_maps_request_failures_to_unreachable(self, m: Mocker):
+        m.get('/job/test-job-1', text=RESPONSE_JOB_RUNNING)
+        m.get('/job/test-job-2', exc=requests.exceptions.ReadTimeout)
+        statuses = piazza.get_statuses(['test-job-1', 'test-job-2'])
+        self.assertEqual(piazza.STATUS_RUNNING, statuses['test-job-1'].status)
+        self.assertIsInstance(statuses['test-job-2'], piazza.Unreachable)
+
+    def test_maps_malformed_responses_to_invalid_response(self, m: Mocker):
+        m.get('/job/test-job-1', text='lorem ipsum')
+        statuses = piazza.get_statuses(['test-job-1'])
+        self.assertIsInstance(statuses['test-job-1'], piazza.InvalidResponse)
+
+    def test_records_duration_of_each_lookup(self, _):
+        durations = {}
+        with unittest.mock.patch('time.time', side_effect=[10.0, 12.5]), \
+                unittest.mock.patch('beachfront.services.piazza.get_status'):
+            piazza.get_statuses(['test-job-1'], durations=durations)
+        self.assertEqual({'test-job-1': 2.5}, durations)
+
+    def test_handles_empty_lists(self, m: Mocker):
+        self.assertEqual({}, piazza.get_statuses([]))
+        self.assertEqual(0, m.call_count)
+
+
 @Mocker()
 class GetTriggersTest(unittest.TestCase):
     def setUp(self):
@@ -734,7 +900,7 @@ class GetTriggersTest(unittest.TestCase):
             piazza.get_triggers('test-name')
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.post') as mock:
+        with unittest.mock.patch('requests.Session.request') as mock:
             mock.side_effect = piazza.Unreachable()
             with self.assertRaises(piazza.Unreachable):
                 piazza.get_triggers('test-name')
@@ -856,7 +1022,7 @@ class RegisterServiceTest(unittest.TestCase):
             )
 
     def test_throws_when_piazza_is_unreachable(self, _):
-        with unittest.mock.patch('requests.post') as mock:
+        with unittest.mock.patch('requests.Session.request') as mock:
             mock.side_effect = ConnectionError(request=unittest.mock.Mock())
             with self.assertRaises(piazza.Unreachable):
                 piazza.register_service(
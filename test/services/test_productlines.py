@@ -354,6 +354,28 @@ class DeleteProductLineTest(unittest.TestCase):
             productlines.delete_productline('test-user-id', 'test-productline-id')
 
 
+@patch('beachfront.db.productlines.select_fingerprint')
+class GetAllFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+
+    def tearDown(self):
+        self._mockdb.destroy()
+
+    def test_returns_fingerprint(self, mock: MagicMock):
+        mock.return_value.scalar.return_value = '2:test-fingerprint'
+        self.assertEqual('2:test-fingerprint', productlines.get_all_fingerprint())
+
+    def test_closes_connection(self, _):
+        productlines.get_all_fingerprint()
+        self.assertTrue(self._mockdb.close.called)
+
+    def test_throws_on_database_error(self, mock: MagicMock):
+        mock.side_effect = helpers.create_database_error()
+        with self.assertRaises(DatabaseError):
+            productlines.get_all_fingerprint()
+
+
 @patch('beachfront.db.productlines.select_all')
 class GetAllTest(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,131 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import unittest
+from unittest.mock import patch
+
+from test import helpers
+
+from beachfront.services import tiles
+from beachfront.utils.tilecache import TileCache
+
+
+class GetTileTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+        self.cache = TileCache(memory_size=1024)
+        self.mock_select = self.create_mock('beachfront.db.jobs.select_detection_tile')
+        self.mock_select.return_value.scalar.return_value = b'test-tile'
+        self.create_mock('beachfront.services.tiles._tile_cache', new=self.cache)
+
+    def tearDown(self):
+        self._mockdb.destroy()
+
+    def test_returns_tile(self):
+        self.assertEqual(b'test-tile', tiles.get_tile(0, 0, 0))
+
+    def test_returns_empty_tile_when_no_detections_intersect(self):
+        self.mock_select.return_value.scalar.return_value = None
+        self.assertEqual(b'', tiles.get_tile(0, 0, 0))
+
+    def test_sends_correct_filters(self):
+        tiles.get_tile(3, 2, 1, job_id='test-job-id', scene_id='planetscope:test')
+        _, kwargs = self.mock_select.call_args
+        self.assertEqual('test-job-id', kwargs['job_id'])
+        self.assertIsNone(kwargs['productline_id'])
+        self.assertEqual('planetscope:test', kwargs['scene_id'])
+        self.assertEqual(tiles.LAYER_NAME, kwargs['layer_name'])
+
+    def test_uses_coarse_geometry_when_zoomed_out(self):
+        tiles.get_tile(0, 0, 0)
+        self.assertEqual(3, self.mock_select.call_args[1]['lod'])
+
+    def test_uses_full_geometry_when_zoomed_in(self):
+        tiles.get_tile(14, 0, 0)
+        self.assertEqual(0, self.mock_select.call_args[1]['lod'])
+
+    def test_serves_repeat_requests_from_cache(self):
+        tiles.get_tile(0, 0, 0)
+        tiles.get_tile(0, 0, 0)
+        self.assertEqual(1, self.mock_select.call_count)
+
+    def test_caches_each_filter_separately(self):
+        tiles.get_tile(0, 0, 0, job_id='test-job-id')
+        tiles.get_tile(0, 0, 0, job_id='some-other-job-id')
+        self.assertEqual(2, self.mock_select.call_count)
+
+    def test_does_not_cache_tile_rendered_across_an_invalidation(self):
+        def render(*_, **__):
+            tiles.invalidate('test-job-id')
+            return self.mock_select.return_value
+
+        self.mock_select.side_effect = render
+        tiles.get_tile(0, 0, 0)
+        tiles.get_tile(0, 0, 0)
+        self.assertEqual(2, self.mock_select.call_count)
+
+    def test_throws_on_invalid_zoom(self):
+        with self.assertRaises(tiles.InvalidTile):
+            tiles.get_tile(tiles.MAX_ZOOM + 1, 0, 0)
+
+    def test_throws_on_tile_outside_of_grid(self):
+        with self.assertRaises(tiles.InvalidTile):
+            tiles.get_tile(1, 2, 0)
+
+    def test_throws_on_database_error(self):
+        self.mock_select.side_effect = helpers.create_database_error()
+        with self.assertRaises(tiles.db.DatabaseError):
+            tiles.get_tile(0, 0, 0)
+
+    def test_closes_connection(self):
+        tiles.get_tile(0, 0, 0)
+        self.assertTrue(self._mockdb.close.called)
+
+
+class InvalidateTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = TileCache(memory_size=1024)
+        patcher = patch('beachfront.services.tiles._tile_cache', self.cache)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def test_drops_tiles_for_job(self):
+        self.cache.put('a', b'tile', {}, frozenset({('job_id', 'test-job-id')}))
+        tiles.invalidate('test-job-id')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_drops_unfiltered_tiles(self):
+        self.cache.put('a', b'tile', {}, frozenset())
+        tiles.invalidate('test-job-id')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_drops_tiles_for_productlines_and_scenes(self):
+        self.cache.put('a', b'tile', {}, frozenset({('productline_id', 'test-productline-id')}))
+        self.cache.put('b', b'tile', {}, frozenset({('scene_id', 'planetscope:test')}))
+        self.assertEqual(2, tiles.invalidate('test-job-id'))
+
+    def test_keeps_tiles_for_other_jobs(self):
+        self.cache.put('a', b'tile', {}, frozenset({('job_id', 'some-other-job-id')}))
+        tiles.invalidate('test-job-id')
+        self.assertEqual((b'tile', {}), self.cache.get('a'))
+
+
+class TileBoundsTest(unittest.TestCase):
+    def test_covers_whole_world_at_zoom_zero(self):
+        half = tiles.WEB_MERCATOR_HALF_WIDTH
+        self.assertEqual((-half, -half, half, half), tiles._tile_bounds(0, 0, 0))
+
+    def test_counts_rows_from_the_north(self):
+        half = tiles.WEB_MERCATOR_HALF_WIDTH
+        self.assertEqual((-half, 0, 0, half), tiles._tile_bounds(1, 0, 0))
+        self.assertEqual((0, -half, half, 0), tiles._tile_bounds(1, 1, 1))
@@ -29,6 +29,7 @@ class AuthenticateViaApiKeyTest(helpers.MockableTestCase):
 
         self.logger = helpers.get_logger('beachfront.services.users')
         self.mock_select_user_by_api_key = self.create_mock('beachfront.db.users.select_user_by_api_key')
+        users._api_key_cache.clear()
 
     def tearDown(self):
         self._mockdb.destroy()
@@ -104,6 +105,85 @@ class AuthenticateViaApiKeyTest(helpers.MockableTestCase):
         ], self.logger.lines)
 
 
+class AuthenticateViaApiKeyCacheTest(helpers.MockableTestCase):
+    def setUp(self):
+        self._mockdb = helpers.mock_database()
+
+        self.mock_select_user_by_api_key = self.create_mock('beachfront.db.users.select_user_by_api_key')
+        self.mock_monotonic = self.create_mock('time.monotonic')
+        self.mock_monotonic.return_value = 1000.0
+        users._api_key_cache.clear()
+
+    def tearDown(self):
+        self._mockdb.destroy()
+
+    def test_serves_repeat_lookups_from_cache(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        first = users.authenticate_via_api_key(API_KEY)
+        second = users.authenticate_via_api_key(API_KEY)
+        self.assertIs(first, second)
+        self.assertEqual(1, self.mock_select_user_by_api_key.call_count)
+
+    def test_caches_unknown_api_keys(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = None
+        for _ in range(3):
+            with self.assertRaises(users.Unauthorized):
+                users.authenticate_via_api_key(API_KEY)
+        self.assertEqual(1, self.mock_select_user_by_api_key.call_count)
+
+    def test_rechecks_unknown_api_keys_after_negative_ttl(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = None
+        with self.assertRaises(users.Unauthorized):
+            users.authenticate_via_api_key(API_KEY)
+        self.mock_monotonic.return_value += 10
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        self.assertIsInstance(users.authenticate_via_api_key(API_KEY), users.User)
+
+    def test_rechecks_api_keys_after_ttl(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        users.authenticate_via_api_key(API_KEY)
+        self.mock_monotonic.return_value += 60
+        users.authenticate_via_api_key(API_KEY)
+        self.assertEqual(2, self.mock_select_user_by_api_key.call_count)
+
+    def test_does_not_cache_database_errors(self):
+        self.mock_select_user_by_api_key.side_effect = helpers.create_database_error()
+        with self.assertRaises(DatabaseError):
+            users.authenticate_via_api_key(API_KEY)
+        self.mock_select_user_by_api_key.side_effect = None
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        self.assertIsInstance(users.authenticate_via_api_key(API_KEY), users.User)
+
+    def test_evicts_least_recently_used_keys(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        with patch('beachfront.services.users.API_KEY_CACHE_SIZE', 2):
+            users.authenticate_via_api_key('a' * 32)
+            users.authenticate_via_api_key('b' * 32)
+            users.authenticate_via_api_key('a' * 32)
+            users.authenticate_via_api_key('c' * 32)
+        self.assertEqual(['a' * 32, 'c' * 32], list(users._api_key_cache.keys()))
+
+    def test_forget_api_key_evicts_key(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        users.authenticate_via_api_key(API_KEY)
+        users.forget_api_key(api_key=API_KEY)
+        users.authenticate_via_api_key(API_KEY)
+        self.assertEqual(2, self.mock_select_user_by_api_key.call_count)
+
+    def test_forget_api_key_evicts_keys_for_user(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        users.authenticate_via_api_key(API_KEY)
+        users.forget_api_key(user_id='test-user-id')
+        self.assertEqual(0, len(users._api_key_cache))
+
+    def test_forget_all_api_keys_evicts_every_key(self):
+        self.mock_select_user_by_api_key.return_value.fetchone.return_value = create_user_db_record()
+        users.authenticate_via_api_key('a' * 32)
+        users.authenticate_via_api_key('b' * 32)
+        users.forget_all_api_keys()
+        self.assertEqual(0, len(users._api_key_cache))
+
+
 class GetByIdTest(unittest.TestCase):
     def setUp(self):
         self._mockdb = helpers.mock_database()
@@ -11,7 +11,9 @@
 # CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
 
+import gzip
 import unittest
+from unittest.mock import patch
 
 import flask
 
@@ -43,6 +45,90 @@ class ApplyDefaultResponseHeadersTest(unittest.TestCase):
         self.assertEqual('no-cache, no-store, must-revalidate, private', response.headers['Cache-Control'])
 
 
+class CompressResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        patcher = patch.dict('beachfront.middleware._COMPRESSORS', clear=True, gzip=middleware._gzip_compressor)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def compress(self, response: flask.Response, accept_encoding: str = 'gzip, deflate') -> flask.Response:
+        with self.app.test_request_context(headers={'Accept-Encoding': accept_encoding}):
+            return middleware.compress_response(response)
+
+    def test_compresses_json(self):
+        body = b'{"features": []}' * 100
+        response = self.compress(flask.Response(body, content_type='application/json'))
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual(body, gzip.decompress(response.get_data()))
+        self.assertEqual(str(len(response.get_data())), response.headers['Content-Length'])
+
+    def test_compresses_streamed_geojson_incrementally(self):
+        consumed = []
+
+        def stream():
+            for i in range(3):
+                consumed.append(i)
+                yield '{"type":"FeatureCollection","features":[' * 100
+
+        response = self.compress(flask.Response(stream(), content_type='application/vnd.geo+json'))
+        self.assertEqual([], consumed)
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(b'{"type":"FeatureCollection","features":[' * 300,
+                         gzip.decompress(b''.join(response.response)))
+
+    def test_releases_streamed_body_when_response_closes(self):
+        closed = []
+
+        def stream():
+            try:
+                yield 'lorem ipsum'
+            finally:
+                closed.append(True)
+
+        response = self.compress(flask.Response(stream(), content_type='application/vnd.geo+json'))
+        next(iter(response.response))
+        response.close()
+        self.assertEqual([True], closed)
+
+    def test_does_not_compress_images(self):
+        response = self.compress(flask.Response(b'x' * 2000, content_type='image/png'))
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(b'x' * 2000, response.get_data())
+
+    def test_does_not_compress_small_bodies(self):
+        response = self.compress(flask.Response(b'{}', content_type='application/json'))
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_does_not_compress_unless_client_accepts_it(self):
+        response = self.compress(flask.Response(b'{}' * 1000, content_type='application/json'), 'identity')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_does_not_recompress_encoded_bodies(self):
+        response = flask.Response(b'x' * 2000, content_type='text/plain', headers={'Content-Encoding': 'gzip'})
+        response = self.compress(response)
+        self.assertEqual(b'x' * 2000, response.get_data())
+
+    def test_weakens_etag(self):
+        response = flask.Response(b'{}' * 1000, content_type='application/json')
+        response.set_etag('test-etag')
+        response = self.compress(response)
+        self.assertEqual(('test-etag', True), response.get_etag())
+
+    def test_prefers_encodings_in_server_order(self):
+        compressors = [('br', middleware._gzip_compressor), ('gzip', middleware._gzip_compressor)]
+        with patch.dict('beachfront.middleware._COMPRESSORS', compressors, clear=True):
+            with self.app.test_request_context(headers={'Accept-Encoding': 'gzip, br'}):
+                self.assertEqual('br', middleware._negotiate_encoding(flask.request.accept_encodings))
+
+    def test_honors_client_quality_values(self):
+        compressors = [('br', middleware._gzip_compressor), ('gzip', middleware._gzip_compressor)]
+        with patch.dict('beachfront.middleware._COMPRESSORS', compressors, clear=True):
+            with self.app.test_request_context(headers={'Accept-Encoding': 'br;q=0.5, gzip'}):
+                self.assertEqual('gzip', middleware._negotiate_encoding(flask.request.accept_encodings))
+
+
 class AuthFilterTest(helpers.MockableTestCase):
     def setUp(self):
         self.mock_authenticate = self.create_mock('beachfront.services.users.authenticate_via_api_key', side_effect=create_user)
@@ -0,0 +1,171 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import json
+import unittest
+from unittest.mock import patch
+
+from beachfront.utils import geojson
+
+
+class IterFeaturesTest(unittest.TestCase):
+    def test_yields_each_feature(self):
+        features = list(geojson.iter_features(json.dumps({
+            'type': 'FeatureCollection',
+            'features': [{'id': 1}, {'id': 2}, {'id': 3}],
+        })))
+        self.assertEqual([{'id': 1}, {'id': 2}, {'id': 3}], features)
+
+    def test_ignores_other_members_in_any_order(self):
+        features = list(geojson.iter_features(
+            '{"bbox": [0, 0, 1, 1], "features": [{"id": 1}], "type": "FeatureCollection", "x": {"features": []}}'
+        ))
+        self.assertEqual([{'id': 1}], features)
+
+    def test_tolerates_whitespace(self):
+        features = list(geojson.iter_features('\n{ "features" : [\n  { "id" : 1 } ,\n  { "id" : 2 }\n ]\n}\n'))
+        self.assertEqual([{'id': 1}, {'id': 2}], features)
+
+    def test_handles_empty_collections(self):
+        self.assertEqual([], list(geojson.iter_features('{"type": "FeatureCollection", "features": []}')))
+
+    def test_throws_on_malformed_input(self):
+        with self.assertRaises(ValueError):
+            list(geojson.iter_features('lorem ipsum'))
+
+    def test_throws_on_truncated_input(self):
+        with self.assertRaises(ValueError):
+            list(geojson.iter_features('{"features": [{"id": 1}, {"id"'))
+
+    def test_accepts_chunks(self):
+        text = '{"bbox": [0, 0, 1, 1], "features": [{"id": 1}, {"id": 2}], "type": "FeatureCollection"}'
+        features = list(geojson.iter_features(text[i:i + 3] for i in range(0, len(text), 3)))
+        self.assertEqual([{'id': 1}, {'id': 2}], features)
+
+    def test_accepts_byte_chunks_splitting_characters(self):
+        data = '{"features": [{"name": "caf\u00e9 \u6d77\u5cb8"}]}'.encode()
+        features = list(geojson.iter_features(data[i:i + 1] for i in range(len(data))))
+        self.assertEqual([{'name': 'caf\u00e9 \u6d77\u5cb8'}], features)
+
+    def test_does_not_truncate_values_split_across_chunks(self):
+        features = list(geojson.iter_features(['{"count": 12', '34, "features": [', '{"id": 1}]}']))
+        self.assertEqual([{'id': 1}], features)
+
+    def test_does_not_truncate_numbers_split_at_decimal_point_or_exponent(self):
+        for chunks in (['{"version": 1.', '5, "features": []}'],
+                       ['{"version": 1', '.5, "features": []}'],
+                       ['{"version": 1e', '3, "features": []}'],
+                       ['{"version": 1.5E', '+3, "features": []}'],
+                       ['{"version": -', '1, "features": []}']):
+            with self.subTest(chunks=chunks):
+                self.assertEqual([], list(geojson.iter_features(chunks)))
+
+    def test_accepts_top_level_scalars_split_across_every_character(self):
+        text = '{"version": 1.25e-3, "valid": true, "name": null, "features": [{"id": 1}], "total": 10.5}'
+        self.assertEqual([{'id': 1}], list(geojson.iter_features(text[i:i + 1] for i in range(len(text)))))
+
+    def test_reads_chunks_lazily(self):
+        consumed = []
+
+        def chunks():
+            yield '{"features": ['
+            for i in range(100):
+                consumed.append(i)
+                yield '{"id": %d},' % i
+            yield '{"id": 100}]}'
+
+        for feature in geojson.iter_features(chunks()):
+            self.assertLessEqual(len(consumed), feature['id'] + 2)
+
+    def test_parses_large_features_without_rescanning_every_chunk(self):
+        feature = {'type': 'Feature', 'geometry': {
+            'type': 'LineString',
+            'coordinates': [[-122.123456789 + i / 1e6, 37.123456789] for i in range(100000)],
+        }}
+        text = json.dumps({'type': 'FeatureCollection', 'features': [feature]})
+        self.assertGreater(len(text), 3000000)
+        chunk_size = 65536
+        with patch.object(geojson, '_decoder', wraps=geojson._decoder) as decoder:
+            features = list(geojson.iter_features(text[i:i + chunk_size] for i in range(0, len(text), chunk_size)))
+        self.assertEqual([feature], features)
+        self.assertLess(decoder.raw_decode.call_count, 15)
+
+    def test_throws_on_truncated_chunks(self):
+        with self.assertRaises(ValueError):
+            list(geojson.iter_features(['{"features": [{"id": 1}', ', {"id"']))
+
+
+class ToEWKTTest(unittest.TestCase):
+    def test_serializes_points(self):
+        self.assertEqual('SRID=4326;POINT (1 2)', geojson.to_ewkt({'type': 'Point', 'coordinates': [1, 2]}))
+
+    def test_serializes_linestrings(self):
+        self.assertEqual('SRID=4326;LINESTRING (0.5 1.25,2 3)',
+                         geojson.to_ewkt({'type': 'LineString', 'coordinates': [[0.5, 1.25], [2, 3]]}))
+
+    def test_serializes_polygons(self):
+        self.assertEqual('SRID=4326;POLYGON ((0 0,0 1,1 1,0 0))',
+                         geojson.to_ewkt({'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [0, 0]]]}))
+
+    def test_serializes_multi_geometries(self):
+        self.assertEqual('SRID=4326;MULTIPOINT ((0 0),(1 1))',
+                         geojson.to_ewkt({'type': 'MultiPoint', 'coordinates': [[0, 0], [1, 1]]}))
+        self.assertEqual('SRID=4326;MULTILINESTRING ((0 0,1 1),(2 2,3 3))',
+                         geojson.to_ewkt({'type': 'MultiLineString', 'coordinates': [[[0, 0], [1, 1]], [[2, 2], [3, 3]]]}))
+        self.assertEqual('SRID=4326;MULTIPOLYGON (((0 0,0 1,1 1,0 0)))',
+                         geojson.to_ewkt({'type': 'MultiPolygon', 'coordinates': [[[[0, 0], [0, 1], [1, 1], [0, 0]]]]}))
+
+    def test_serializes_geometry_collections(self):
+        self.assertEqual('SRID=4326;GEOMETRYCOLLECTION (POINT (1 2),LINESTRING (0 0,1 1))', geojson.to_ewkt({
+            'type': 'GeometryCollection',
+            'geometries': [
+                {'type': 'Point', 'coordinates': [1, 2]},
+                {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]},
+            ],
+        }))
+
+    def test_serializes_empty_geometries(self):
+        self.assertEqual('SRID=4326;LINESTRING EMPTY', geojson.to_ewkt({'type': 'LineString', 'coordinates': []}))
+
+    def test_preserves_precision(self):
+        self.assertEqual('SRID=4326;POINT (-122.123456789012 1e-07)',
+                         geojson.to_ewkt({'type': 'Point', 'coordinates': [-122.123456789012, 0.0000001]}))
+
+    def test_honors_srid(self):
+        self.assertEqual('SRID=3857;POINT (1 2)', geojson.to_ewkt({'type': 'Point', 'coordinates': [1, 2]}, srid=3857))
+
+    def test_throws_on_unknown_geometry_types(self):
+        with self.assertRaises(ValueError):
+            geojson.to_ewkt({'type': 'Circle', 'coordinates': [0, 0]})
+
+    def test_throws_on_geometries_that_are_not_objects(self):
+        for geometry in ('POINT (1 2)', [1, 2], 42):
+            with self.subTest(geometry=geometry), self.assertRaises(ValueError):
+                geojson.to_ewkt(geometry)
+
+    def test_throws_on_malformed_coordinates(self):
+        for geometry in (
+                {'type': 'Point', 'coordinates': 5},
+                {'type': 'Point', 'coordinates': [1]},
+                {'type': 'Point', 'coordinates': [1, 'a']},
+                {'type': 'Point', 'coordinates': [True, False]},
+                {'type': 'LineString', 'coordinates': [1, 2]},
+                {'type': 'LineString', 'coordinates': 'lolwut'},
+                {'type': 'Polygon', 'coordinates': [[1, 2]]},
+                {'type': 'MultiPolygon', 'coordinates': [[[0, 0], [0, 1]]]},
+                {'type': 'MultiPolygon', 'coordinates': [5]},
+                {'type': 'GeometryCollection', 'geometries': [5]},
+                {'type': 'GeometryCollection', 'geometries': {}},
+        ):
+            with self.subTest(geometry=geometry), self.assertRaises(ValueError):
+                geojson.to_ewkt(geometry)
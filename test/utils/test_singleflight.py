@@ -0,0 +1,74 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import threading
+import unittest
+
+from beachfront.utils.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow_call(self):
+        self.calls += 1
+        self.release.wait(5)
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+    def run_concurrently(self, count: int):
+        results = []
+
+        def call():
+            try:
+                results.append(self.flights.do('test-key', self.slow_call))
+            except Exception as err:
+                results.append(err)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        threads[0].start()
+        while not self.calls:
+            pass
+        for thread in threads[1:]:
+            thread.start()
+        while self.flights.stats['shared'] < count - 1:
+            pass
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_runs_function_once_for_concurrent_callers(self):
+        self.outcome = 'test-result'
+        results = self.run_concurrently(3)
+        self.assertEqual(1, self.calls)
+        self.assertEqual(['test-result'] * 3, [r for r, _ in results])
+        self.assertEqual([False, True, True], sorted(shared for _, shared in results))
+
+    def test_shares_exceptions_with_waiting_callers(self):
+        self.outcome = ValueError('test-error')
+        results = self.run_concurrently(3)
+        self.assertEqual(1, self.calls)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+    def test_runs_function_again_once_flight_lands(self):
+        self.release.set()
+        self.outcome = 'test-result'
+        self.flights.do('test-key', self.slow_call)
+        self.flights.do('test-key', self.slow_call)
+        self.assertEqual(2, self.calls)
+        self.assertEqual({'calls': 2, 'shared': 0}, self.flights.stats)
@@ -0,0 +1,106 @@
+# Copyright 2016, RadiantBlue Technologies, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+# this file except in compliance with the License. You may obtain a copy of the
+# License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed
+# under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from beachfront.utils.tilecache import TileCache
+
+PNG = {'Content-Type': 'image/png'}
+
+
+class TileCacheMemoryTest(unittest.TestCase):
+    def test_returns_none_on_miss(self):
+        cache = TileCache(memory_size=100)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(1, cache.stats['misses'])
+
+    def test_returns_stored_tile(self):
+        cache = TileCache(memory_size=100)
+        cache.put('a', b'tile', PNG)
+        self.assertEqual((b'tile', PNG), cache.get('a'))
+        self.assertEqual(1, cache.stats['memory_hits'])
+
+    def test_evicts_least_recently_used_tiles(self):
+        cache = TileCache(memory_size=10)
+        cache.put('a', b'aaaa', PNG)
+        cache.put('b', b'bbbb', PNG)
+        cache.get('a')
+        cache.put('c', b'cccc', PNG)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(1, cache.stats['evictions'])
+
+    def test_skips_tiles_larger_than_the_cache(self):
+        cache = TileCache(memory_size=2)
+        cache.put('a', b'aaaa', PNG)
+        self.assertIsNone(cache.get('a'))
+
+    def test_invalidates_by_tag(self):
+        cache = TileCache(memory_size=100)
+        cache.put('a', b'tile', PNG, frozenset({('jobid', 'test-job-id')}))
+        cache.put('b', b'tile', PNG, frozenset({('jobid', 'some-other-job-id')}))
+        count = cache.invalidate(lambda tags: ('jobid', 'test-job-id') in tags)
+        self.assertEqual(1, count)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+
+    def test_ignores_puts_from_before_an_invalidation(self):
+        cache = TileCache(memory_size=100)
+        generation = cache.generation
+        cache.clear()
+        cache.put('a', b'tile', PNG, generation=generation)
+        self.assertIsNone(cache.get('a'))
+
+
+class TileCacheDiskTest(unittest.TestCase):
+    def setUp(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tempdir.cleanup)
+        self.disk_dir = self._tempdir.name
+
+    def test_writes_tiles_through_to_disk(self):
+        cache = TileCache(memory_size=100, disk_size=100, disk_dir=self.disk_dir)
+        cache.put('a', b'tile', PNG)
+        self.assertEqual(1, len(os.listdir(self.disk_dir)))
+
+    def test_serves_tiles_evicted_from_memory_from_disk(self):
+        cache = TileCache(memory_size=4, disk_size=100, disk_dir=self.disk_dir)
+        cache.put('a', b'aaaa', PNG)
+        cache.put('b', b'bbbb', PNG)
+        self.assertEqual((b'aaaa', PNG), cache.get('a'))
+        self.assertEqual(1, cache.stats['disk_hits'])
+        self.assertEqual((b'aaaa', PNG), cache.get('a'))
+        self.assertEqual(1, cache.stats['memory_hits'])
+
+    def test_evicts_least_recently_used_files(self):
+        cache = TileCache(memory_size=0, disk_size=8, disk_dir=self.disk_dir)
+        cache.put('a', b'aaaa', PNG)
+        cache.put('b', b'bbbb', PNG)
+        cache.put('c', b'cccc', PNG)
+        self.assertEqual(2, len(os.listdir(self.disk_dir)))
+        self.assertIsNone(cache.get('a'))
+
+    def test_removes_invalidated_files(self):
+        cache = TileCache(memory_size=100, disk_size=100, disk_dir=self.disk_dir)
+        cache.put('a', b'tile', PNG)
+        cache.clear()
+        self.assertEqual([], os.listdir(self.disk_dir))
+
+    def test_discards_tiles_left_by_previous_process(self):
+        with open(os.path.join(self.disk_dir, 'stale.tile'), 'wb') as fp:
+            fp.write(b'tile')
+        TileCache(memory_size=100, disk_size=100, disk_dir=self.disk_dir)
+        self.assertEqual([], os.listdir(self.disk_dir))